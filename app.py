@@ -10,15 +10,27 @@ except ImportError:
     print("⚠️ python-dotenv not installed, using system environment variables")
 
 import json
+import time
 import uuid
 import shutil
 from pathlib import Path
 from datetime import datetime
-from fastapi import FastAPI, HTTPException, BackgroundTasks, UploadFile, File, Request
+from fastapi import FastAPI, HTTPException, BackgroundTasks, UploadFile, File, Request, Response, Depends
 from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.concurrency import run_in_threadpool
+from contextlib import asynccontextmanager
+import anyio
+
+try:
+    import aiofiles
+except ImportError:
+    aiofiles = None
 from fastapi.responses import FileResponse
 import re
+from collections import OrderedDict
+from functools import lru_cache
 from pydantic import BaseModel
 from typing import Optional, Dict, Any, List, Union
 
@@ -26,11 +38,38 @@ from core.workflow_manager import WorkflowManager
 from core.agent_engine import AgentEngine
 from core.film_ir_manager import FilmIRManager
 from core.film_ir_io import load_film_ir, film_ir_exists
+from core.utils import get_genai_client
 
 # Base URL for asset links - use environment variable in production
 BASE_URL = os.getenv("BASE_URL", "http://localhost:8000")
 
-app = FastAPI(title="AI 导演工作台 API / SocialSaver Backend")
+# ⚡ 优先使用 orjson 序列化响应（大型 workflow / storyboard 负载更快），未安装时回退标准 JSONResponse
+try:
+    import orjson  # noqa: F401
+    from fastapi.responses import ORJSONResponse as DefaultJSONResponse
+except ImportError:
+    from fastapi.responses import JSONResponse as DefaultJSONResponse
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # 🧵 上传落盘、视频合并、同步路由共用 anyio 线程池，默认 40 个 token 偏少
+    anyio.to_thread.current_default_thread_limiter().total_tokens = 100
+
+    # 2. 初始化核心引擎（在 worker fork 之后构建，每个进程各自持有 Gemini 客户端）
+    # WorkflowManager 不做全局单例：每个请求按 job_id 构建独立实例（见 get_manager）
+    app.state.agent = await run_in_threadpool(AgentEngine)
+    print("✅ AgentEngine 已就绪")
+    yield
+
+# 生产环境可设置 DISABLE_DOCS=1 关闭 /docs 与 OpenAPI schema 生成
+_docs_disabled = os.getenv("DISABLE_DOCS", "0") == "1"
+
+app = FastAPI(
+    title="AI 导演工作台 API / SocialSaver Backend",
+    default_response_class=DefaultJSONResponse,
+    lifespan=lifespan,
+    openapi_url=None if _docs_disabled else "/openapi.json",
+)
 
 
 # ============================================================
@@ -39,49 +78,78 @@ app = FastAPI(title="AI 导演工作台 API / SocialSaver Backend")
 
 def parse_time_to_seconds(time_value) -> float:
     """将时间值转换为秒数，支持 'MM:SS', 'HH:MM:SS' 格式或数字"""
-    if time_value is None:
-        return 0.0
+    # 快速路径：数字直接返回
     if isinstance(time_value, (int, float)):
         return float(time_value)
+    if time_value is None:
+        return 0.0
     if isinstance(time_value, str):
         time_value = time_value.strip()
         if not time_value:
             return 0.0
-        # 尝试解析 MM:SS 或 HH:MM:SS 格式
-        if ':' in time_value:
-            parts = time_value.split(':')
-            try:
-                if len(parts) == 2:  # MM:SS
-                    return float(parts[0]) * 60 + float(parts[1])
-                elif len(parts) == 3:  # HH:MM:SS
-                    return float(parts[0]) * 3600 + float(parts[1]) * 60 + float(parts[2])
-            except ValueError:
-                return 0.0
-        # 尝试直接转换为数字
+        # 尝试解析 MM:SS 或 HH:MM:SS 格式，其余直接转换为数字
         try:
-            return float(time_value)
+            if ':' not in time_value:
+                return float(time_value)
+            parts = time_value.split(':')
+            if len(parts) == 2:  # MM:SS
+                return float(parts[0]) * 60 + float(parts[1])
+            if len(parts) == 3:  # HH:MM:SS
+                return float(parts[0]) * 3600 + float(parts[1]) * 60 + float(parts[2])
         except ValueError:
-            return 0.0
+            pass
+        return 0.0
     return 0.0
 
+# 预编译正则：Film IR 时间戳 HH:MM:SS.mmm / MM:SS.mmm（小时部分可选）
+_FILM_IR_TS_RE = re.compile(r'(?:(\d+):)?(\d+):(\d+(?:\.\d+)?)')
+
+
+@lru_cache(maxsize=4096)
+def _parse_film_ir_time_str(time_str: str):
+    match = _FILM_IR_TS_RE.fullmatch(time_str.strip())
+    if match:
+        h, m, sec = match.groups()
+        return (int(h) * 3600 if h else 0) + int(m) * 60 + float(sec)
+    try:
+        return float(time_str)
+    except ValueError:
+        return None
+
+
+def parse_film_ir_time(time_str):
+    """解析 Film IR 时间格式 (HH:MM:SS.mmm 或 MM:SS.mmm 或数字)，无法解析返回 None"""
+    if time_str is None:
+        return None
+    if isinstance(time_str, (int, float)):
+        return float(time_str)
+    return _parse_film_ir_time_str(str(time_str))
+
+# 预编译正则：镜头编号 & 摄影参数标签 ([SCALE: ...] [POSITION: ...] 等)
+_SHOT_NUM_RE = re.compile(r'(\d+)')
+_TAG_RE = re.compile(r'\[(?:SCALE|POSITION|ORIENTATION|GAZE|MOTION):[^\]]*\]')
+
+
 def convert_shot_to_socialsaver(shot: Dict[str, Any], job_id: str, base_url: str = "") -> Dict[str, Any]:
     """
     将 ReTake 的 shot 格式转换为 SocialSaver 的 StoryboardShot 格式
     """
     # 提取 shot_number (shot_01 -> 1)
     shot_id = shot.get("shot_id", "shot_01")
-    shot_number = int(re.search(r'\d+', shot_id).group()) if re.search(r'\d+', shot_id) else 1
+    m = _SHOT_NUM_RE.search(shot_id)
+    shot_number = int(m.group(1)) if m else 1
 
     # 提取描述（去除摄影参数标签）
     description = shot.get("description", "")
     # 去除 [SCALE: ...] [POSITION: ...] 等标签，保留纯叙事
-    visual_description = re.sub(r'\[(?:SCALE|POSITION|ORIENTATION|GAZE|MOTION):[^\]]*\]', '', description).strip()
+    visual_description = _TAG_RE.sub('', description).strip()
 
     # 获取摄影参数
-    cinematography = shot.get("cinematography", {})
+    cinematography = shot.get("cinematography") or {}
+    focus_and_depth = cinematography.get("focus_and_depth", "") or cinematography.get("focal_depth", "")
 
     # 获取资源路径
-    assets = shot.get("assets", {})
+    assets = shot.get("assets") or {}
     first_frame = assets.get("first_frame", "")
     if first_frame and base_url:
         first_frame = f"{base_url}/assets/{job_id}/{first_frame}"
@@ -114,8 +182,8 @@ def convert_shot_to_socialsaver(shot: Dict[str, Any], job_id: str, base_url: str
         # 🎬 camera_movement (摄影机运动)
         "cameraMovement": cinematography.get("camera_movement", "") or cinematography.get("camera_type", "") or cinematography.get("motion_vector", ""),
         # 🎬 focus_and_depth (焦距与景深)
-        "focusAndDepth": cinematography.get("focus_and_depth", "") or cinematography.get("focal_depth", ""),
-        "focalLengthDepth": cinematography.get("focus_and_depth", "") or cinematography.get("focal_depth", ""),
+        "focusAndDepth": focus_and_depth,
+        "focalLengthDepth": focus_and_depth,
         # 🎬 lighting (光线)
         "lighting": shot.get("lighting", "") or cinematography.get("lighting", ""),
         # 🎬 music_and_sound (音乐与音效)
@@ -141,21 +209,25 @@ def convert_workflow_to_socialsaver(workflow: Dict[str, Any], base_url: str = ""
         for shot in shots
     ]
 
+    global_stages = workflow.get("global_stages") or {}
+
     return {
         "jobId": job_id,
         "sourceVideo": workflow.get("source_video", ""),
         "globalStyle": workflow.get("global", {}).get("style_prompt", ""),
         "storyboard": storyboard,
         "status": {
-            "analyze": workflow.get("global_stages", {}).get("analyze", "NOT_STARTED"),
-            "stylize": workflow.get("global_stages", {}).get("stylize", "NOT_STARTED"),
-            "videoGen": workflow.get("global_stages", {}).get("video_gen", "NOT_STARTED"),
-            "merge": workflow.get("global_stages", {}).get("merge", "NOT_STARTED")
+            "analyze": global_stages.get("analyze", "NOT_STARTED"),
+            "stylize": global_stages.get("stylize", "NOT_STARTED"),
+            "videoGen": global_stages.get("video_gen", "NOT_STARTED"),
+            "merge": global_stages.get("merge", "NOT_STARTED")
         }
     }
 
 
-Path("jobs").mkdir(parents=True, exist_ok=True)
+# 作业根目录：按源码位置解析，不依赖启动时的 cwd
+JOBS_ROOT = Path(__file__).resolve().parent / "jobs"
+JOBS_ROOT.mkdir(parents=True, exist_ok=True)
 Path("temp_uploads").mkdir(parents=True, exist_ok=True)
 
 # 1. 跨域配置
@@ -166,10 +238,89 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# 2. 初始化核心引擎
-# 创建全局 manager 实例
-manager = WorkflowManager() 
-agent = AgentEngine()
+
+# 2. JSON 响应压缩（/assets 下的视频 / 图片本身已压缩，且需要支持 Range 请求，直接跳过）
+class APIGZipMiddleware(GZipMiddleware):
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and scope["path"].startswith("/assets"):
+            await self.app(scope, receive, send)
+            return
+        await super().__call__(scope, receive, send)
+
+
+app.add_middleware(APIGZipMiddleware, minimum_size=1024, compresslevel=5)
+
+
+@lru_cache(maxsize=128)
+def _job_dir(job_id: str) -> Path:
+    return JOBS_ROOT / job_id
+
+
+# (扫描时间, job_id) —— 未指定 job 的轮询 2 秒内复用扫描结果，上传新视频后失效
+_LATEST_JOB: tuple = (0.0, None)
+_LATEST_JOB_TTL = 2.0
+
+
+def _latest_job() -> Optional[str]:
+    """扫描 jobs 目录，返回最近修改的 job_id（带短 TTL 缓存）"""
+    global _LATEST_JOB
+    now = time.monotonic()
+    if now - _LATEST_JOB[0] < _LATEST_JOB_TTL:
+        return _LATEST_JOB[1]
+
+    latest = None
+    try:
+        with os.scandir(JOBS_ROOT) as it:
+            dirs = [e for e in it if e.is_dir()]
+        if dirs:
+            latest = max(dirs, key=lambda e: e.stat().st_mtime).name
+    except FileNotFoundError:
+        pass
+
+    _LATEST_JOB = (now, latest)
+    return latest
+
+
+def _manager_for(job_id: Optional[str]) -> Optional[WorkflowManager]:
+    """
+    返回指向指定 job 的独立 WorkflowManager，避免并发请求互相改写全局 manager
+
+    Args:
+        job_id: 作业 ID；为空时回退到最近修改的 job
+
+    Returns:
+        WorkflowManager 实例，没有任何 job 时返回 None
+    """
+    target_id = job_id or _latest_job()
+    if not target_id:
+        return None
+    return WorkflowManager.for_job(target_id, _job_dir(target_id))
+
+
+def get_manager(job_id: Optional[str] = None) -> Optional[WorkflowManager]:
+    """FastAPI 依赖：按 job_id（query / path 参数）解析 WorkflowManager"""
+    return _manager_for(job_id)
+
+# --- 轮询接口 ETag 支持 ---
+def _file_etag(*paths: Path) -> str:
+    """根据文件 mtime + size 计算弱 ETag（文件不存在记为 0）"""
+    parts = []
+    for p in paths:
+        try:
+            st = os.stat(p)
+            parts.append(f"{st.st_mtime_ns:x}-{st.st_size:x}")
+        except OSError:
+            parts.append("0")
+    return f'W/"{"-".join(parts)}"'
+
+
+def _not_modified(request: Request, response: Response, etag: str) -> Optional[Response]:
+    """客户端 If-None-Match 命中时返回 304，否则给响应挂上 ETag"""
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers={"ETag": etag})
+    response.headers["ETag"] = etag
+    return None
+
 
 # --- 数据模型 ---
 class ChatRequest(BaseModel):
@@ -207,9 +358,7 @@ def _run_upload_analysis_background(job_id: str, video_path: Path):
         print(f"🧠 [AI 启动] 正在调用 Gemini 2.0 Flash 拆解分镜: {job_id}...")
 
         # 执行完整初始化 (Gemini + FFmpeg)
-        manager.job_id = job_id
-        manager.job_dir = Path("jobs") / job_id
-        manager._complete_initialization(video_path)
+        WorkflowManager.for_job(job_id, _job_dir(job_id))._complete_initialization(video_path)
 
         upload_analysis_tasks[job_id] = {
             "status": "completed",
@@ -231,6 +380,9 @@ def _run_upload_analysis_background(job_id: str, video_path: Path):
         }
 
 
+UPLOAD_CHUNK_SIZE = 4 * 1024 * 1024
+
+
 @app.post("/api/upload")
 async def upload_video(file: UploadFile = File(...), background_tasks: BackgroundTasks = None):
     """
@@ -241,7 +393,7 @@ async def upload_video(file: UploadFile = File(...), background_tasks: Backgroun
     try:
         # 1. 创建 job 目录
         new_job_id = f"job_{uuid.uuid4().hex[:8]}"
-        job_dir = Path("jobs") / new_job_id
+        job_dir = _job_dir(new_job_id)
         job_dir.mkdir(parents=True, exist_ok=True)
         (job_dir / "frames").mkdir(exist_ok=True)
         (job_dir / "videos").mkdir(exist_ok=True)
@@ -249,9 +401,15 @@ async def upload_video(file: UploadFile = File(...), background_tasks: Backgroun
         (job_dir / "stylized_frames").mkdir(exist_ok=True)
 
         # 2. 保存视频到 job 目录
+        # 💡 以 4MB 分块流式落盘，读写都不阻塞事件循环
         video_path = job_dir / "input.mp4"
-        with open(video_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
+        if aiofiles is not None:
+            async with aiofiles.open(video_path, "wb") as buffer:
+                while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+                    await buffer.write(chunk)
+        else:
+            with open(video_path, "wb") as buffer:
+                await run_in_threadpool(shutil.copyfileobj, file.file, buffer, UPLOAD_CHUNK_SIZE)
 
         print(f"📁 [已保存] 视频已保存到: {video_path}")
 
@@ -268,6 +426,10 @@ async def upload_video(file: UploadFile = File(...), background_tasks: Backgroun
 
         print(f"🚀 [异步模式] 已返回 job_id，分析在后台进行: {new_job_id}")
 
+        # 新 job 已落盘，使"最新 job"缓存失效
+        global _LATEST_JOB
+        _LATEST_JOB = (0.0, None)
+
         # 5. 立即返回 (不等待分析完成)
         return {
             "status": "processing",
@@ -289,7 +451,7 @@ async def get_upload_status(job_id: str):
         return upload_analysis_tasks[job_id]
 
     # 检查 job 是否存在
-    job_dir = Path("jobs") / job_id
+    job_dir = _job_dir(job_id)
     if job_dir.exists():
         # job 存在但不在追踪中 = 之前完成的 job
         workflow_path = job_dir / "workflow.json"
@@ -301,32 +463,30 @@ async def get_upload_status(job_id: str):
     raise HTTPException(status_code=404, detail=f"Job not found: {job_id}")
 
 @app.get("/api/workflow")
-async def get_workflow(job_id: Optional[str] = None):
+async def get_workflow(request: Request, response: Response, mgr: Optional[WorkflowManager] = Depends(get_manager)):
     """获取最新全局状态"""
-    target_id = job_id or manager.job_id
-    if not target_id:
-        jobs_dir = Path("jobs")
-        if jobs_dir.exists():
-            existing_jobs = sorted([d.name for d in jobs_dir.iterdir() if d.is_dir()], reverse=True)
-            if existing_jobs: target_id = existing_jobs[0]
-    
-    if not target_id:
+    if mgr is None:
         return {"error": "No jobs found"}
-        
+
     # 动态同步状态
-    manager.job_id = target_id
-    manager.job_dir = Path("jobs") / target_id
-    return manager.load()
+    workflow = await run_in_threadpool(mgr.load)
+
+    # load() 可能同步资产并回写，因此在其后计算 ETag
+    etag = _file_etag(mgr.job_dir / "workflow.json")
+    not_modified = _not_modified(request, response, etag)
+    if not_modified:
+        return not_modified
+    return workflow
 
 @app.post("/api/agent/chat")
 async def agent_chat(req: ChatRequest):
     """Agent 全局指挥"""
-    if req.job_id: 
-        manager.job_id = req.job_id
-        manager.job_dir = Path("jobs") / req.job_id
-        
+    mgr = _manager_for(req.job_id)
+    if mgr is None:
+        raise HTTPException(status_code=404, detail="No jobs found")
+
     # 先同步磁盘数据到内存
-    wf = manager.load()
+    wf = await run_in_threadpool(mgr.load)
     
     # 💡 必须包含所有分镜描述，Agent 才能找到所有主体进行替换
     all_descriptions = []
@@ -335,55 +495,70 @@ async def agent_chat(req: ChatRequest):
         if desc:
             all_descriptions.append(f"Shot {i+1}: {desc}")
     descriptions_text = "\n".join(all_descriptions) if all_descriptions else "No shots"
-    summary = f"Job ID: {manager.job_id}\nGlobal Style: {wf.get('global', {}).get('style_prompt')}\n\n[All Shot Descriptions]\n{descriptions_text}"
+    summary = f"Job ID: {mgr.job_id}\nGlobal Style: {wf.get('global', {}).get('style_prompt')}\n\n[All Shot Descriptions]\n{descriptions_text}"
     
-    action = agent.get_action_from_text(req.message, summary)
+    # Gemini 调用与 JSON 解析都是阻塞操作，放到线程池执行，不占用事件循环
+    action = await run_in_threadpool(app.state.agent.get_action_from_text, req.message, summary)
     if isinstance(action, list) or (isinstance(action, dict) and action.get("op") != "error"):
-        res = manager.apply_agent_action(action)
+        res = await run_in_threadpool(mgr.apply_agent_action, action)
         return {"action": action, "result": res}
     return {"action": action, "result": {"status": "error"}}
 
 @app.post("/api/shot/update")
 async def update_shot_params(req: ShotUpdateRequest):
     """形态 3：手动微调单个分镜 - 修复保存逻辑"""
-    if req.job_id:
-        manager.job_id = req.job_id
-        manager.job_dir = Path("jobs") / req.job_id
-    
-    # 💡 核心修复：修改前必须强制加载该 job 的最新磁盘数据，防止版本覆盖
-    manager.load()
-    
+    mgr = _manager_for(req.job_id)
+    if mgr is None:
+        raise HTTPException(status_code=404, detail="No jobs found")
+
     action = {
         "op": "update_shot_params",
         "shot_id": req.shot_id,
         "description": req.description
     }
-    
-    res = manager.apply_agent_action(action)
+
+    # apply_agent_action 在文件锁内重新读取磁盘最新版本再修改（防止版本覆盖）；
+    # 文件锁是阻塞调用，放到线程池执行，避免卡住事件循环
+    res = await run_in_threadpool(mgr.apply_agent_action, action)
     return res
 
 # ============================================================
 # SocialSaver 专用 API 端点
 # ============================================================
 
+# 📦 分镜表转换结果缓存：job_id -> (etag, result)，ETag 变化即失效
+_STORYBOARD_CACHE: "OrderedDict[str, tuple]" = OrderedDict()
+_STORYBOARD_CACHE_MAX = 32
+
+
 @app.get("/api/job/{job_id}/storyboard")
-async def get_storyboard_socialsaver(job_id: str):
+async def get_storyboard_socialsaver(job_id: str, request: Request, response: Response):
     """
     获取 SocialSaver 格式的分镜表
     返回格式与 SocialSaver 前端的 StoryboardShot[] 类型兼容
 
     优先使用 Film IR 数据（两阶段分析更准确），回退到 workflow 数据
     """
-    job_dir = Path("jobs") / job_id
+    job_dir = _job_dir(job_id)
     if not job_dir.exists():
         raise HTTPException(status_code=404, detail=f"Job not found: {job_id}")
 
-    manager.job_id = job_id
-    manager.job_dir = job_dir
-    workflow = manager.load()
+    workflow = await run_in_threadpool(_manager_for(job_id).load)
 
-    # 🎬 优先使用 Film IR 的镜头数据（更准确的两阶段分析）
+    # 🏷️ 分镜表由 workflow.json + film_ir.json 决定，二者均未变化时直接 304
     film_ir_path = job_dir / "film_ir.json"
+    etag = _file_etag(job_dir / "workflow.json", film_ir_path)
+    not_modified = _not_modified(request, response, etag)
+    if not_modified:
+        return not_modified
+
+    # 文件未变化时直接复用上次的转换结果（跳过 ffprobe + 逐镜头转换）
+    cached = _STORYBOARD_CACHE.get(job_id)
+    if cached and cached[0] == etag:
+        _STORYBOARD_CACHE.move_to_end(job_id)
+        return cached[1]
+
+    # 🎬 优先使用 Film IR 的镜头数据（更准确的两阶段分析）
     if film_ir_path.exists():
         try:
             film_ir = json.loads(film_ir_path.read_text(encoding="utf-8"))
@@ -410,31 +585,6 @@ async def get_storyboard_socialsaver(job_id: str):
                         pass
 
                 # 解析时间戳（Film IR 使用 startTime/endTime 字符串格式）
-                def parse_film_ir_time(time_str):
-                    """解析 Film IR 时间格式 (HH:MM:SS.mmm 或 MM:SS.mmm 或数字)"""
-                    if time_str is None:
-                        return None
-                    if isinstance(time_str, (int, float)):
-                        return float(time_str)
-                    try:
-                        return float(time_str)
-                    except (ValueError, TypeError):
-                        pass
-                    # 解析 HH:MM:SS.mmm 或 MM:SS.mmm 格式
-                    parts = str(time_str).split(":")
-                    try:
-                        if len(parts) == 3:
-                            h, m, s = parts
-                            return float(h) * 3600 + float(m) * 60 + float(s)
-                        elif len(parts) == 2:
-                            m, s = parts
-                            return float(m) * 60 + float(s)
-                        elif len(parts) == 1:
-                            return float(parts[0])
-                    except (ValueError, TypeError):
-                        pass
-                    return None
-
                 for ir_shot in ir_shots:
                     # 尝试从 startTime/endTime 解析
                     start = parse_film_ir_time(ir_shot.get("startTime")) or ir_shot.get("startSeconds")
@@ -551,7 +701,8 @@ async def get_storyboard_socialsaver(job_id: str):
                         # 🎬 合并为 voiceover
                         "voiceover": ((audio.get("dialogue") or "") + (" - " + (audio.get("dialogueText") or "") if audio.get("dialogueText") else "")).strip(),
                     })
-                workflow["shots"] = converted_shots
+                # 浅拷贝后替换，避免污染 manager.load() 的缓存对象
+                workflow = {**workflow, "shots": converted_shots}
         except Exception as e:
             print(f"⚠️ Failed to load Film IR shots: {e}")
 
@@ -559,6 +710,11 @@ async def get_storyboard_socialsaver(job_id: str):
     base_url = ""
 
     result = convert_workflow_to_socialsaver(workflow, base_url)
+
+    _STORYBOARD_CACHE[job_id] = (etag, result)
+    _STORYBOARD_CACHE.move_to_end(job_id)
+    while len(_STORYBOARD_CACHE) > _STORYBOARD_CACHE_MAX:
+        _STORYBOARD_CACHE.popitem(last=False)
     return result
 
 
@@ -567,39 +723,50 @@ async def get_single_shot_socialsaver(job_id: str, shot_id: str):
     """
     获取单个分镜的 SocialSaver 格式数据
     """
-    job_dir = Path("jobs") / job_id
+    job_dir = _job_dir(job_id)
     if not job_dir.exists():
         raise HTTPException(status_code=404, detail=f"Job not found: {job_id}")
 
-    manager.job_id = job_id
-    manager.job_dir = job_dir
-    workflow = manager.load()
+    mgr = _manager_for(job_id)
+    await run_in_threadpool(mgr.load)
 
-    for shot in workflow.get("shots", []):
-        if shot.get("shot_id") == shot_id:
-            return convert_shot_to_socialsaver(shot, job_id, "")
+    shot = mgr.get_shot(shot_id)
+    if shot is not None:
+        return convert_shot_to_socialsaver(shot, job_id, "")
 
     raise HTTPException(status_code=404, detail=f"Shot not found: {shot_id}")
 
 
 @app.get("/api/job/{job_id}/status")
-async def get_job_status(job_id: str):
+async def get_job_status(job_id: str, request: Request, response: Response):
     """
     获取作业状态摘要（用于前端轮询）
     """
-    job_dir = Path("jobs") / job_id
+    job_dir = _job_dir(job_id)
     if not job_dir.exists():
         raise HTTPException(status_code=404, detail=f"Job not found: {job_id}")
 
-    manager.job_id = job_id
-    manager.job_dir = job_dir
-    workflow = manager.load()
+    workflow = await run_in_threadpool(_manager_for(job_id).load)
+
+    etag = _file_etag(job_dir / "workflow.json")
+    not_modified = _not_modified(request, response, etag)
+    if not_modified:
+        return not_modified
 
     shots = workflow.get("shots", [])
     total = len(shots)
-    stylized = sum(1 for s in shots if s.get("status", {}).get("stylize") == "SUCCESS")
-    video_done = sum(1 for s in shots if s.get("status", {}).get("video_generate") == "SUCCESS")
-    running = sum(1 for s in shots if s.get("status", {}).get("stylize") == "RUNNING" or s.get("status", {}).get("video_generate") == "RUNNING")
+    # 单次遍历统计所有计数
+    stylized = video_done = running = 0
+    for s in shots:
+        st = s.get("status") or {}
+        sv = st.get("stylize")
+        vg = st.get("video_generate")
+        if sv == "SUCCESS":
+            stylized += 1
+        if vg == "SUCCESS":
+            video_done += 1
+        if sv == "RUNNING" or vg == "RUNNING":
+            running += 1
 
     return {
         "jobId": job_id,
@@ -614,25 +781,27 @@ async def get_job_status(job_id: str):
 
 
 @app.post("/api/run/{node_type}")
-async def run_task(node_type: str, background_tasks: BackgroundTasks, shot_id: Optional[str] = None, job_id: Optional[str] = None):
-    if job_id:
-        manager.job_id = job_id
-        manager.job_dir = Path("jobs") / job_id
+async def run_task(node_type: str, background_tasks: BackgroundTasks, shot_id: Optional[str] = None, mgr: Optional[WorkflowManager] = Depends(get_manager)):
+    if mgr is None:
+        raise HTTPException(status_code=404, detail="No jobs found")
 
     # 处理合并导出逻辑
     if node_type == "merge":
-        manager.load()
+        await run_in_threadpool(mgr.load)
         try:
-            result_file = manager.merge_videos()
-            return {"status": "success", "file": result_file, "job_id": manager.job_id}
+            # ffmpeg 合并耗时较长，放到线程池执行
+            result_file = await run_in_threadpool(mgr.merge_videos)
+            return {"status": "success", "file": result_file, "job_id": mgr.job_id}
         except Exception as e:
             raise HTTPException(status_code=500, detail=str(e))
 
     if node_type not in ["stylize", "video_generate"]:
         raise HTTPException(status_code=400, detail="Invalid node type")
 
-    background_tasks.add_task(manager.run_node, node_type, shot_id)
-    return {"status": "started", "job_id": manager.job_id}
+    # get_manager 返回的实例尚未加载：必须先读入 workflow，否则后台 run_node 会用空 dict 覆盖 workflow.json
+    await run_in_threadpool(mgr.load)
+    background_tasks.add_task(mgr.run_node, node_type, shot_id)
+    return {"status": "started", "job_id": mgr.job_id}
 
 
 # ============================================================
@@ -653,7 +822,7 @@ def _run_batch_video_generation_serial(job_id: str):
     import random
     from core.runner import veo_generate_video, seedance_generate_video, save_workflow, load_workflow
 
-    job_dir = Path("jobs") / job_id
+    job_dir = _job_dir(job_id)
     wf = load_workflow(job_dir)
 
     shots = wf.get("shots", [])
@@ -761,7 +930,7 @@ async def generate_videos_batch(job_id: str, background_tasks: BackgroundTasks):
     - 随机抖动：重试时增加 5-15 秒随机延迟
     - 熔断机制：连续 3 次失败后暂停
     """
-    job_dir = Path("jobs") / job_id
+    job_dir = _job_dir(job_id)
     if not job_dir.exists():
         raise HTTPException(status_code=404, detail=f"Job not found: {job_id}")
 
@@ -784,7 +953,7 @@ async def get_film_ir(job_id: str):
     """
     获取完整 Film IR 数据
     """
-    job_dir = Path("jobs") / job_id
+    job_dir = _job_dir(job_id)
     if not job_dir.exists():
         raise HTTPException(status_code=404, detail=f"Job not found: {job_id}")
 
@@ -800,7 +969,7 @@ async def get_film_ir_story_theme(job_id: str):
     """
     获取支柱 I: Story Theme (对应前端九维表格)
     """
-    job_dir = Path("jobs") / job_id
+    job_dir = _job_dir(job_id)
     if not job_dir.exists():
         raise HTTPException(status_code=404, detail=f"Job not found: {job_id}")
 
@@ -818,7 +987,7 @@ async def get_film_ir_narrative(job_id: str):
     """
     获取支柱 II: Narrative Template (对应前端 Script Analysis)
     """
-    job_dir = Path("jobs") / job_id
+    job_dir = _job_dir(job_id)
     if not job_dir.exists():
         raise HTTPException(status_code=404, detail=f"Job not found: {job_id}")
 
@@ -836,7 +1005,7 @@ async def get_film_ir_shots(job_id: str, request: Request):
     """
     获取支柱 III: Shot Recipe (分镜列表)
     """
-    job_dir = Path("jobs") / job_id
+    job_dir = _job_dir(job_id)
     if not job_dir.exists():
         raise HTTPException(status_code=404, detail=f"Job not found: {job_id}")
 
@@ -852,7 +1021,7 @@ async def get_film_ir_render_strategy(job_id: str):
     """
     获取支柱 IV: Render Strategy (执行层)
     """
-    job_dir = Path("jobs") / job_id
+    job_dir = _job_dir(job_id)
     if not job_dir.exists():
         raise HTTPException(status_code=404, detail=f"Job not found: {job_id}")
 
@@ -863,14 +1032,19 @@ async def get_film_ir_render_strategy(job_id: str):
 
 
 @app.get("/api/job/{job_id}/film_ir/stages")
-async def get_film_ir_stages(job_id: str):
+async def get_film_ir_stages(job_id: str, request: Request, response: Response):
     """
     获取 Film IR 阶段状态
     """
-    job_dir = Path("jobs") / job_id
+    job_dir = _job_dir(job_id)
     if not job_dir.exists():
         raise HTTPException(status_code=404, detail=f"Job not found: {job_id}")
 
+    etag = _file_etag(job_dir / "film_ir.json")
+    not_modified = _not_modified(request, response, etag)
+    if not_modified:
+        return not_modified
+
     ir_manager = FilmIRManager(job_id)
 
     return {
@@ -894,7 +1068,7 @@ async def trigger_remix(job_id: str, request: RemixRequest, background_tasks: Ba
         prompt: 用户的二创意图描述
         reference_images: 参考图片路径列表 (可选)
     """
-    job_dir = Path("jobs") / job_id
+    job_dir = _job_dir(job_id)
     if not job_dir.exists():
         raise HTTPException(status_code=404, detail=f"Job not found: {job_id}")
 
@@ -914,7 +1088,9 @@ async def trigger_remix(job_id: str, request: RemixRequest, background_tasks: Ba
     )
 
     # 后台执行意图注入管线
-    async def run_remix_pipeline():
+    # 💡 必须是同步函数：BackgroundTasks 会把同步任务放进线程池，
+    # 若写成 async def，run_stage 内的阻塞 Gemini 调用会卡住整个事件循环
+    def run_remix_pipeline():
         try:
             # Stage 3: Intent Injection (M4 核心)
             result = ir_manager.run_stage("intentInjection")
@@ -946,7 +1122,7 @@ async def get_remix_status(job_id: str):
     """
     获取 Remix 状态
     """
-    job_dir = Path("jobs") / job_id
+    job_dir = _job_dir(job_id)
     if not job_dir.exists():
         raise HTTPException(status_code=404, detail=f"Job not found: {job_id}")
 
@@ -999,7 +1175,7 @@ async def get_remix_diff(job_id: str):
     """
     获取 concrete vs remixed 的差异对比 (用于前端 Diff View)
     """
-    job_dir = Path("jobs") / job_id
+    job_dir = _job_dir(job_id)
     if not job_dir.exists():
         raise HTTPException(status_code=404, detail=f"Job not found: {job_id}")
 
@@ -1029,7 +1205,7 @@ async def get_remix_prompts(job_id: str):
     """
     获取所有 remixed 的 T2I/I2V prompts (用于执行生成)
     """
-    job_dir = Path("jobs") / job_id
+    job_dir = _job_dir(job_id)
     if not job_dir.exists():
         raise HTTPException(status_code=404, detail=f"Job not found: {job_id}")
 
@@ -1089,7 +1265,6 @@ def generate_storyboard_frame(
     import io
     import base64
     from PIL import Image
-    from google import genai
     from google.genai import types
 
     # 创建 storyboard_frames 目录
@@ -1211,7 +1386,7 @@ def generate_storyboard_frame(
         api_key = api_key.strip()
         api_key = ''.join(c for c in api_key if c.isascii() and c.isprintable())
 
-        client = genai.Client(api_key=api_key)
+        client = get_genai_client(api_key)
 
         if has_reference:
             # ✅ 有参考图：使用图片编辑模式，保持构图一致性
@@ -1447,7 +1622,7 @@ async def generate_remix_storyboard(job_id: str, background_tasks: BackgroundTas
     - 应用 Visual Style 配置
     - 调用 gemini-3-pro-image-preview 生成图片
     """
-    job_dir = Path("jobs") / job_id
+    job_dir = _job_dir(job_id)
     if not job_dir.exists():
         raise HTTPException(status_code=404, detail=f"Job not found: {job_id}")
 
@@ -1719,11 +1894,10 @@ async def storyboard_chat(job_id: str, request: StoryboardChatRequest):
     1. 参数修改（时长、镜头类型等）
     2. AI 重新生成特定镜头的 prompt
     """
-    job_dir = Path("jobs") / job_id
+    job_dir = _job_dir(job_id)
     if not job_dir.exists():
         raise HTTPException(status_code=404, detail=f"Job not found: {job_id}")
 
-    from google import genai
     from google.genai import types
 
     api_key = os.getenv("GEMINI_API_KEY")
@@ -1731,7 +1905,7 @@ async def storyboard_chat(job_id: str, request: StoryboardChatRequest):
     if api_key:
         api_key = api_key.strip()
         api_key = ''.join(c for c in api_key if c.isascii() and c.isprintable())
-    client = genai.Client(api_key=api_key)
+    client = get_genai_client(api_key)
 
     ir_manager = FilmIRManager(job_id)
     remixed_layer = ir_manager.get_remixed_layer()
@@ -1910,7 +2084,7 @@ async def regenerate_storyboard_frames(job_id: str, request: RegenerateFramesReq
 
     根据更新后的 prompt 重新生成分镜图，让用户在生成视频前预览效果。
     """
-    job_dir = Path("jobs") / job_id
+    job_dir = _job_dir(job_id)
     if not job_dir.exists():
         raise HTTPException(status_code=404, detail=f"Job not found: {job_id}")
 
@@ -1995,7 +2169,7 @@ async def finalize_storyboard(job_id: str, request: FinalizeStoryboardRequest):
 
     这是数据唯一事实来源的最后一道防线。
     """
-    job_dir = Path("jobs") / job_id
+    job_dir = _job_dir(job_id)
     if not job_dir.exists():
         raise HTTPException(status_code=404, detail=f"Job not found: {job_id}")
 
@@ -2161,7 +2335,7 @@ async def trigger_asset_generation(job_id: str, background_tasks: BackgroundTask
     生成角色三视图和环境参考图，使用 Gemini 3 Pro Image。
     由于生成需要 20-40 秒，以后台任务方式运行。
     """
-    job_dir = Path("jobs") / job_id
+    job_dir = _job_dir(job_id)
     if not job_dir.exists():
         raise HTTPException(status_code=404, detail=f"Job not found: {job_id}")
 
@@ -2213,7 +2387,7 @@ async def get_asset_generation_status(job_id: str):
         status: running / completed / failed / not_started
         progress: 生成进度
     """
-    job_dir = Path("jobs") / job_id
+    job_dir = _job_dir(job_id)
     if not job_dir.exists():
         raise HTTPException(status_code=404, detail=f"Job not found: {job_id}")
 
@@ -2240,7 +2414,7 @@ async def get_generated_assets(job_id: str):
         characters: 角色三视图路径
         environments: 环境参考图路径
     """
-    job_dir = Path("jobs") / job_id
+    job_dir = _job_dir(job_id)
     if not job_dir.exists():
         raise HTTPException(status_code=404, detail=f"Job not found: {job_id}")
 
@@ -2398,7 +2572,7 @@ async def get_entity_state(job_id: str, anchor_id: str):
     Returns:
         anchorId, name, description, entityType, threeViews (with status per slot)
     """
-    job_dir = Path("jobs") / job_id
+    job_dir = _job_dir(job_id)
     if not job_dir.exists():
         raise HTTPException(status_code=404, detail=f"Job not found: {job_id}")
 
@@ -2463,7 +2637,7 @@ async def update_entity_description(job_id: str, anchor_id: str, request: Update
     更新实体的描述（用于 AI 生成时使用）
     支持通过 anchorId（identityAnchors）或 entityId（characterLedger）查找
     """
-    job_dir = Path("jobs") / job_id
+    job_dir = _job_dir(job_id)
     if not job_dir.exists():
         raise HTTPException(status_code=404, detail=f"Job not found: {job_id}")
 
@@ -2516,7 +2690,7 @@ async def upload_entity_view(job_id: str, anchor_id: str, view: str, file: Uploa
             - 角色: front, side, back
             - 场景: wide, detail, alt
     """
-    job_dir = Path("jobs") / job_id
+    job_dir = _job_dir(job_id)
     if not job_dir.exists():
         raise HTTPException(status_code=404, detail=f"Job not found: {job_id}")
 
@@ -2589,7 +2763,7 @@ async def generate_entity_views(
     已上传的图片会作为 AI 生成的参考。
     """
     force = request.force if request else False
-    job_dir = Path("jobs") / job_id
+    job_dir = _job_dir(job_id)
     if not job_dir.exists():
         raise HTTPException(status_code=404, detail=f"Job not found: {job_id}")
 
@@ -2858,7 +3032,7 @@ async def set_meta_prompt(job_id: str, request: MetaPromptRequest):
     """
     设置 Meta Prompt (热更新)
     """
-    job_dir = Path("jobs") / job_id
+    job_dir = _job_dir(job_id)
     if not job_dir.exists():
         raise HTTPException(status_code=404, detail=f"Job not found: {job_id}")
 
@@ -2876,7 +3050,7 @@ async def get_hidden_template(job_id: str):
     """
     获取隐形模板 (抽象层数据)
     """
-    job_dir = Path("jobs") / job_id
+    job_dir = _job_dir(job_id)
     if not job_dir.exists():
         raise HTTPException(status_code=404, detail=f"Job not found: {job_id}")
 
@@ -2896,7 +3070,7 @@ async def get_character_ledger(job_id: str):
     获取角色清单 (Character Ledger)
     用于前端 Video Analysis 阶段展示已识别的角色/实体
     """
-    job_dir = Path("jobs") / job_id
+    job_dir = _job_dir(job_id)
     if not job_dir.exists():
         raise HTTPException(status_code=404, detail=f"Job not found: {job_id}")
 
@@ -2963,7 +3137,7 @@ async def bind_asset_to_entity(job_id: str, request: BindAssetRequest):
     - 后端更新 identityMapping 矩阵
     - 后续生成时自动应用到所有引用该实体的镜头
     """
-    job_dir = Path("jobs") / job_id
+    job_dir = _job_dir(job_id)
     if not job_dir.exists():
         raise HTTPException(status_code=404, detail=f"Job not found: {job_id}")
 
@@ -3058,7 +3232,7 @@ async def unbind_asset(job_id: str, entity_id: str):
     """
     解除资产绑定
     """
-    job_dir = Path("jobs") / job_id
+    job_dir = _job_dir(job_id)
     if not job_dir.exists():
         raise HTTPException(status_code=404, detail=f"Job not found: {job_id}")
 
@@ -3101,7 +3275,7 @@ async def get_sound_design(job_id: str):
     """
     获取 Sound Design 配置
     """
-    job_dir = Path("jobs") / job_id
+    job_dir = _job_dir(job_id)
     if not job_dir.exists():
         raise HTTPException(status_code=404, detail=f"Job not found: {job_id}")
 
@@ -3126,7 +3300,7 @@ async def save_sound_design(job_id: str, request: SoundDesignRequest):
     """
     保存 Sound Design 配置
     """
-    job_dir = Path("jobs") / job_id
+    job_dir = _job_dir(job_id)
     if not job_dir.exists():
         raise HTTPException(status_code=404, detail=f"Job not found: {job_id}")
 
@@ -3168,7 +3342,7 @@ async def get_visual_style(job_id: str):
     """
     获取 Visual Style 配置
     """
-    job_dir = Path("jobs") / job_id
+    job_dir = _job_dir(job_id)
     if not job_dir.exists():
         raise HTTPException(status_code=404, detail=f"Job not found: {job_id}")
 
@@ -3193,7 +3367,7 @@ async def save_visual_style(job_id: str, request: VisualStyleRequest):
     """
     保存 Visual Style 配置
     """
-    job_dir = Path("jobs") / job_id
+    job_dir = _job_dir(job_id)
     if not job_dir.exists():
         raise HTTPException(status_code=404, detail=f"Job not found: {job_id}")
 
@@ -3228,7 +3402,7 @@ async def upload_visual_style_reference(job_id: str, file: UploadFile = File(...
     """
     上传 Visual Style 参考图片
     """
-    job_dir = Path("jobs") / job_id
+    job_dir = _job_dir(job_id)
     if not job_dir.exists():
         raise HTTPException(status_code=404, detail=f"Job not found: {job_id}")
 
@@ -3278,7 +3452,7 @@ async def delete_visual_style_reference(job_id: str, index: int):
     """
     删除 Visual Style 参考图片
     """
-    job_dir = Path("jobs") / job_id
+    job_dir = _job_dir(job_id)
     if not job_dir.exists():
         raise HTTPException(status_code=404, detail=f"Job not found: {job_id}")
 
@@ -3325,7 +3499,7 @@ async def get_products(job_id: str):
     """
     获取所有产品列表
     """
-    job_dir = Path("jobs") / job_id
+    job_dir = _job_dir(job_id)
     if not job_dir.exists():
         raise HTTPException(status_code=404, detail=f"Job not found: {job_id}")
 
@@ -3346,7 +3520,7 @@ async def create_product(job_id: str, request: CreateProductRequest):
     """
     创建新产品
     """
-    job_dir = Path("jobs") / job_id
+    job_dir = _job_dir(job_id)
     if not job_dir.exists():
         raise HTTPException(status_code=404, detail=f"Job not found: {job_id}")
 
@@ -3399,7 +3573,7 @@ async def update_product(job_id: str, product_id: str, request: UpdateProductReq
     """
     更新产品信息
     """
-    job_dir = Path("jobs") / job_id
+    job_dir = _job_dir(job_id)
     if not job_dir.exists():
         raise HTTPException(status_code=404, detail=f"Job not found: {job_id}")
 
@@ -3432,7 +3606,7 @@ async def delete_product(job_id: str, product_id: str):
     """
     删除产品
     """
-    job_dir = Path("jobs") / job_id
+    job_dir = _job_dir(job_id)
     if not job_dir.exists():
         raise HTTPException(status_code=404, detail=f"Job not found: {job_id}")
 
@@ -3470,7 +3644,7 @@ async def upload_product_view(job_id: str, product_id: str, view: str, file: Upl
     if view not in ["front", "side", "back"]:
         raise HTTPException(status_code=400, detail=f"Invalid view: {view}. Must be front, side, or back.")
 
-    job_dir = Path("jobs") / job_id
+    job_dir = _job_dir(job_id)
     if not job_dir.exists():
         raise HTTPException(status_code=404, detail=f"Job not found: {job_id}")
 
@@ -3520,7 +3694,7 @@ async def get_product_state(job_id: str, product_id: str):
     """
     获取产品状态（用于轮询生成进度）
     """
-    job_dir = Path("jobs") / job_id
+    job_dir = _job_dir(job_id)
     if not job_dir.exists():
         raise HTTPException(status_code=404, detail=f"Job not found: {job_id}")
 
@@ -3570,7 +3744,7 @@ async def generate_product_views(
     """
     AI 生成产品三视图
     """
-    job_dir = Path("jobs") / job_id
+    job_dir = _job_dir(job_id)
     if not job_dir.exists():
         raise HTTPException(status_code=404, detail=f"Job not found: {job_id}")
 
@@ -3621,7 +3795,7 @@ def run_product_generation_background(job_id: str, product_id: str, description:
     """
     from core.asset_generator import generate_product_views_with_imagen
 
-    job_dir = Path("jobs") / job_id
+    job_dir = _job_dir(job_id)
     three_views_dir = job_dir / "three_views" / product_id
     three_views_dir.mkdir(parents=True, exist_ok=True)
 
@@ -3667,7 +3841,7 @@ async def get_shot_analysis_status(job_id: str):
     """
     获取 Shot Recipe 分析状态，包括降级批次信息
     """
-    job_dir = Path("jobs") / job_id
+    job_dir = _job_dir(job_id)
     if not job_dir.exists():
         raise HTTPException(status_code=404, detail=f"Job not found: {job_id}")
 
@@ -3705,10 +3879,9 @@ async def retry_shot_analysis(job_id: str, request: RetryBatchRequest = None):
     可选指定 batchIndex 重试单个批次，否则重试所有降级批次
     """
     import os
-    from google import genai
     from google.genai import types as genai_types
 
-    job_dir = Path("jobs") / job_id
+    job_dir = _job_dir(job_id)
     if not job_dir.exists():
         raise HTTPException(status_code=404, detail=f"Job not found: {job_id}")
 
@@ -3754,7 +3927,7 @@ async def retry_shot_analysis(job_id: str, request: RetryBatchRequest = None):
     api_key = api_key.strip()
     api_key = ''.join(c for c in api_key if c.isascii() and c.isprintable())
 
-    client = genai.Client(api_key=api_key)
+    client = get_genai_client(api_key)
 
     # 上传视频
     try:
@@ -3875,20 +4048,33 @@ async def retry_shot_analysis(job_id: str, request: RetryBatchRequest = None):
     }
 
 
-# --- 核心：防缓存中间件 ---
-@app.middleware("http")
-async def add_no_cache_header(request, call_next):
-    response = await call_next(request)
-    if request.url.path.startswith("/assets"):
-        response.headers["Cache-Control"] = "no-store, no-cache, must-revalidate, max-age=0"
-        response.headers["Pragma"] = "no-cache"
-        response.headers["Expires"] = "0"
-    return response
+# --- 核心：静态资源强制重新验证 ---
+# 生产环境由 Nginx 直接提供 /assets（见 nginx.conf），设置 SERVE_ASSETS=0 即可关闭此处挂载
+class NoCacheStaticFiles(StaticFiles):
+    """
+    /assets 响应要求每次使用前重新验证（no-cache），而不是禁止缓存（no-store）：
+    StaticFiles 自带 ETag / Last-Modified，文件未重新生成时浏览器拿到 304，不必重复下载视频
+    """
+
+    async def get_response(self, path, scope):
+        response = await super().get_response(path, scope)
+        response.headers["Cache-Control"] = "no-cache, must-revalidate"
+        return response
 
-# 挂载静态资源目录
-app.mount("/assets", StaticFiles(directory="jobs", check_dir=False), name="assets")
+if os.getenv("SERVE_ASSETS", "1") != "0":
+    # 挂载静态资源目录
+    app.mount("/assets", NoCacheStaticFiles(directory=JOBS_ROOT, check_dir=False), name="assets")
 
 if __name__ == "__main__":
+    import sys
     import uvicorn
-    # 启动服务
-    uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
+    # 启动服务 (uvloop + httptools；Windows 下 uvloop 不可用，回退 asyncio)
+    uvicorn.run(
+        "app:app",
+        host="0.0.0.0",
+        port=8000,
+        loop="asyncio" if sys.platform == "win32" else "uvloop",
+        http="httptools",
+        log_level="warning",
+        access_log=False,
+    )
\ No newline at end of file
@@ -1,16 +1,11 @@
-import json
 import argparse
 from pathlib import Path
 
+from core.workflow_io import load_workflow, save_workflow
+
 PROJECT_DIR = Path(__file__).parent
 DEFAULT_JOB_ID = "demo_job_001"
 
-def load_workflow(job_dir: Path) -> dict:
-    return json.loads((job_dir / "workflow.json").read_text(encoding="utf-8"))
-
-def save_workflow(job_dir: Path, wf: dict) -> None:
-    (job_dir / "workflow.json").write_text(json.dumps(wf, ensure_ascii=False, indent=2), encoding="utf-8")
-
 def apply_global_style(wf: dict, new_style_prompt: str, cascade: bool = True) -> int:
     """
     修改全局风格，并级联使相关节点需要重跑。
@@ -65,7 +60,7 @@ def main():
 
     if args.set_global_style is not None:
         affected = apply_global_style(wf, args.set_global_style, cascade=(not args.no_cascade))
-        save_workflow(job_dir, wf)
+        save_workflow(job_dir, wf, pretty=True)
         print(f"✅ 已更新 global.style_prompt")
         print(f"✅ 受影响 shots：{affected}（stylize/video_generate 已标记为 NOT_STARTED）")
     else:
@@ -74,7 +69,7 @@ def main():
     
     if args.replace_entity and args.new_ref:
         affected = replace_entity_reference(wf, args.replace_entity, args.new_ref)
-        save_workflow(job_dir, wf)
+        save_workflow(job_dir, wf, pretty=True)
         print(f"✅ 已替换 {args.replace_entity} 的 reference_image -> {args.new_ref}")
         print(f"✅ 受影响 shots：{affected}（stylize/video_generate 已标记为 NOT_STARTED）")
         return
@@ -2,27 +2,27 @@
 import os
 import json
 import re
-from google import genai
+import copy
+import time
+import hashlib
+import threading
+from collections import OrderedDict
 from google.genai import types # 💡 引入类型定义
 from typing import Dict, Any, List, Union
 
-class AgentEngine:
-    def __init__(self):
-        api_key = os.getenv("GEMINI_API_KEY")
-        if not api_key:
-            raise RuntimeError("未检测到 GEMINI_API_KEY")
-        # Sanitize API key to remove non-ASCII characters (fixes encoding errors in HTTP headers)
-        api_key = api_key.strip()
-        api_key = ''.join(c for c in api_key if c.isascii() and c.isprintable())
-        self.client = genai.Client(api_key=api_key)
-        self.model_id = "gemini-3-flash-preview" 
+from core.utils import get_genai_client
 
-    def get_action_from_text(self, user_input: str, workflow_summary: str) -> Union[Dict, List]:
-        system_prompt = f"""
-你是一个专业的视频导演助理。你必须根据用户需求生成工作流修改指令。
+# ⚡ 优先使用 orjson 解析 Agent 输出，未安装时回退标准库
+try:
+    import orjson
+    _json_loads = orjson.loads
+except ImportError:
+    _json_loads = json.loads
 
-[当前工作流状态摘要]
-{workflow_summary}
+# 📜 固定的系统指令（不含任何插值），作为请求的第一段内容保持不变，便于 Gemini 前缀缓存命中
+_SYSTEM_PROMPT_HEAD = """
+你是一个专业的视频导演助理。你必须根据用户需求生成工作流修改指令。
+工作流状态摘要会在下一段内容 [当前工作流状态摘要] 中给出。
 
 🎬 [摄影参数保真原则 - CINEMATOGRAPHY FIDELITY - 最高优先级]
 每个分镜都有从源视频中提取的摄影参数（标签形式存储在描述中），这些参数必须被保护：
@@ -38,7 +38,7 @@ class AgentEngine:
 - 描述增强：只添加新内容，不删除或修改现有摄影参数标签
 
 [指令逻辑规范 - 极其重要]
-1. 修改全局风格: {{"op": "set_global_style", "value": "风格关键词"}}
+1. 修改全局风格: {"op": "set_global_style", "value": "风格关键词"}
    - 🎨 风格输出格式：value 字段必须是简洁的风格关键词，禁止使用冗长句子
      * ✅ 正确: "Cyberpunk Neon"
      * ✅ 正确: "Studio Ghibli Anime"
@@ -59,7 +59,7 @@ class AgentEngine:
   * 物体特写（object close-up, food, vehicle）
   * 无人物的过渡镜头
 
-2. 全局主体替换（简单）: {{"op": "global_subject_swap", "old_subject": "英文原词", "new_subject": "英文新词"}}
+2. 全局主体替换（简单）: {"op": "global_subject_swap", "old_subject": "英文原词", "new_subject": "英文新词"}
    - 方向逻辑："把 A 换成 B"意味着 A 是旧的(old)，B 是新的(new)。
    - 匹配要求：你必须观察 [摘要] 中的 Shot Descriptions，找出其中真正存在的英文单词作为 "old_subject"。
    - 翻译要求：如果用户说"男人"，而摘要里是 "man"，请使用 "man"；如果用户说"小孩"，请翻译为 "child"。
@@ -67,13 +67,13 @@ class AgentEngine:
    - 🆔 身份锚定：系统自动处理，风景/空镜头会被智能跳过
    - ⚠️ 仅用于无属性描述的简单替换（如"把男人换成女人"）
 
-2b. 🎨 细粒度角色替换（带视觉属性）: {{"op": "detailed_subject_swap", "old_subject": "英文原词", "new_subject": "英文新主体", "attributes": {{...}}}}
+2b. 🎨 细粒度角色替换（带视觉属性）: {"op": "detailed_subject_swap", "old_subject": "英文原词", "new_subject": "英文新主体", "attributes": {...}}
    - 🔍 触发条件：当用户提供详细的视觉描述时使用此操作，例如：
      * "把男人换成一个金色短发、穿红衣服的女人"
      * "Replace the man with a young woman with blue eyes and silver hair"
      * "把小孩换成一个戴眼镜的老人"
    - 📝 attributes 对象必须提取所有视觉描述符（只填写用户明确提到的）：
-     {{
+     {
        "hair_style": "short/long/curly/straight/bald/ponytail...",
        "hair_color": "golden/black/brown/silver/red/blonde...",
        "eye_color": "blue/green/brown/hazel...",
@@ -84,13 +84,13 @@ class AgentEngine:
        "body_type": "slim/muscular/petite/tall...",
        "facial_features": "beard/freckles/scar/dimples...",
        "other_visual": "任何其他视觉特征..."
-     }}
+     }
    - ⚠️ 只填写用户明确提到的属性，未提及的属性不要添加
    - 🎬 摄影保真：所有视觉属性将被注入叙事层，但摄影参数标签保持不变
    - 🆔 身份锚定：角色描述将作为Global Identity Anchor存储，并传播到所有主角分镜
    - 🏞️ 场景保护：风景/空镜头自动跳过，保持原始语义意图
 
-3. 增强分镜描述: {{"op": "enhance_shot_description", "shot_id": "shot_XX", "spatial_info": "空间位置描述", "style_boost": "风格强化描述"}}
+3. 增强分镜描述: {"op": "enhance_shot_description", "shot_id": "shot_XX", "spatial_info": "空间位置描述", "style_boost": "风格强化描述"}
    - 📐 空间感知（必须保持 16:9 宽屏构图）：
      * "subject positioned on the left side of the 16:9 widescreen frame"
      * "character facing right in cinematic widescreen composition"
@@ -99,7 +99,7 @@ class AgentEngine:
    - ⚠️ 严禁任何 1:1 正方形或竖屏构图描述
    - 🎬 摄影保真：增强描述时，现有的摄影参数标签会被自动保留
 
-4. 修改摄影参数（仅当用户明确要求时使用）: {{"op": "update_cinematography", "shot_id": "shot_XX", "param": "参数名", "value": "新值"}}
+4. 修改摄影参数（仅当用户明确要求时使用）: {"op": "update_cinematography", "shot_id": "shot_XX", "param": "参数名", "value": "新值"}
    - 参数名可以是: "shot_scale", "subject_frame_position", "subject_orientation", "gaze_direction", "motion_vector"
    - ⚠️ 只有当用户明确说"把镜头改成特写"、"让人物转向左边"等明确修改摄影参数的指令时才使用此操作
 
@@ -110,22 +110,152 @@ class AgentEngine:
 - set_global_style 的 value 必须是 2-4 个单词的简洁风格关键词，禁止使用 "Total transformation"、"Hyper-stylized"、"Complete overhaul" 等填充句式。
 - 默认保护摄影参数，除非用户明确要求修改。
 """
+
+
+# 🧩 输出结构约束：让 Gemini 按 schema 受约束解码，只能生成合法的指令列表
+_STR = types.Schema(type="STRING")
+_ACTION_SCHEMA = types.Schema(
+    type="ARRAY",
+    items=types.Schema(
+        type="OBJECT",
+        properties={
+            "op": types.Schema(
+                type="STRING",
+                enum=[
+                    "set_global_style",
+                    "global_subject_swap",
+                    "detailed_subject_swap",
+                    "enhance_shot_description",
+                    "update_cinematography",
+                ],
+            ),
+            "value": _STR,
+            "old_subject": _STR,
+            "new_subject": _STR,
+            "attributes": types.Schema(
+                type="OBJECT",
+                properties={
+                    k: _STR for k in (
+                        "hair_style", "hair_color", "eye_color", "skin_tone",
+                        "age_descriptor", "clothing", "accessories",
+                        "body_type", "facial_features", "other_visual",
+                    )
+                },
+            ),
+            "shot_id": _STR,
+            "spatial_info": _STR,
+            "style_boost": _STR,
+            "param": types.Schema(
+                type="STRING",
+                enum=[
+                    "shot_scale",
+                    "subject_frame_position",
+                    "subject_orientation",
+                    "gaze_direction",
+                    "motion_vector",
+                ],
+            ),
+        },
+        required=["op"],
+    ),
+)
+
+
+
+def _parse_agent_json(text: str) -> Union[Dict, List]:
+    """
+    解析 Agent 输出：先做首字符快速校验，明显不是 JSON 的直接报错；
+    若解析失败，再尝试截取 [...] 片段一次（兼容被 markdown 代码块包裹的输出）
+    """
+    text = (text or "").strip()
+    if not text:
+        raise ValueError("empty response")
+    if text[0] not in "[{":
+        start, end = text.find("["), text.rfind("]")
+        if start < 0 or end <= start:
+            raise ValueError("non-JSON response")
+        return _json_loads(text[start:end + 1])
+    try:
+        return _json_loads(text)
+    except ValueError:
+        start, end = text.find("["), text.rfind("]")
+        if start < 0 or end <= start:
+            raise
+        return _json_loads(text[start:end + 1])
+
+# 🧠 Agent 决策缓存：相同 (用户指令, 工作流摘要) 在 TTL 内直接复用上次结果，省去一次 Gemini 调用
+_AGENT_CACHE: "OrderedDict[bytes, tuple]" = OrderedDict()
+_AGENT_CACHE_MAX = 512
+_AGENT_CACHE_TTL = 600  # 秒
+# 🔒 get_action_from_text 经 run_in_threadpool 在多个线程中调用，缓存的读改写需加锁
+_AGENT_CACHE_LOCK = threading.Lock()
+
+
+def _agent_cache_get(key: bytes):
+    with _AGENT_CACHE_LOCK:
+        entry = _AGENT_CACHE.get(key)
+        if entry is None:
+            return None
+        stored_at, value = entry
+        if time.monotonic() - stored_at > _AGENT_CACHE_TTL:
+            _AGENT_CACHE.pop(key, None)
+            return None
+        _AGENT_CACHE.move_to_end(key)
+    # 调用方可能修改返回的指令，返回副本（缓存中的值不会被原地修改，可在锁外复制）
+    return copy.deepcopy(value)
+
+
+def _agent_cache_put(key: bytes, value) -> None:
+    entry = (time.monotonic(), copy.deepcopy(value))
+    with _AGENT_CACHE_LOCK:
+        _AGENT_CACHE[key] = entry
+        _AGENT_CACHE.move_to_end(key)
+        while len(_AGENT_CACHE) > _AGENT_CACHE_MAX:
+            _AGENT_CACHE.popitem(last=False)
+
+
+class AgentEngine:
+    def __init__(self):
+        api_key = os.getenv("GEMINI_API_KEY")
+        if not api_key:
+            raise RuntimeError("未检测到 GEMINI_API_KEY")
+        # Sanitize API key to remove non-ASCII characters (fixes encoding errors in HTTP headers)
+        api_key = api_key.strip()
+        api_key = ''.join(c for c in api_key if c.isascii() and c.isprintable())
+        # 与 runner / film_ir_manager / app 路由共用同一个按 key 缓存的客户端
+        self.client = get_genai_client(api_key)
+        self.model_id = "gemini-3-flash-preview" 
+
+    def get_action_from_text(self, user_input: str, workflow_summary: str) -> Union[Dict, List]:
+        cache_key = hashlib.sha256(f"{user_input}||{workflow_summary}".encode("utf-8")).digest()
+        cached = _agent_cache_get(cache_key)
+        if cached is not None:
+            print(f"🤖 Agent 决策命中缓存: {cached}")
+            return cached
+
         try:
-            # 💡 强制 JSON 模式，确保输出结构稳定
+            # 💡 JSON 模式 + response_schema，受约束解码保证输出结构合法
             response = self.client.models.generate_content(
                 model=self.model_id,
-                contents=[system_prompt, f"用户指令: {user_input}"],
+                contents=[
+                    _SYSTEM_PROMPT_HEAD,
+                    f"[当前工作流状态摘要]\n{workflow_summary}",
+                    f"用户指令: {user_input}",
+                ],
                 config=types.GenerateContentConfig(
                     response_mime_type='application/json',
+                    response_schema=_ACTION_SCHEMA,
                 )
             )
             
-            # 自动解析 JSON 字符串
-            res_json = json.loads(response.text)
+            # 受约束解码下输出应为合法 JSON 列表；解析仍保留快速校验与一次容错恢复
+            res_json = _parse_agent_json(response.text)
             
             # 调试日志：在终端打印 Agent 的决策逻辑
             print(f"🤖 Agent 决策指令集: {res_json}")
-            
+
+            # 只缓存成功的决策，异常不缓存
+            _agent_cache_put(cache_key, res_json)
             return res_json
             
         except Exception as e:
@@ -1,4 +1,19 @@
-from typing import Optional
+from typing import Dict, List, Optional
+
+
+def _reset_shot_status(shot: dict) -> None:
+    status = shot.setdefault("status", {})
+    status["stylize"] = status["video_generate"] = "NOT_STARTED"
+
+
+def build_entity_index(wf: dict) -> Dict[str, List[int]]:
+    """entity_id -> 引用它的 shot 下标列表（同一 entity 在一个 shot 内只记一次）"""
+    index: Dict[str, List[int]] = {}
+    for idx, shot in enumerate(wf.get("shots", [])):
+        for entity_id in set(shot.get("entities", ())):
+            index.setdefault(entity_id, []).append(idx)
+    return index
+
 
 def apply_global_style(wf: dict, new_style_prompt: str, cascade: bool = True) -> int:
     wf.setdefault("global", {})["style_prompt"] = new_style_prompt
@@ -6,23 +21,28 @@ def apply_global_style(wf: dict, new_style_prompt: str, cascade: bool = True) ->
     affected = 0
     if cascade:
         for shot in wf.get("shots", []):
-            shot.setdefault("status", {})["stylize"] = "NOT_STARTED"
-            shot.setdefault("status", {})["video_generate"] = "NOT_STARTED"
+            _reset_shot_status(shot)
             affected += 1
     return affected
 
-def replace_entity_reference(wf: dict, entity_id: str, new_ref_image: str) -> int:
+def replace_entity_reference(
+    wf: dict, entity_id: str, new_ref_image: str, index: Optional[Dict[str, List[int]]] = None
+) -> int:
+    """
+    index: build_entity_index(wf) 的结果；批量替换多个 entity 时可复用同一份索引
+    （shots 的 entities 被修改后需重新构建）
+    """
     entities = wf.setdefault("entities", {})
     if entity_id not in entities:
         raise KeyError(f"entity 不存在：{entity_id}")
 
     entities[entity_id]["reference_image"] = new_ref_image
 
-    affected = 0
-    for shot in wf.get("shots", []):
-        shot_entities = shot.get("entities", [])
-        if entity_id in shot_entities:
-            shot.setdefault("status", {})["stylize"] = "NOT_STARTED"
-            shot.setdefault("status", {})["video_generate"] = "NOT_STARTED"
-            affected += 1
-    return affected
+    if index is None:
+        index = build_entity_index(wf)
+
+    shots = wf.get("shots", [])
+    affected_idx = index.get(entity_id, ())
+    for idx in affected_idx:
+        _reset_shot_status(shots[idx])
+    return len(affected_idx)
@@ -0,0 +1,33 @@
+# core/executor.py
+"""
+进程内共享的 CPU 执行器
+
+图片编解码等占用 GIL 的纯 Python 计算交给进程池执行；网络 / 子进程等待型任务仍由各调用方的线程池处理。
+进程池懒创建并在进程内复用，避免每次调用都重新拉起 worker 进程。
+"""
+
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+
+CPU_WORKERS = max(1, int(os.getenv("CPU_WORKERS", str(os.cpu_count() or 1))))
+
+_CPU_EXECUTOR: Optional[ProcessPoolExecutor] = None
+_CPU_EXECUTOR_LOCK = threading.Lock()
+
+
+def get_cpu_executor() -> ProcessPoolExecutor:
+    """
+    返回共享的 ProcessPoolExecutor
+
+    使用 spawn 启动：Web 服务进程里已有多个线程，fork 可能把持有中的锁一并复制进子进程
+    """
+    global _CPU_EXECUTOR
+    with _CPU_EXECUTOR_LOCK:
+        if _CPU_EXECUTOR is None:
+            _CPU_EXECUTOR = ProcessPoolExecutor(
+                max_workers=CPU_WORKERS, mp_context=multiprocessing.get_context("spawn"),
+            )
+        return _CPU_EXECUTOR
@@ -6,67 +6,135 @@ Film IR 读写模块
 """
 
 import json
+import os
+import pickle
+import tempfile
+from collections import OrderedDict
 from pathlib import Path
-from typing import Dict, Any, Optional
-from datetime import datetime
+from typing import Dict, Any, Optional, Tuple, Union
+from functools import lru_cache
 
 from core.film_ir_schema import create_empty_film_ir
+from core.utils import set_new_file_mode, utc_now_z
 
+# ⚡ 优先使用 orjson（C 实现，解析 / 序列化大型 Film IR 更快），未安装时回退标准库
+try:
+    import orjson
 
-def get_film_ir_path(job_dir: Path) -> Path:
+    def _loads(raw: bytes) -> Dict[str, Any]:
+        return orjson.loads(raw)
+
+    def _dumps(ir: Dict[str, Any]) -> bytes:
+        return orjson.dumps(ir, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS)
+except ImportError:
+    def _loads(raw: bytes) -> Dict[str, Any]:
+        return json.loads(raw)
+
+    def _dumps(ir: Dict[str, Any]) -> bytes:
+        return json.dumps(ir, ensure_ascii=False, indent=2).encode("utf-8")
+
+
+# 📦 Film IR 解析缓存：ir_path(str) -> (mtime_ns, size, pickle 快照)
+# 命中时用 pickle.loads 还原独立副本（比重新解析 JSON / deepcopy 都快），调用方可随意修改
+_IR_CACHE: "OrderedDict[str, Tuple[int, int, bytes]]" = OrderedDict()
+_IR_CACHE_MAX = 64
+
+
+def _cache_put(ir_path: str, ir: Dict[str, Any], st=None) -> None:
+    if st is None:
+        try:
+            st = os.stat(ir_path)
+        except OSError:
+            return
+    _IR_CACHE[ir_path] = (st.st_mtime_ns, st.st_size, pickle.dumps(ir, pickle.HIGHEST_PROTOCOL))
+    _IR_CACHE.move_to_end(ir_path)
+    while len(_IR_CACHE) > _IR_CACHE_MAX:
+        _IR_CACHE.popitem(last=False)
+
+
+@lru_cache(maxsize=1024)
+def _ir_path_str(job_dir_str: str) -> str:
+    """job_dir 字符串 -> film_ir.json 路径字符串（缓存拼接结果，热路径上不再构造 Path）"""
+    return os.path.join(job_dir_str, "film_ir.json")
+
+
+def get_film_ir_path(job_dir: Union[Path, str]) -> Path:
     """获取 film_ir.json 路径"""
-    return job_dir / "film_ir.json"
+    return Path(_ir_path_str(os.fspath(job_dir)))
 
 
-def load_film_ir(job_dir: Path) -> Dict[str, Any]:
+def load_film_ir(job_dir: Union[Path, str]) -> Dict[str, Any]:
     """
     加载 Film IR
 
     Args:
-        job_dir: 作业目录路径
+        job_dir: 作业目录路径（Path 或 str）
 
     Returns:
         Film IR 字典，如果文件不存在则返回空结构
     """
-    ir_path = get_film_ir_path(job_dir)
+    job_dir_str = os.fspath(job_dir)
+    ir_path = _ir_path_str(job_dir_str)
 
-    if not ir_path.exists():
+    try:
+        st = os.stat(ir_path)
+    except FileNotFoundError:
         # 尝试从 job_id 推断
-        job_id = job_dir.name
+        job_id = os.path.basename(job_dir_str.rstrip("/\\"))
         return create_empty_film_ir(job_id)
 
+    cached = _IR_CACHE.get(ir_path)
+    if cached and cached[0] == st.st_mtime_ns and cached[1] == st.st_size:
+        _IR_CACHE.move_to_end(ir_path)
+        return pickle.loads(cached[2])
+
     try:
-        with open(ir_path, "r", encoding="utf-8") as f:
-            return json.load(f)
+        with open(ir_path, "rb") as f:
+            ir = _loads(f.read())
+        # 使用读取前的 stat 作为 key：读取期间若被改写，下次 load 会自然失效
+        _cache_put(ir_path, ir, st)
+        return ir
     except json.JSONDecodeError as e:
         print(f"⚠️ Film IR 解析失败: {e}")
-        job_id = job_dir.name
+        job_id = os.path.basename(job_dir_str.rstrip("/\\"))
         return create_empty_film_ir(job_id)
 
 
-def save_film_ir(job_dir: Path, ir: Dict[str, Any]) -> None:
+def save_film_ir(job_dir: Union[Path, str], ir: Dict[str, Any]) -> None:
     """
     保存 Film IR
 
     Args:
-        job_dir: 作业目录路径
+        job_dir: 作业目录路径（Path 或 str）
         ir: Film IR 字典
     """
-    ir_path = get_film_ir_path(job_dir)
+    job_dir_str = os.fspath(job_dir)
+    ir_path = _ir_path_str(job_dir_str)
 
     # 更新时间戳
-    ir["updatedAt"] = datetime.utcnow().isoformat() + "Z"
+    ir["updatedAt"] = utc_now_z()
 
     # 确保目录存在
-    job_dir.mkdir(parents=True, exist_ok=True)
+    os.makedirs(job_dir_str, exist_ok=True)
+
+    # 原子写入：先写同目录临时文件，再 os.replace，读者永远看不到写了一半的文件
+    fd, tmp_path = tempfile.mkstemp(dir=job_dir_str, prefix="film_ir.", suffix=".json.tmp")
+    try:
+        set_new_file_mode(fd)
+        with os.fdopen(fd, "wb") as f:
+            f.write(_dumps(ir))
+        os.replace(tmp_path, ir_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
 
-    with open(ir_path, "w", encoding="utf-8") as f:
-        json.dump(ir, f, ensure_ascii=False, indent=2)
+    _cache_put(ir_path, ir)
 
 
-def film_ir_exists(job_dir: Path) -> bool:
+def film_ir_exists(job_dir: Union[Path, str]) -> bool:
     """检查 Film IR 是否存在"""
-    return get_film_ir_path(job_dir).exists()
+    return os.path.exists(_ir_path_str(os.fspath(job_dir)))
 
 
 def update_film_ir_stage(job_dir: Path, stage: str, status: str) -> None:
@@ -123,7 +191,7 @@ def set_user_intent(job_dir: Path, raw_prompt: str) -> None:
     ir = load_film_ir(job_dir)
 
     ir["userIntent"]["rawPrompt"] = raw_prompt
-    ir["userIntent"]["injectedAt"] = datetime.utcnow().isoformat() + "Z"
+    ir["userIntent"]["injectedAt"] = utc_now_z()
 
     save_film_ir(job_dir, ir)
 
@@ -167,10 +235,13 @@ def get_active_layer(job_dir: Path, pillar: str) -> Dict[str, Any]:
     if pillar == "IV_renderStrategy":
         return pillar_data
 
-    # 优先返回 remixed，其次 concrete
-    if pillar_data.get("remixed"):
-        return pillar_data["remixed"]
-    return pillar_data.get("concrete")
+    return _active_layer(pillar_data)
+
+
+def _active_layer(pillar_data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """支柱活跃层：优先 remixed，其次 concrete（各只查一次）"""
+    _get = pillar_data.get
+    return _get("remixed") or _get("concrete")
 
 
 # ============================================================
@@ -182,12 +253,7 @@ def convert_to_frontend_story_theme(ir: Dict[str, Any]) -> Optional[Dict[str, An
     转换为前端 StoryThemeAnalysis 格式
     直接使用活跃层数据（字段名已对齐）
     """
-    pillar = ir["pillars"]["I_storyTheme"]
-
-    # 优先 remixed，其次 concrete
-    data = pillar.get("remixed") or pillar.get("concrete")
-
-    return data
+    return _active_layer(ir["pillars"]["I_storyTheme"])
 
 
 def convert_to_frontend_script_analysis(ir: Dict[str, Any]) -> Optional[Dict[str, Any]]:
@@ -195,12 +261,7 @@ def convert_to_frontend_script_analysis(ir: Dict[str, Any]) -> Optional[Dict[str
     转换为前端 ScriptAnalysis 格式
     直接使用活跃层数据（字段名已对齐）
     """
-    pillar = ir["pillars"]["II_narrativeTemplate"]
-
-    # 优先 remixed，其次 concrete
-    data = pillar.get("remixed") or pillar.get("concrete")
-
-    return data
+    return _active_layer(ir["pillars"]["II_narrativeTemplate"])
 
 
 def convert_to_frontend_storyboard(ir: Dict[str, Any], base_url: str = "") -> list:
@@ -214,46 +275,50 @@ def convert_to_frontend_storyboard(ir: Dict[str, Any], base_url: str = "") -> li
     Returns:
         StoryboardShot 列表
     """
-    pillar = ir["pillars"]["III_shotRecipe"]
-    data = pillar.get("remixed") or pillar.get("concrete")
+    data = _active_layer(ir["pillars"]["III_shotRecipe"])
 
     if not data or "shots" not in data:
         return []
 
     job_id = ir.get("jobId", "")
-    result = []
-
-    for shot in data["shots"]:
-        # 构建前端格式
-        frontend_shot = {
-            "shotNumber": int(shot["shotId"].replace("shot_", "")),
-            "firstFrameImage": "",
-            "visualDescription": shot.get("subject", ""),
-            "contentDescription": shot.get("scene", ""),
-            "startSeconds": _time_to_seconds(shot.get("startTime", "0")),
-            "endSeconds": _time_to_seconds(shot.get("endTime", "0")),
-            "durationSeconds": shot.get("durationSeconds", 0),
-            "shotSize": shot.get("camera", {}).get("shotSize", ""),
-            "cameraAngle": shot.get("camera", {}).get("cameraAngle", ""),
-            "cameraMovement": shot.get("camera", {}).get("cameraMovement", ""),
-            "focalLengthDepth": shot.get("camera", {}).get("focalLengthDepth", ""),
-            "lighting": shot.get("lighting", ""),
-            "music": shot.get("audio", {}).get("music", ""),
-            "dialogueVoiceover": shot.get("audio", {}).get("dialogue", "")
-        }
-
-        # 处理资产路径
-        assets = shot.get("assets", {})
-        if assets.get("firstFrame") and base_url:
-            frontend_shot["firstFrameImage"] = f"{base_url}/assets/{job_id}/{assets['firstFrame']}"
-
-        result.append(frontend_shot)
-
-    return result
+    asset_prefix = f"{base_url}/assets/{job_id}/" if base_url else ""
+
+    return [_shot_to_frontend(shot, asset_prefix) for shot in data["shots"]]
+
+
+# 只读的空字典，用于缺失的 camera / audio / assets 字段，避免每个 shot 新建 {}
+_EMPTY: Dict[str, Any] = {}
 
 
+def _shot_to_frontend(shot: Dict[str, Any], asset_prefix: str) -> Dict[str, Any]:
+    """单个 shot -> 前端 StoryboardShot（嵌套字段每个 shot 只取一次）"""
+    camera = shot.get("camera") or _EMPTY
+    audio = shot.get("audio") or _EMPTY
+    assets = shot.get("assets") or _EMPTY
+    shot_id = shot["shotId"]
+    first_frame = assets.get("firstFrame")
+
+    return {
+        "shotNumber": int(shot_id[5:] if shot_id.startswith("shot_") else shot_id),
+        "firstFrameImage": f"{asset_prefix}{first_frame}" if first_frame and asset_prefix else "",
+        "visualDescription": shot.get("subject", ""),
+        "contentDescription": shot.get("scene", ""),
+        "startSeconds": _time_to_seconds(shot.get("startTime", "0")),
+        "endSeconds": _time_to_seconds(shot.get("endTime", "0")),
+        "durationSeconds": shot.get("durationSeconds", 0),
+        "shotSize": camera.get("shotSize", ""),
+        "cameraAngle": camera.get("cameraAngle", ""),
+        "cameraMovement": camera.get("cameraMovement", ""),
+        "focalLengthDepth": camera.get("focalLengthDepth", ""),
+        "lighting": shot.get("lighting", ""),
+        "music": audio.get("music", ""),
+        "dialogueVoiceover": audio.get("dialogue", "")
+    }
+
+
+@lru_cache(maxsize=4096)
 def _time_to_seconds(time_str: str) -> float:
-    """将时间字符串转换为秒数"""
+    """将时间字符串转换为秒数（同一任务内时间码高度重复，结果做缓存）"""
     if not time_str:
         return 0.0
 
@@ -262,17 +327,21 @@ def _time_to_seconds(time_str: str) -> float:
 
     time_str = str(time_str).strip()
 
-    if ':' in time_str:
-        parts = time_str.split(':')
+    # 常见的纯数字秒数直接转换
+    if ':' not in time_str:
         try:
-            if len(parts) == 2:  # MM:SS
-                return float(parts[0]) * 60 + float(parts[1])
-            elif len(parts) == 3:  # HH:MM:SS
-                return float(parts[0]) * 3600 + float(parts[1]) * 60 + float(parts[2])
+            return float(time_str)
         except ValueError:
             return 0.0
 
+    # MM:SS 或 HH:MM:SS
+    *head, sec = time_str.split(':')
+    if len(head) > 2:
+        return 0.0
     try:
-        return float(time_str)
+        total = 0.0
+        for part in head:
+            total = total * 60 + float(part)
+        return total * 60 + float(sec)
     except ValueError:
         return 0.0
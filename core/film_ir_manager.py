@@ -20,9 +20,10 @@ from pathlib import Path
 from typing import Dict, Any, Optional, List
 from datetime import datetime
 
-from google import genai
 from google.genai import types
 
+from core.utils import get_genai_client
+
 
 def gemini_call_with_retry(client, model: str, contents: list, config=None, max_retries: int = 2, base_delay: float = 5.0):
     """
@@ -128,10 +129,8 @@ from core.meta_prompts import (
     SHOT_DECOMPOSITION_PROMPT,
     SHOT_DETECTION_PROMPT,
     SHOT_DETAIL_BATCH_PROMPT,
-    convert_shot_recipe_to_frontend,
-    extract_shot_recipe_abstract,
-    extract_shot_first_frames,
-    extract_shot_dialogue_timeline,
+    extract_shot_recipe_all,
+    check_shot_duration_integrity,
     create_shot_boundaries_text,
     merge_batch_results,
     # Character Ledger (Pillar II extension) - Split prompts for better extraction
@@ -406,11 +405,16 @@ class FilmIRManager:
         try:
             shot_recipe_result = self._analyze_shot_recipe(uploaded_file, client)
             if shot_recipe_result:
-                # 提取多层数据
-                concrete_data = convert_shot_recipe_to_frontend(shot_recipe_result)
-                abstract_data = extract_shot_recipe_abstract(shot_recipe_result)
-                first_frames = extract_shot_first_frames(shot_recipe_result)
-                dialogue_timeline = extract_shot_dialogue_timeline(shot_recipe_result)
+                # 提取多层数据（一次遍历 shots 得到全部四种视图）
+                recipe_views = extract_shot_recipe_all(shot_recipe_result)
+                concrete_data = recipe_views["concrete"]
+                abstract_data = recipe_views["abstract"]
+                first_frames = recipe_views["firstFrames"]
+                dialogue_timeline = recipe_views["dialogueTimeline"]
+
+                duration_issue = check_shot_duration_integrity(recipe_views)
+                if duration_issue:
+                    print(f"⚠️ [Stage 1.3] Duration integrity: {duration_issue}")
 
                 # 提取分析元数据 (包含降级信息)
                 analysis_metadata = shot_recipe_result.get("shotRecipe", {}).get("_analysisMetadata", {})
@@ -458,8 +462,8 @@ class FilmIRManager:
                     self.ir["pillars"]["II_narrativeTemplate"]["environmentLedger"] = ledger_result.get("environmentLedger", [])
                     self.ir["pillars"]["II_narrativeTemplate"]["ledgerSummary"] = ledger_result.get("clusteringSummary", {})
 
-                    # 更新 Pillar III shots，添加 entityRefs
-                    updated_shots = update_shots_with_entity_refs(shots, ledger_result)
+                    # 更新 Pillar III shots，添加 entityRefs（shots 即 IR 内的列表，原地更新）
+                    updated_shots = update_shots_with_entity_refs(shots, ledger_result, inplace=True)
                     self.ir["pillars"]["III_shotRecipe"]["concrete"]["shots"] = updated_shots
 
                     # 初始化 Pillar IV 的 identityMapping (空映射，待用户绑定)
@@ -499,7 +503,7 @@ class FilmIRManager:
         api_key = api_key.strip()
         api_key = ''.join(c for c in api_key if c.isascii() and c.isprintable())
 
-        client = genai.Client(api_key=api_key)
+        client = get_genai_client(api_key)
 
         # 上传视频文件
         uploaded_file = client.files.upload(file=str(video_path))
@@ -1518,7 +1522,7 @@ class FilmIRManager:
         api_key = api_key.strip()
         api_key = ''.join(c for c in api_key if c.isascii() and c.isprintable())
 
-        client = genai.Client(api_key=api_key)
+        client = get_genai_client(api_key)
 
         # 格式化 Character Ledger 为可读文本
         character_ledger = character_ledger or []
@@ -1635,7 +1639,7 @@ class FilmIRManager:
         api_key = api_key.strip()
         api_key = ''.join(c for c in api_key if c.isascii() and c.isprintable())
 
-        client = genai.Client(api_key=api_key)
+        client = get_genai_client(api_key)
 
         # 构建 Prompt
         prompt = INTENT_FUSION_PROMPT.replace(
@@ -1777,7 +1781,7 @@ class FilmIRManager:
         if api_key:
             api_key = api_key.strip()
             api_key = ''.join(c for c in api_key if c.isascii() and c.isprintable())
-        client = genai.Client(api_key=api_key)
+        client = get_genai_client(api_key)
 
         # 提取原始视频中的独特主体和场景
         unique_elements = self._extract_unique_subjects_and_scenes(
@@ -1918,7 +1922,7 @@ Output ONLY valid JSON. No markdown, no explanation.
         if api_key:
             api_key = api_key.strip()
             api_key = ''.join(c for c in api_key if c.isascii() and c.isprintable())
-        client = genai.Client(api_key=api_key)
+        client = get_genai_client(api_key)
 
         # 构建镜头信息
         shots_info = []
@@ -33,6 +33,8 @@ from .shot_decomposition import (
     extract_abstract_layer as extract_shot_recipe_abstract,
     extract_first_frames as extract_shot_first_frames,
     extract_dialogue_timeline as extract_shot_dialogue_timeline,
+    extract_all as extract_shot_recipe_all,
+    check_duration_integrity as check_shot_duration_integrity,
     create_shot_boundaries_text,
     merge_batch_results
 )
@@ -110,6 +112,8 @@ __all__ = [
     "extract_shot_recipe_abstract",
     "extract_shot_first_frames",
     "extract_shot_dialogue_timeline",
+    "extract_shot_recipe_all",
+    "check_shot_duration_integrity",
     "create_shot_boundaries_text",
     "merge_batch_results",
     # Intent Parser (M4)
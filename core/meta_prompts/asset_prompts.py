@@ -9,7 +9,8 @@ Asset Generation Prompts - 资产生成 Prompt 模板
 3. 技术规范：16:9 构图，无水印，高细节
 """
 
-from typing import List, Optional
+import re
+from typing import Dict, List, Optional
 
 
 # ============================================================
@@ -108,6 +109,33 @@ Technical requirements:
 """
 
 
+# ============================================================
+# 模板预编译
+# ============================================================
+
+_PLACEHOLDER_RE = re.compile(r"\{(\w+)\}")
+
+
+def _compile_template(template: str) -> List[str]:
+    """
+    导入时把模板切成 [文本, 字段名, 文本, 字段名, ...]（偶数位为文本，奇数位为字段名），
+    渲染时直接 join，省去每次 str.format 的模板解析
+    """
+    return _PLACEHOLDER_RE.split(template)
+
+
+def _render_template(parts: List[str], values: Dict[str, str]) -> str:
+    return "".join(p if i % 2 == 0 else values[p] for i, p in enumerate(parts))
+
+
+_CHARACTER_TEMPLATE_PARTS: Dict[str, List[str]] = {
+    "front": _compile_template(CHARACTER_FRONT_TEMPLATE),
+    "side": _compile_template(CHARACTER_SIDE_TEMPLATE),
+    "back": _compile_template(CHARACTER_BACK_TEMPLATE),
+}
+_ENVIRONMENT_TEMPLATE_PARTS = _compile_template(ENVIRONMENT_TEMPLATE)
+
+
 # ============================================================
 # 辅助函数
 # ============================================================
@@ -133,12 +161,7 @@ def build_character_prompt(
         完整的 prompt 字符串
     """
     # 选择模板
-    templates = {
-        "front": CHARACTER_FRONT_TEMPLATE,
-        "side": CHARACTER_SIDE_TEMPLATE,
-        "back": CHARACTER_BACK_TEMPLATE
-    }
-    template = templates.get(view, CHARACTER_FRONT_TEMPLATE)
+    parts = _CHARACTER_TEMPLATE_PARTS.get(view) or _CHARACTER_TEMPLATE_PARTS["front"]
 
     # 构建属性部分
     attributes_section = ""
@@ -151,12 +174,12 @@ def build_character_prompt(
     if style_adaptation:
         style_section = f"Style adaptation: {style_adaptation}\n\n"
 
-    return template.format(
-        anchor_name=anchor_name,
-        detailed_description=detailed_description,
-        attributes_section=attributes_section,
-        style_section=style_section
-    ).strip()
+    return _render_template(parts, {
+        "anchor_name": anchor_name,
+        "detailed_description": detailed_description,
+        "attributes_section": attributes_section,
+        "style_section": style_section
+    }).strip()
 
 
 def build_environment_prompt(
@@ -186,12 +209,22 @@ def build_environment_prompt(
     if style_adaptation:
         style_section = f"Style adaptation: {style_adaptation}\n\n"
 
-    return ENVIRONMENT_TEMPLATE.format(
-        anchor_name=anchor_name,
-        detailed_description=detailed_description,
-        atmospheric_conditions=atmospheric_conditions,
-        style_section=style_section
-    ).strip()
+    return _render_template(_ENVIRONMENT_TEMPLATE_PARTS, {
+        "anchor_name": anchor_name,
+        "detailed_description": detailed_description,
+        "atmospheric_conditions": atmospheric_conditions,
+        "style_section": style_section
+    }).strip()
+
+
+# 光照关键词（子串匹配，与关键词表顺序一致输出）
+_LIGHTING_KEYWORDS = [
+    "sunlight", "daylight", "moonlight", "neon", "fluorescent",
+    "warm", "cool", "golden hour", "blue hour", "overcast",
+    "rim light", "backlight", "soft light", "hard light",
+    "morning", "evening", "night", "afternoon", "dawn", "dusk"
+]
+_LIGHTING_RE = re.compile("|".join(map(re.escape, _LIGHTING_KEYWORDS)))
 
 
 def extract_lighting_from_description(description: str) -> str:
@@ -204,20 +237,9 @@ def extract_lighting_from_description(description: str) -> str:
     Returns:
         光照描述字符串
     """
-    # 光照关键词
-    lighting_keywords = [
-        "sunlight", "daylight", "moonlight", "neon", "fluorescent",
-        "warm", "cool", "golden hour", "blue hour", "overcast",
-        "rim light", "backlight", "soft light", "hard light",
-        "morning", "evening", "night", "afternoon", "dawn", "dusk"
-    ]
-
-    found_lighting = []
-    description_lower = description.lower()
-
-    for keyword in lighting_keywords:
-        if keyword in description_lower:
-            found_lighting.append(keyword)
+    # 单次正则扫描命中所有关键词，再按关键词表顺序输出
+    hits = set(_LIGHTING_RE.findall(description.lower()))
+    found_lighting = [keyword for keyword in _LIGHTING_KEYWORDS if keyword in hits]
 
     if found_lighting:
         return f"Detected lighting elements: {', '.join(found_lighting)}"
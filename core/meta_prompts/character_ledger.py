@@ -5,6 +5,7 @@ Meta Prompt: 角色清单生成 (Character Ledger Generation)
 用于 Pillar II: Narrative Template 的 characterLedger 数据
 """
 
+from collections import defaultdict
 from typing import Dict, Any, List
 
 # ============================================================
@@ -129,57 +130,64 @@ def process_ledger_result(ai_output: Dict[str, Any], all_shot_ids: List[str] = N
             "clusteringSummary": {"error": "Clustering failed"}
         }
 
-    # 验证并规范化 character ledger
+    # 验证并规范化 character ledger（同一遍循环内完成计数与覆盖统计）
     character_ledger = []
-    for char in ai_output.get("characterLedger", []):
-        normalized = {
-            "entityId": char.get("entityId", ""),
-            "entityType": char.get("entityType", "CHARACTER"),
-            "importance": char.get("importance", "SECONDARY"),
-            "displayName": char.get("displayName", "Unknown"),
-            "visualSignature": char.get("visualSignature", ""),
-            "detailedDescription": char.get("detailedDescription", ""),
-            "appearsInShots": char.get("appearsInShots", []),
-            "shotCount": len(char.get("appearsInShots", [])),
-            "trackingConfidence": char.get("trackingConfidence", "MEDIUM"),
-            "visualCues": char.get("visualCues", [])
-        }
+    covered_shots = set()
+    primary_count = secondary_count = 0
+    for char in ai_output.get("characterLedger", ()):
+        _get = char.get
+        appears = _get("appearsInShots", [])
+        importance = _get("importance", "SECONDARY")
+        entity_id = _get("entityId", "")
 
         # 确保 entityId 格式正确
-        if not normalized["entityId"].startswith("orig_char_"):
-            normalized["entityId"] = f"orig_char_{len(character_ledger) + 1:02d}"
-
-        character_ledger.append(normalized)
+        if not entity_id.startswith("orig_char_"):
+            entity_id = f"orig_char_{len(character_ledger) + 1:02d}"
+
+        character_ledger.append({
+            "entityId": entity_id,
+            "entityType": _get("entityType", "CHARACTER"),
+            "importance": importance,
+            "displayName": _get("displayName", "Unknown"),
+            "visualSignature": _get("visualSignature", ""),
+            "detailedDescription": _get("detailedDescription", ""),
+            "appearsInShots": appears,
+            "shotCount": len(appears),
+            "trackingConfidence": _get("trackingConfidence", "MEDIUM"),
+            "visualCues": _get("visualCues", [])
+        })
+        covered_shots.update(appears)
+
+        if importance == "PRIMARY":
+            primary_count += 1
+        elif importance == "SECONDARY":
+            secondary_count += 1
 
     # 验证并规范化 environment ledger
     environment_ledger = []
-    for env in ai_output.get("environmentLedger", []):
-        normalized = {
-            "entityId": env.get("entityId", ""),
-            "entityType": "ENVIRONMENT",
-            "importance": env.get("importance", "SECONDARY"),
-            "displayName": env.get("displayName", "Unknown"),
-            "visualSignature": env.get("visualSignature", ""),
-            "detailedDescription": env.get("detailedDescription", ""),
-            "appearsInShots": env.get("appearsInShots", []),
-            "shotCount": len(env.get("appearsInShots", []))
-        }
+    for env in ai_output.get("environmentLedger", ()):
+        _get = env.get
+        appears = _get("appearsInShots", [])
+        entity_id = _get("entityId", "")
 
         # 确保 entityId 格式正确
-        if not normalized["entityId"].startswith("orig_env_"):
-            normalized["entityId"] = f"orig_env_{len(environment_ledger) + 1:02d}"
+        if not entity_id.startswith("orig_env_"):
+            entity_id = f"orig_env_{len(environment_ledger) + 1:02d}"
 
-        environment_ledger.append(normalized)
+        environment_ledger.append({
+            "entityId": entity_id,
+            "entityType": "ENVIRONMENT",
+            "importance": _get("importance", "SECONDARY"),
+            "displayName": _get("displayName", "Unknown"),
+            "visualSignature": _get("visualSignature", ""),
+            "detailedDescription": _get("detailedDescription", ""),
+            "appearsInShots": appears,
+            "shotCount": len(appears)
+        })
+        covered_shots.update(appears)
 
     # 🎯 Post-processing: Ensure 100% shot coverage
     if all_shot_ids:
-        # Collect all covered shots
-        covered_shots = set()
-        for char in character_ledger:
-            covered_shots.update(char.get("appearsInShots", []))
-        for env in environment_ledger:
-            covered_shots.update(env.get("appearsInShots", []))
-
         # Find missing shots
         missing_shots = [sid for sid in all_shot_ids if sid not in covered_shots]
 
@@ -208,17 +216,15 @@ def process_ledger_result(ai_output: Dict[str, Any], all_shot_ids: List[str] = N
                 environment_ledger.append(generic_env)
                 print(f"   ✅ [Post-processing] Created generic environment for {len(missing_shots)} missing shots")
 
-    # 计算汇总信息
-    primary_chars = [c for c in character_ledger if c["importance"] == "PRIMARY"]
-    secondary_chars = [c for c in character_ledger if c["importance"] == "SECONDARY"]
-
+    # 计算汇总信息（角色计数已在规范化循环中累计）
+    clustering_summary = ai_output.get("clusteringSummary", {})
     summary = {
         "totalCharacters": len(character_ledger),
-        "primaryCharacters": len(primary_chars),
-        "secondaryCharacters": len(secondary_chars),
+        "primaryCharacters": primary_count,
+        "secondaryCharacters": secondary_count,
         "totalEnvironments": len(environment_ledger),
-        "totalShots": ai_output.get("clusteringSummary", {}).get("totalShots", 0),
-        "unclusteredShots": ai_output.get("clusteringSummary", {}).get("unclusteredShots", [])
+        "totalShots": clustering_summary.get("totalShots", 0),
+        "unclusteredShots": clustering_summary.get("unclusteredShots", [])
     }
 
     return {
@@ -256,42 +262,45 @@ def get_ledger_display_summary(ledger_data: Dict[str, Any]) -> str:
     return "\n".join(lines)
 
 
-def update_shots_with_entity_refs(shots: List[Dict], ledger_data: Dict[str, Any]) -> List[Dict]:
+def update_shots_with_entity_refs(
+    shots: List[Dict], ledger_data: Dict[str, Any], inplace: bool = False
+) -> List[Dict]:
     """
     更新 shots 数据，添加 entityRefs 字段
 
     Args:
         shots: 原始 shots 列表
         ledger_data: character ledger 数据
+        inplace: 为 True 时直接修改传入的 shot 字典，不再逐个复制
 
     Returns:
         更新后的 shots 列表，每个 shot 包含 entityRefs
     """
     # 建立 shot -> entities 的反向映射
-    shot_to_chars = {}
-    shot_to_envs = {}
+    shot_to_chars = defaultdict(list)
+    shot_to_envs = defaultdict(list)
 
     for char in ledger_data.get("characterLedger", []):
+        entity_id = char["entityId"]
         for shot_id in char.get("appearsInShots", []):
-            if shot_id not in shot_to_chars:
-                shot_to_chars[shot_id] = []
-            shot_to_chars[shot_id].append(char["entityId"])
+            shot_to_chars[shot_id].append(entity_id)
 
     for env in ledger_data.get("environmentLedger", []):
+        entity_id = env["entityId"]
         for shot_id in env.get("appearsInShots", []):
-            if shot_id not in shot_to_envs:
-                shot_to_envs[shot_id] = []
-            shot_to_envs[shot_id].append(env["entityId"])
+            shot_to_envs[shot_id].append(entity_id)
 
-    # 更新每个 shot
-    updated_shots = []
+    # 更新每个 shot（.get 不会往 defaultdict 中插入空列表）
+    updated_shots = shots if inplace else []
     for shot in shots:
         shot_id = shot.get("shotId", "")
-        updated_shot = shot.copy()
-        updated_shot["entityRefs"] = {
+        entity_refs = {
             "characters": shot_to_chars.get(shot_id, []),
             "environments": shot_to_envs.get(shot_id, [])
         }
-        updated_shots.append(updated_shot)
+        if inplace:
+            shot["entityRefs"] = entity_refs
+        else:
+            updated_shots.append({**shot, "entityRefs": entity_refs})
 
     return updated_shots
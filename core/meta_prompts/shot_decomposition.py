@@ -4,7 +4,8 @@ Meta Prompt: 影视级分镜拆解与动力学配方 (Stage 1 & 2 Fused)
 用于提取支柱 III: Shot Recipe 的 concrete + abstract 数据
 """
 
-from typing import Dict, Any, Optional, List
+import sys
+from typing import Dict, Any, Optional, List, Callable
 
 SHOT_DECOMPOSITION_PROMPT = """
 # Prompt: 影视级分镜拆解与动力学配方 (Shot Recipe Extraction)
@@ -251,85 +252,317 @@ Analyze the provided video file:
 """
 
 
-def convert_to_frontend_format(ai_output: dict) -> dict:
+# ============================================================
+# AI 输出结构 (Shot Recipe Schema)
+# 缺失字段在规范化时一次性补齐默认值，之后的提取函数可直接下标访问
+# ============================================================
+
+_OPTIONAL = {"default": None}
+_TEXT = {"default": ""}
+_OBJECT = {"type": "object", "default": {}}
+
+SHOT_RECIPE_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "videoMetadata": _OBJECT,
+        "globalSettings": {
+            "type": "object",
+            "default": {},
+            "properties": {
+                "concrete": _OBJECT,
+                "abstract": _OBJECT,
+            },
+        },
+        "shots": {
+            "type": "array",
+            "default": [],
+            "items": {
+                "type": "object",
+                "properties": {
+                    "shotId": _OPTIONAL,
+                    "beatTag": _OPTIONAL,
+                    "startTime": _OPTIONAL,
+                    "endTime": _OPTIONAL,
+                    "durationSeconds": _OPTIONAL,
+                    "representativeTimestamp": _OPTIONAL,
+                    "longTake": {"default": False},
+                    "concrete": {
+                        "type": "object",
+                        "default": {},
+                        "properties": {
+                            "firstFrameDescription": _TEXT,
+                            "subject": _TEXT,
+                            "scene": _TEXT,
+                            "camera": {"default": {}},
+                            "lighting": _TEXT,
+                            "dynamics": _TEXT,
+                            "audio": {
+                                "type": "object",
+                                "default": {},
+                                "properties": {
+                                    "dialogue": _TEXT,
+                                    "dialogueText": _TEXT,
+                                },
+                            },
+                            "style": _TEXT,
+                            "negative": _TEXT,
+                        },
+                    },
+                    "abstract": {
+                        "type": "object",
+                        "default": {},
+                        "properties": {
+                            "narrativeFunction": _TEXT,
+                            "visualFunction": _TEXT,
+                            "subjectPlaceholder": _TEXT,
+                            "actionTemplate": _TEXT,
+                            "cameraPreserved": {"default": {}},
+                        },
+                    },
+                },
+            },
+        },
+    },
+}
+
+
+def _compile_filler(schema: Dict[str, Any]) -> Callable[[Any], None]:
     """
-    将 AI 输出的 concrete 层转换为前端 Storyboard 格式
+    纯 Python 回退：把 schema 预编译成专用的补默认值函数
 
-    提取 globalSettings.concrete 和 shots[].concrete
+    导入时只解析一次 schema，生成由闭包组成的填充器树；
+    运行时直接按固定的 (字段, 默认值, 子填充器) 列表处理，不再逐层查 schema 字典。
+    dict / list 默认值每次新建，避免多个分镜共享同一个默认对象。
     """
+    if "items" in schema:
+        fill_item = _compile_filler(schema["items"])
+
+        def fill_list(data: Any) -> None:
+            if isinstance(data, list):
+                for item in data:
+                    fill_item(item)
+        return fill_list
+
+    steps = []
+    for key, sub in schema.get("properties", {}).items():
+        has_default = "default" in sub
+        default = sub.get("default")
+        copy_default = type(default) if isinstance(default, (dict, list)) else None
+        child = _compile_filler(sub) if ("properties" in sub or "items" in sub) else None
+        steps.append((key, has_default, default, copy_default, child))
+    steps = tuple(steps)
+
+    def fill_object(data: Any) -> None:
+        if not isinstance(data, dict):
+            return
+        for key, has_default, default, copy_default, child in steps:
+            if key not in data:
+                if not has_default:
+                    continue
+                data[key] = copy_default(default) if copy_default else default
+            if child is not None:
+                child(data[key])
+    return fill_object
+
+
+_fill_recipe_defaults = _compile_filler(SHOT_RECIPE_SCHEMA)
+
+
+def _normalize_recipe(ai_output: dict) -> dict:
+    """取出 shotRecipe 并原地补齐默认字段"""
     recipe = ai_output.get("shotRecipe", ai_output)
+    _fill_recipe_defaults(recipe)
+    return recipe
+
+
+def extract_all(ai_output: dict) -> Dict[str, Any]:
+    """
+    一次遍历 shots，同时生成 concrete / abstract / 首帧 / 对白时间线四种视图
+
+    Returns:
+        {concrete, abstract, firstFrames, dialogueTimeline}，
+        分别对应下面四个单项提取函数的返回值
+    """
+    return _extract_views(_normalize_recipe(ai_output))
+
 
-    global_settings = recipe.get("globalSettings", {})
-    global_concrete = global_settings.get("concrete", {})
-
-    shots_raw = recipe.get("shots", [])
-    shots_concrete = []
-
-    for shot in shots_raw:
-        concrete = shot.get("concrete", {})
-        shot_data = {
-            "shotId": shot.get("shotId"),
-            "beatTag": shot.get("beatTag"),
-            "startTime": shot.get("startTime"),
-            "endTime": shot.get("endTime"),
-            "durationSeconds": shot.get("durationSeconds"),
-            "representativeTimestamp": shot.get("representativeTimestamp"),  # 🎯 AI 语义锚点
-            "longTake": shot.get("longTake", False),
+# 取值来自小型固定词表的字段：驻留后所有分镜共享同一个 str 对象
+_CAMERA_ENUM_KEYS = ("shotSize", "cameraAngle", "cameraMovement")
+
+
+def _intern(value: Any) -> Any:
+    return sys.intern(value) if type(value) is str else value
+
+
+def _extract_views(recipe: Dict[str, Any]) -> Dict[str, Any]:
+    """extract_all 的实际遍历（recipe 已规范化）"""
+    global_settings = recipe["globalSettings"]
+
+    shots = recipe["shots"]
+    n = len(shots)
+
+    # 输出长度与 shots 一致的列表按长度预分配，按下标写入；对白时间线长度未知，仍用 append
+    shots_concrete = [None] * n
+    shots_abstract = [None] * n
+    first_frames = [None] * n
+    dialogue_timeline = []
+    # 时间轴按列存储（SoA），时长在同一遍循环中累加
+    timeline_ids = [None] * n
+    timeline_durations = [None] * n
+    total_duration = 0.0
+
+    for i, shot in enumerate(shots):
+        concrete = shot["concrete"]
+        abstract = shot["abstract"]
+        audio = concrete["audio"]
+        shot_id = shot["shotId"]
+        start_time = shot["startTime"]
+        end_time = shot["endTime"]
+        duration = shot["durationSeconds"]
+        beat_tag = _intern(shot["beatTag"])
+        camera = concrete["camera"]
+        if isinstance(camera, dict):
+            for cam_key in _CAMERA_ENUM_KEYS:
+                if cam_key in camera:
+                    camera[cam_key] = _intern(camera[cam_key])
+        lighting = concrete["lighting"]
+        style = concrete["style"]
+        negative = concrete["negative"]
+        first_frame_description = concrete["firstFrameDescription"]
+
+        timeline_ids[i] = shot_id
+        timeline_durations[i] = duration
+        if isinstance(duration, (int, float)):
+            total_duration += duration
+
+        shots_concrete[i] = {
+            "shotId": shot_id,
+            "beatTag": beat_tag,
+            "startTime": start_time,
+            "endTime": end_time,
+            "durationSeconds": duration,
+            "representativeTimestamp": shot["representativeTimestamp"],  # 🎯 AI 语义锚点
+            "longTake": shot["longTake"],
             # 8 核心字段
-            "firstFrameDescription": concrete.get("firstFrameDescription", ""),
-            "subject": concrete.get("subject", ""),
-            "scene": concrete.get("scene", ""),
-            "camera": concrete.get("camera", {}),
-            "lighting": concrete.get("lighting", ""),
-            "dynamics": concrete.get("dynamics", ""),
-            "audio": concrete.get("audio", {}),
-            "style": concrete.get("style", ""),
-            "negative": concrete.get("negative", "")
+            "firstFrameDescription": first_frame_description,
+            "subject": concrete["subject"],
+            "scene": concrete["scene"],
+            "camera": camera,
+            "lighting": lighting,
+            "dynamics": concrete["dynamics"],
+            "audio": audio,
+            "style": style,
+            "negative": negative
+        }
+
+        shots_abstract[i] = {
+            "shotId": shot_id,
+            "beatTag": beat_tag,
+            "startTime": start_time,
+            "endTime": end_time,
+            "durationSeconds": duration,
+            # Abstract 字段
+            "narrativeFunction": abstract["narrativeFunction"],
+            "visualFunction": abstract["visualFunction"],
+            "subjectPlaceholder": _intern(abstract["subjectPlaceholder"]),
+            "actionTemplate": abstract["actionTemplate"],
+            # 按 prompt 约定 cameraPreserved 是 concrete.camera 的副本；AI 漏填时补一份浅拷贝快照
+            "cameraPreserved": abstract["cameraPreserved"] or (dict(camera) if isinstance(camera, dict) else {})
         }
-        shots_concrete.append(shot_data)
+
+        first_frames[i] = {
+            "shotId": shot_id,
+            "firstFrameDescription": first_frame_description,
+            # 首帧列表与 concrete 分镜分别存储在 IR 中，给一份独立的浅拷贝，避免一处原地修改影响另一处
+            "camera": dict(camera) if isinstance(camera, dict) else camera,
+            "lighting": lighting,
+            "style": style,
+            "negative": negative
+        }
+
+        dialogue_text = audio["dialogueText"]
+        if dialogue_text and dialogue_text.strip():
+            dialogue_timeline.append({
+                "shotId": shot_id,
+                "startTime": start_time,
+                "endTime": end_time,
+                "durationSeconds": duration,
+                "dialogueText": dialogue_text,
+                "dialogueDelivery": audio["dialogue"]
+            })
 
     return {
-        "videoMetadata": recipe.get("videoMetadata", {}),
-        "globalSettings": global_concrete,
-        "shots": shots_concrete
+        "concrete": {
+            "videoMetadata": recipe["videoMetadata"],
+            "globalSettings": global_settings["concrete"],
+            "shots": shots_concrete
+        },
+        "abstract": {
+            "globalSettings": global_settings["abstract"],
+            "shotFunctions": shots_abstract
+        },
+        "firstFrames": first_frames,
+        "dialogueTimeline": dialogue_timeline,
+        "timeline": {
+            "shotIds": timeline_ids,
+            "durationSeconds": timeline_durations,
+            "totalDurationSeconds": round(total_duration, 3)
+        }
     }
 
 
-def extract_abstract_layer(ai_output: dict) -> dict:
+def _timecode_to_seconds(value: Any) -> Optional[float]:
+    """HH:MM:SS.mmm / MM:SS.mmm / 数字 -> 秒数，无法解析返回 None"""
+    if isinstance(value, (int, float)):
+        return float(value)
+    if not isinstance(value, str) or not value.strip():
+        return None
+    *head, sec = value.strip().split(":")
+    try:
+        total = 0.0
+        for part in head:
+            total = total * 60 + float(part)
+        return total * 60 + float(sec)
+    except ValueError:
+        return None
+
+
+def check_duration_integrity(views: Dict[str, Any], tolerance: float = 0.5) -> Optional[str]:
     """
-    提取 AI 输出的 abstract 层，作为隐形模板存储
+    校验「所有 durationSeconds 之和 == 视频总时长」（SHOT SPLITTING RULES）
 
-    用于后续 Remix 阶段的意图注入
+    Args:
+        views: extract_all 的返回值
+        tolerance: 允许误差（秒）
+
+    Returns:
+        不一致时返回提示信息，一致或无法判断时返回 None
     """
-    recipe = ai_output.get("shotRecipe", ai_output)
+    total = _timecode_to_seconds(views["concrete"]["videoMetadata"].get("totalDuration"))
+    if total is None:
+        return None
+    summed = views["timeline"]["totalDurationSeconds"]
+    if abs(summed - total) > tolerance:
+        return f"sum of shot durations {summed:.3f}s != video duration {total:.3f}s"
+    return None
 
-    global_settings = recipe.get("globalSettings", {})
-    global_abstract = global_settings.get("abstract", {})
 
-    shots_raw = recipe.get("shots", [])
-    shots_abstract = []
+def convert_to_frontend_format(ai_output: dict) -> dict:
+    """
+    将 AI 输出的 concrete 层转换为前端 Storyboard 格式
 
-    for shot in shots_raw:
-        abstract = shot.get("abstract", {})
-        shot_data = {
-            "shotId": shot.get("shotId"),
-            "beatTag": shot.get("beatTag"),
-            "startTime": shot.get("startTime"),
-            "endTime": shot.get("endTime"),
-            "durationSeconds": shot.get("durationSeconds"),
-            # Abstract 字段
-            "narrativeFunction": abstract.get("narrativeFunction", ""),
-            "visualFunction": abstract.get("visualFunction", ""),
-            "subjectPlaceholder": abstract.get("subjectPlaceholder", ""),
-            "actionTemplate": abstract.get("actionTemplate", ""),
-            "cameraPreserved": abstract.get("cameraPreserved", {})
-        }
-        shots_abstract.append(shot_data)
+    提取 globalSettings.concrete 和 shots[].concrete
+    """
+    return extract_all(ai_output)["concrete"]
 
-    return {
-        "globalSettings": global_abstract,
-        "shotFunctions": shots_abstract
-    }
+
+def extract_abstract_layer(ai_output: dict) -> dict:
+    """
+    提取 AI 输出的 abstract 层，作为隐形模板存储
+
+    用于后续 Remix 阶段的意图注入
+    """
+    return extract_all(ai_output)["abstract"]
 
 
 def extract_first_frames(ai_output: dict) -> List[dict]:
@@ -339,22 +572,7 @@ def extract_first_frames(ai_output: dict) -> List[dict]:
     Returns:
         List of {shotId, firstFrameDescription, camera, lighting, style, negative}
     """
-    recipe = ai_output.get("shotRecipe", ai_output)
-    shots_raw = recipe.get("shots", [])
-
-    first_frames = []
-    for shot in shots_raw:
-        concrete = shot.get("concrete", {})
-        first_frames.append({
-            "shotId": shot.get("shotId"),
-            "firstFrameDescription": concrete.get("firstFrameDescription", ""),
-            "camera": concrete.get("camera", {}),
-            "lighting": concrete.get("lighting", ""),
-            "style": concrete.get("style", ""),
-            "negative": concrete.get("negative", "")
-        })
-
-    return first_frames
+    return extract_all(ai_output)["firstFrames"]
 
 
 def extract_dialogue_timeline(ai_output: dict) -> List[dict]:
@@ -365,26 +583,7 @@ def extract_dialogue_timeline(ai_output: dict) -> List[dict]:
         List of {shotId, startTime, endTime, dialogueText, dialogueDelivery}
         (仅包含有对白的镜头)
     """
-    recipe = ai_output.get("shotRecipe", ai_output)
-    shots_raw = recipe.get("shots", [])
-
-    dialogue_timeline = []
-    for shot in shots_raw:
-        concrete = shot.get("concrete", {})
-        audio = concrete.get("audio", {})
-        dialogue_text = audio.get("dialogueText", "")
-
-        if dialogue_text and dialogue_text.strip():
-            dialogue_timeline.append({
-                "shotId": shot.get("shotId"),
-                "startTime": shot.get("startTime"),
-                "endTime": shot.get("endTime"),
-                "durationSeconds": shot.get("durationSeconds"),
-                "dialogueText": dialogue_text,
-                "dialogueDelivery": audio.get("dialogue", "")
-            })
-
-    return dialogue_timeline
+    return extract_all(ai_output)["dialogueTimeline"]
 
 
 # ============================================================
@@ -632,7 +831,15 @@ def merge_batch_results(
     # 合并结果
     merged_shots = []
     for basic_shot in shots_basic:
-        shot_id = basic_shot.get("shotId")
+        # 两个分支共用的 Phase 1 时间轴字段，每个镜头只读取一次
+        _basic_get = basic_shot.get
+        shot_id = _basic_get("shotId")
+        beat_tag = _basic_get("beatTag")
+        start_time = _basic_get("startTime")
+        end_time = _basic_get("endTime")
+        duration = _basic_get("durationSeconds")
+        representative_ts = _basic_get("representativeTimestamp")
+        long_take = _basic_get("longTake", False)
 
         if shot_id in detailed_shots_map:
             # 使用详细数据
@@ -705,30 +912,31 @@ def merge_batch_results(
 
             merged_shot = {
                 "shotId": shot_id,
-                "beatTag": basic_shot.get("beatTag"),
-                "startTime": basic_shot.get("startTime"),
-                "endTime": basic_shot.get("endTime"),
-                "durationSeconds": basic_shot.get("durationSeconds"),
-                "representativeTimestamp": basic_shot.get("representativeTimestamp"),  # 🎯 AI 语义锚点
-                "longTake": basic_shot.get("longTake", False),
+                "beatTag": beat_tag,
+                "startTime": start_time,
+                "endTime": end_time,
+                "durationSeconds": duration,
+                "representativeTimestamp": representative_ts,  # 🎯 AI 语义锚点
+                "longTake": long_take,
                 "concrete": concrete_data,
                 "abstract": abstract_data,
                 "_degraded": not has_valid_content  # 如果没有有效内容，标记为 degraded
             }
         else:
             # 使用降级数据 (Phase 1 基础信息)
+            brief_subject = _basic_get("briefSubject", "")
             merged_shot = {
                 "shotId": shot_id,
-                "beatTag": basic_shot.get("beatTag"),
-                "startTime": basic_shot.get("startTime"),
-                "endTime": basic_shot.get("endTime"),
-                "durationSeconds": basic_shot.get("durationSeconds"),
-                "representativeTimestamp": basic_shot.get("representativeTimestamp"),  # 🎯 AI 语义锚点
-                "longTake": basic_shot.get("longTake", False),
+                "beatTag": beat_tag,
+                "startTime": start_time,
+                "endTime": end_time,
+                "durationSeconds": duration,
+                "representativeTimestamp": representative_ts,  # 🎯 AI 语义锚点
+                "longTake": long_take,
                 "concrete": {
-                    "firstFrameDescription": basic_shot.get("briefSubject", ""),
-                    "subject": basic_shot.get("briefSubject", ""),
-                    "scene": basic_shot.get("briefScene", ""),
+                    "firstFrameDescription": brief_subject,
+                    "subject": brief_subject,
+                    "scene": _basic_get("briefScene", ""),
                     "camera": {},
                     "lighting": "",
                     "dynamics": "",
@@ -169,47 +169,54 @@ Analyze the provided video file:
 """
 
 
-def convert_to_frontend_format(ai_output) -> dict:
-    """
-    将 AI 输出的 concrete 层转换为前端 StoryThemeAnalysis 格式
-
-    从新的双层结构中提取 concrete 子字段
-    """
+# 九个分析模块（前端 StoryThemeAnalysis 字段顺序）
+_THEME_MODULES = (
+    "basicInfo",
+    "coreTheme",
+    "narrative",
+    "narrativeStructure",
+    "characterAnalysis",
+    "audioVisual",
+    "symbolism",
+    "thematicStance",
+    "realWorldSignificance",
+)
+
+
+def _analysis_root(ai_output) -> Optional[dict]:
+    """规范化 AI 输出并取出 storyThemeAnalysis 根对象，无效输出返回 None"""
     # 处理 list 类型的输出（Gemini 有时返回数组）
     if isinstance(ai_output, list):
         if len(ai_output) > 0 and isinstance(ai_output[0], dict):
             ai_output = ai_output[0]
         else:
-            return {}
+            return None
 
     if not isinstance(ai_output, dict):
-        return {}
+        return None
 
-    # 获取 storyThemeAnalysis 根对象
-    analysis = ai_output.get("storyThemeAnalysis", ai_output)
+    return ai_output.get("storyThemeAnalysis", ai_output)
 
-    def get_concrete(module_name: str) -> dict:
-        """安全获取 concrete 数据"""
-        module = analysis.get(module_name, {})
-        if isinstance(module, dict):
-            # 新格式：有 concrete 子字段
-            if "concrete" in module:
-                return module["concrete"]
-            # 兼容旧格式：直接返回模块数据
-            return module
+
+def convert_to_frontend_format(ai_output) -> dict:
+    """
+    将 AI 输出的 concrete 层转换为前端 StoryThemeAnalysis 格式
+
+    从新的双层结构中提取 concrete 子字段
+    """
+    analysis = _analysis_root(ai_output)
+    if analysis is None:
         return {}
 
-    return {
-        "basicInfo": get_concrete("basicInfo"),
-        "coreTheme": get_concrete("coreTheme"),
-        "narrative": get_concrete("narrative"),
-        "narrativeStructure": get_concrete("narrativeStructure"),
-        "characterAnalysis": get_concrete("characterAnalysis"),
-        "audioVisual": get_concrete("audioVisual"),
-        "symbolism": get_concrete("symbolism"),
-        "thematicStance": get_concrete("thematicStance"),
-        "realWorldSignificance": get_concrete("realWorldSignificance")
-    }
+    result = {}
+    for name in _THEME_MODULES:
+        module = analysis.get(name)
+        if isinstance(module, dict):
+            # 新格式取 concrete 子字段；兼容旧格式：直接返回模块数据
+            result[name] = module["concrete"] if "concrete" in module else module
+        else:
+            result[name] = {}
+    return result
 
 
 def extract_abstract_layer(ai_output) -> dict:
@@ -218,34 +225,12 @@ def extract_abstract_layer(ai_output) -> dict:
 
     用于后续 Remix 阶段的意图注入
     """
-    # 处理 list 类型的输出（Gemini 有时返回数组）
-    if isinstance(ai_output, list):
-        if len(ai_output) > 0 and isinstance(ai_output[0], dict):
-            ai_output = ai_output[0]
-        else:
-            return {}
-
-    if not isinstance(ai_output, dict):
+    analysis = _analysis_root(ai_output)
+    if analysis is None:
         return {}
 
-    # 获取 storyThemeAnalysis 根对象
-    analysis = ai_output.get("storyThemeAnalysis", ai_output)
-
-    def get_abstract(module_name: str) -> dict:
-        """安全获取 abstract 数据"""
-        module = analysis.get(module_name, {})
-        if isinstance(module, dict):
-            return module.get("abstract", {})
-        return {}
-
-    return {
-        "basicInfo": get_abstract("basicInfo"),
-        "coreTheme": get_abstract("coreTheme"),
-        "narrative": get_abstract("narrative"),
-        "narrativeStructure": get_abstract("narrativeStructure"),
-        "characterAnalysis": get_abstract("characterAnalysis"),
-        "audioVisual": get_abstract("audioVisual"),
-        "symbolism": get_abstract("symbolism"),
-        "thematicStance": get_abstract("thematicStance"),
-        "realWorldSignificance": get_abstract("realWorldSignificance")
-    }
+    result = {}
+    for name in _THEME_MODULES:
+        module = analysis.get(name)
+        result[name] = module.get("abstract", {}) if isinstance(module, dict) else {}
+    return result
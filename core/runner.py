@@ -4,12 +4,28 @@ import shutil
 import subprocess
 import time
 import os
+import threading
+import hashlib
+import json
+import random
 import requests
 import io
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+from functools import lru_cache
 from PIL import Image
 
-from .workflow_io import save_workflow, load_workflow
-from .utils import get_ffmpeg_path
+# google-genai 在模块加载时导入一次：分镜线程中不再各自触发 import（及其导入锁竞争）；
+# 仅跑 mock 流程的环境可以不安装
+try:
+    from google import genai
+    from google.genai import types
+except ImportError:
+    genai = None
+    types = None
+
+from .workflow_io import load_workflow, WorkflowWriter
+from .executor import get_cpu_executor
+from .utils import get_ffmpeg_path, fast_copy_file, get_genai_client
 from .film_ir_io import load_film_ir, film_ir_exists
 from typing import Dict, Any, Optional, Tuple
 
@@ -240,20 +256,28 @@ def get_effective_shot_data(job_dir: Path, wf: dict, shot: dict) -> Tuple[str, d
         return effective_prompt, effective_cinema
 
 
-def ai_stylize_frame(job_dir: Path, wf: dict, shot: dict) -> str:
-    """
-    💡 使用 Imagen 4.0 或 Gemini 2.0 Image Gen 确保定妆图生成成功
-    🎬 Cinematography Fidelity: Hard-coded enforcement of source shot parameters
-    """
-    from google import genai
-    from google.genai import types
-
+def _gemini_api_key() -> Optional[str]:
     api_key = os.getenv("GEMINI_API_KEY")
     # Sanitize API key to remove non-ASCII characters (fixes encoding errors in HTTP headers)
     if api_key:
         api_key = api_key.strip()
         api_key = ''.join(c for c in api_key if c.isascii() and c.isprintable())
-    client = genai.Client(api_key=api_key, http_options={'api_version': 'v1beta'})
+    return api_key
+
+
+def _genai_client(api_key: Optional[str], api_version: Optional[str] = None):
+    """进程内共享的 genai.Client（见 core.utils.get_genai_client），SDK 未安装时给出明确错误"""
+    if genai is None:
+        raise RuntimeError("google-genai 未安装，无法调用 Gemini / Veo")
+    return get_genai_client(api_key, api_version)
+
+
+def ai_stylize_frame(job_dir: Path, wf: dict, shot: dict) -> str:
+    """
+    💡 使用 Imagen 4.0 或 Gemini 2.0 Image Gen 确保定妆图生成成功
+    🎬 Cinematography Fidelity: Hard-coded enforcement of source shot parameters
+    """
+    client = _genai_client(_gemini_api_key(), "v1beta")
 
     src = job_dir / shot["assets"]["first_frame"]
     dst = job_dir / "stylized_frames" / f"{shot['shot_id']}.png"
@@ -412,32 +436,251 @@ FORBIDDEN:
         print(f"❌ Gemini 3 Pro Image 调用失败: {str(e)[:100]}...")
 
     print("⚠️ 执行原图占位。")
-    shutil.copyfile(src, dst)
+    fast_copy_file(src, dst)
     return f"stylized_frames/{dst.name}"
 
 
+_MOCK_CLIP_LOCK = threading.Lock()
+
+
+def _mock_clip(job_dir: Path) -> Path:
+    """截取 input.mp4 前 1 秒作为占位视频，每个 job 只调用一次 ffmpeg"""
+    cached = ensure_videos_dir(job_dir) / "_mock_1s.mp4"
+    with _MOCK_CLIP_LOCK:
+        if not cached.exists():
+            src_video = job_dir / "input.mp4"
+            tmp_path = cached.with_name("_mock_1s.tmp.mp4")
+            ffmpeg = get_ffmpeg_path()
+            cmd = [ffmpeg, "-y", "-i", str(src_video), "-t", "1.0", "-c", "copy", str(tmp_path)]
+            subprocess.run(cmd, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            os.replace(tmp_path, cached)
+    return cached
+
+
+def _link_or_copy(src: Path, dst: Path) -> None:
+    """硬链接：不拷贝数据；跨设备 / 文件系统不支持时退回普通拷贝"""
+    if dst.exists(): os.remove(dst)
+    try:
+        os.link(src, dst)
+    except OSError:
+        fast_copy_file(src, dst)
+
+
 def mock_generate_video(job_dir: Path, shot: dict) -> str:
     videos_dir = ensure_videos_dir(job_dir)
     out_path = videos_dir / f"{shot['shot_id']}.mp4"
-    if out_path.exists(): os.remove(out_path)
-    src_video = job_dir / "input.mp4"
-    ffmpeg = get_ffmpeg_path()
-    cmd = [ffmpeg, "-y", "-i", str(src_video), "-t", "1.0", "-c", "copy", str(out_path)]
-    subprocess.run(cmd, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    _link_or_copy(_mock_clip(job_dir), out_path)
     return f"videos/{out_path.name}"
 
 
-def veo_generate_video(job_dir: Path, wf: dict, shot: dict) -> str:
-    from google import genai
-    from google.genai import types
+def _read_frame_bytes(path_str: str, size: int) -> bytes:
+    """
+    读取参考帧字节（不做缓存：每帧每次渲染只读一次，渲染结束后即可释放）
 
-    api_key = os.getenv("GEMINI_API_KEY")
-    # Sanitize API key to remove non-ASCII characters (fixes encoding errors in HTTP headers)
-    if api_key:
-        api_key = api_key.strip()
-        api_key = ''.join(c for c in api_key if c.isascii() and c.isprintable())
-    # 使用与 video_generator.py 相同的客户端初始化方式
-    client = genai.Client(api_key=api_key)
+    大小已知，按 size 一次性从 fd 读满：跳过 BufferedReader 层与 readall 的 fstat / 扩容
+    """
+    fd = os.open(path_str, os.O_RDONLY | getattr(os, "O_BINARY", 0))
+    try:
+        data = os.read(fd, size)
+        if len(data) < size:
+            # 极少数情况下一次 read 读不满（如网络文件系统），补读剩余部分
+            chunks = [data]
+            while True:
+                chunk = os.read(fd, size)
+                if not chunk:
+                    break
+                chunks.append(chunk)
+            data = b"".join(chunks)
+        return data
+    finally:
+        os.close(fd)
+
+
+@lru_cache(maxsize=1)
+def _http_session() -> requests.Session:
+    """
+    进程内共用的 keep-alive Session（视频下载 / Seedance 接口）：各分镜线程复用到同一主机的连接，
+    省去每次请求的 TCP / TLS 握手。连接池大小与分镜并发数一致。
+
+    幂等请求（GET）遇到 5xx 自动退避重试；POST 提交不重试，避免重复创建生成任务
+    """
+    from urllib3.util.retry import Retry
+
+    session = requests.Session()
+    retry = Retry(total=3, backoff_factor=0.5, status_forcelist=(500, 502, 503, 504), raise_on_status=False)
+    adapter = requests.adapters.HTTPAdapter(pool_connections=8, pool_maxsize=max(SHOT_WORKERS, 8), max_retries=retry)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+# 📥 下载缓冲区：256 KiB，直接从底层连接读入文件，不经过 iter_content 的分块生成器
+DOWNLOAD_BUFFER_SIZE = 256 * 1024
+
+
+def _download_to_file(url: str, out_path: Path, params: Optional[dict] = None, timeout=(10, 300)) -> None:
+    """
+    流式下载到 out_path
+
+    先写同目录 .part 临时文件，完整下载后再 os.replace，避免中断留下半个视频；
+    失败时错误信息只截取响应前 512 字节，不会把大体积的错误页整个读进内存
+    """
+    with _http_session().get(url, params=params, stream=True, timeout=timeout) as response:
+        if response.status_code != 200:
+            head = response.raw.read(512, decode_content=True) or b""
+            raise RuntimeError(
+                f"下载失败: 状态码 {response.status_code}, {head.decode('utf-8', errors='replace')}"
+            )
+        # 服务端若声明了 Content-Encoding 仍需解码；视频通常没有，此时为直通
+        response.raw.decode_content = True
+        tmp_path = out_path.with_name(out_path.name + ".part")
+        try:
+            # 无缓冲写入：每个 256 KiB 块直接 write 到 fd，不再经过 BufferedWriter 多拷一次
+            with open(tmp_path, 'wb', buffering=0) as f:
+                shutil.copyfileobj(response.raw, f, DOWNLOAD_BUFFER_SIZE)
+                os.fsync(f.fileno())
+            os.replace(tmp_path, out_path)
+        except BaseException:
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+            raise
+
+
+# ⏱️ Veo 轮询参数
+VEO_POLL_INITIAL_SECONDS = 2.0
+VEO_POLL_MAX_SECONDS = 30.0
+VEO_POLL_TIMEOUT_SECONDS = 20 * 60
+VEO_POLL_JITTER_RATIO = 0.2
+
+
+def _veo_poll_delays():
+    """
+    轮询间隔序列：2s 起步，每次 x1.5，上限 30s，并叠加最多 20% 的随机抖动，
+    避免并发分镜在同一时刻集中请求 operations.get
+    """
+    delay = VEO_POLL_INITIAL_SECONDS
+    while True:
+        yield delay + random.uniform(0, delay * VEO_POLL_JITTER_RATIO)
+        delay = min(VEO_POLL_MAX_SECONDS, delay * 1.5)
+
+
+# 进行中的 Veo 任务：输入指纹 -> Future(结果文件路径)
+_VEO_INFLIGHT: Dict[str, Future] = {}
+_VEO_INFLIGHT_LOCK = threading.Lock()
+
+
+def _veo_render(client, api_key: str, prompt: str, image_bytes: bytes, out_path: Path,
+                poll_schedule=None) -> str:
+    """提交 Veo 任务、轮询并把结果写入 out_path（含 429 自愈重试），返回相对路径"""
+    # 🔄 自愈式重试逻辑：遇到 429 错误时自动等待并重试
+    max_retries = 3
+    retry_wait_seconds = 60
+
+    # 参考帧对象在各次重试间复用
+    veo_image = types.Image(image_bytes=image_bytes, mime_type="image/png")
+
+    for attempt in range(max_retries):
+        try:
+            # image 作为独立参数传递，不在 config 内
+            operation = client.models.generate_videos(
+                model="veo-3.1-generate-preview",
+                prompt=prompt,
+                image=veo_image,
+                config=types.GenerateVideosConfig(
+                    aspect_ratio="16:9"
+                )
+            )
+
+            print(f"⏳ 视频正在云端渲染 (Operation ID: {operation.name})")
+
+            # 指数退避 + 抖动轮询；完成后最多多等一个间隔
+            poll_count = 0
+            poll_delays = iter(poll_schedule) if poll_schedule is not None else _veo_poll_delays()
+            deadline = time.monotonic() + VEO_POLL_TIMEOUT_SECONDS
+            while not operation.done:
+                poll_count += 1
+                if time.monotonic() > deadline:
+                    raise RuntimeError(f"Veo 轮询超时: 已等待超过 20 分钟")
+                poll_delay = next(poll_delays, VEO_POLL_MAX_SECONDS)
+                print(f"⏳ 视频渲染中... (轮询 {poll_count}, 间隔 {poll_delay:.1f}s)")
+                time.sleep(poll_delay)
+                operation = client.operations.get(operation)
+
+            # 检查错误
+            if operation.error:
+                raise RuntimeError(f"Veo 后端报错: {operation.error}")
+
+            # 检查结果
+            if not operation.result or not operation.result.generated_videos:
+                raise RuntimeError("Veo 任务完成但未返回视频数据。原因：可能触发了内容安全审核拦截。")
+
+            generated_video = operation.result.generated_videos[0]
+
+            video_obj = generated_video.video if hasattr(generated_video, 'video') else generated_video
+
+            # 响应已内联视频字节时直接落盘（数据本就在内存中）
+            if getattr(video_obj, 'video_bytes', None):
+                video_obj.save(str(out_path))
+                print(f"💾 视频生成成功 (SDK save): {out_path}")
+                return f"videos/{out_path.name}"
+
+            # 否则按文件 ID 流式下载，内存占用与视频大小无关
+            file_id = None
+            if hasattr(video_obj, 'name') and video_obj.name:
+                file_id = video_obj.name if "/" in video_obj.name else f"files/{video_obj.name}"
+            elif hasattr(video_obj, 'uri') and video_obj.uri:
+                file_id = f"files/{video_obj.uri.split('/')[-1]}"
+
+            if not file_id:
+                raise RuntimeError(f"无法从响应中解析有效的 File ID: {type(video_obj).__name__}")
+
+            # 防御性修复：file_id 可能自带 ?alt=media 或 ?key=...
+            clean_file_id = file_id.split("?", 1)[0]
+
+            print(f"✅ 生成成功，正在下载文件: {clean_file_id}")
+
+            download_url = f"https://generativelanguage.googleapis.com/v1beta/{clean_file_id}"
+            query_params = {
+                "alt": "media",
+                "key": api_key,
+            }
+
+            _download_to_file(download_url, out_path, params=query_params)
+            print(f"💾 视频生成成功 (流式下载): {out_path}")
+            return f"videos/{out_path.name}"
+
+        except Exception as e:
+            error_str = str(e).lower()
+            is_rate_limit = "429" in error_str or "rate" in error_str or "quota" in error_str or "resource_exhausted" in error_str
+
+            if is_rate_limit and attempt < max_retries - 1:
+                # 🎲 随机抖动：基础等待 + 5-15秒随机延迟，打破同步节奏
+                base_wait = retry_wait_seconds * (attempt + 1)
+                jitter = random.uniform(5, 15)
+                wait_time = base_wait + jitter
+                print(f"⚠️ 触发 RPM 限制 (429)，等待 {wait_time:.1f} 秒后重试 (基础 {base_wait}s + 抖动 {jitter:.1f}s) ({attempt + 1}/{max_retries})...")
+                time.sleep(wait_time)
+                continue
+            else:
+                print(f"❌ Veo 失败: {str(e)}")
+                raise e
+
+    # 如果所有重试都失败
+    raise RuntimeError(f"Veo 生成失败：已重试 {max_retries} 次")
+
+
+def veo_generate_video(job_dir: Path, wf: dict, shot: dict, poll_schedule=None) -> str:
+    """
+    Veo 图生视频
+
+    Args:
+        poll_schedule: 可选的轮询间隔迭代器（秒），默认使用 _veo_poll_delays()
+    """
+    api_key = _gemini_api_key()
+    # 使用与 video_generator.py 相同的客户端初始化方式（进程内复用）
+    client = _genai_client(api_key)
 
     videos_dir = ensure_videos_dir(job_dir)
     out_path = videos_dir / f"{shot['shot_id']}.mp4"
@@ -479,7 +722,8 @@ def veo_generate_video(job_dir: Path, wf: dict, shot: dict) -> str:
 
     print(f"🚀 [Veo 3.1] 正在渲染分镜视频: {shot['shot_id']}")
 
-    image_bytes = img_path.read_bytes()
+    st = img_path.stat()
+    image_bytes = _read_frame_bytes(str(img_path), st.st_size)
     style = wf.get('global', {}).get('style_prompt', '')
 
     # 🎬 获取有效数据（优先使用 Remix 数据）
@@ -558,111 +802,28 @@ PHYSICS ENHANCEMENT:
 CRITICAL: Cinematography parameters are LOCKED - preserve exactly as specified.
 high motion quality, cinematic, professional cinematography"""
 
-    # 🔄 自愈式重试逻辑：遇到 429 错误时自动等待并重试
-    max_retries = 3
-    retry_wait_seconds = 60
-
-    for attempt in range(max_retries):
-        try:
-            # image 作为独立参数传递，不在 config 内
-            operation = client.models.generate_videos(
-                model="veo-3.1-generate-preview",
-                prompt=prompt,
-                image=types.Image(
-                    image_bytes=image_bytes,
-                    mime_type="image/png"
-                ),
-                config=types.GenerateVideosConfig(
-                    aspect_ratio="16:9"
-                )
-            )
-
-            print(f"⏳ 视频正在云端渲染 (Operation ID: {operation.name})")
-
-            poll_count = 0
-            max_polls = 60  # 20 minutes max
-            while not operation.done:
-                poll_count += 1
-                if poll_count > max_polls:
-                    raise RuntimeError(f"Veo 轮询超时: 已等待超过 20 分钟")
-                print(f"⏳ 视频渲染中... (轮询 {poll_count})")
-                time.sleep(20)
-                operation = client.operations.get(operation)
-
-            # 检查错误
-            if operation.error:
-                raise RuntimeError(f"Veo 后端报错: {operation.error}")
-
-            # 检查结果
-            if not operation.result or not operation.result.generated_videos:
-                raise RuntimeError("Veo 任务完成但未返回视频数据。原因：可能触发了内容安全审核拦截。")
-
-            generated_video = operation.result.generated_videos[0]
-
-            # 优先使用 SDK 原生 save 方法
-            try:
-                generated_video.video.save(str(out_path))
-                print(f"💾 视频生成成功 (SDK save): {out_path}")
-                return f"videos/{out_path.name}"
-            except Exception as save_err:
-                print(f"⚠️ SDK save 失败 ({save_err})，尝试手动下载...")
-
-            # 备用：手动下载
-            file_id = None
-            video_obj = generated_video.video if hasattr(generated_video, 'video') else generated_video
-
-            if hasattr(video_obj, 'name') and video_obj.name:
-                file_id = video_obj.name if "/" in video_obj.name else f"files/{video_obj.name}"
-            elif hasattr(video_obj, 'uri') and video_obj.uri:
-                file_id = f"files/{video_obj.uri.split('/')[-1]}"
-
-            if not file_id:
-                raise RuntimeError(f"无法从响应中解析有效的 File ID: {type(video_obj).__name__}")
-
-            # 防御性修复：file_id 可能自带 ?alt=media 或 ?key=...
-            clean_file_id = file_id.split("?", 1)[0]
-
-            print(f"✅ 生成成功，正在下载文件: {clean_file_id}")
-
-            download_url = f"https://generativelanguage.googleapis.com/v1beta/{clean_file_id}"
-            query_params = {
-                "alt": "media",
-                "key": api_key,
-            }
-
-            response = requests.get(
-                download_url,
-                params=query_params,
-                stream=True,
-            )
-
-            if response.status_code == 200:
-                with open(out_path, 'wb') as f:
-                    for chunk in response.iter_content(chunk_size=1024*1024): f.write(chunk)
-                print(f"💾 视频生成成功 (手动下载): {out_path}")
-                return f"videos/{out_path.name}"
-            else:
-                raise RuntimeError(f"下载失败: 状态码 {response.status_code}")
+    # 🔁 参考帧与 prompt 完全相同的并发请求合并为一次 Veo 任务，其余分镜复用同一结果文件
+    render_key = hashlib.blake2b(prompt.encode("utf-8") + b"\0" + image_bytes, digest_size=16).hexdigest()
+    with _VEO_INFLIGHT_LOCK:
+        leader = _VEO_INFLIGHT.get(render_key)
+        if leader is None:
+            future = Future()
+            _VEO_INFLIGHT[render_key] = future
+    if leader is not None:
+        print(f"🔁 [Veo 3.1] {shot_id} 与进行中的任务输入相同，等待其结果")
+        _link_or_copy(leader.result(), out_path)
+        return f"videos/{out_path.name}"
 
-        except Exception as e:
-            error_str = str(e).lower()
-            is_rate_limit = "429" in error_str or "rate" in error_str or "quota" in error_str or "resource_exhausted" in error_str
-
-            if is_rate_limit and attempt < max_retries - 1:
-                import random
-                # 🎲 随机抖动：基础等待 + 5-15秒随机延迟，打破同步节奏
-                base_wait = retry_wait_seconds * (attempt + 1)
-                jitter = random.uniform(5, 15)
-                wait_time = base_wait + jitter
-                print(f"⚠️ 触发 RPM 限制 (429)，等待 {wait_time:.1f} 秒后重试 (基础 {base_wait}s + 抖动 {jitter:.1f}s) ({attempt + 1}/{max_retries})...")
-                time.sleep(wait_time)
-                continue
-            else:
-                print(f"❌ Veo 失败: {str(e)}")
-                raise e
-
-    # 如果所有重试都失败
-    raise RuntimeError(f"Veo 生成失败：已重试 {max_retries} 次")
+    try:
+        rel_path = _veo_render(client, api_key, prompt, image_bytes, out_path, poll_schedule)
+        future.set_result(out_path)
+        return rel_path
+    except BaseException as e:
+        future.set_exception(e)
+        raise
+    finally:
+        with _VEO_INFLIGHT_LOCK:
+            _VEO_INFLIGHT.pop(render_key, None)
 
 
 def seedance_generate_video(job_dir: Path, wf: dict, shot: dict) -> str:
@@ -818,7 +979,7 @@ def seedance_generate_video(job_dir: Path, wf: dict, shot: dict) -> str:
                 headers[key] = value.encode('ascii', 'ignore').decode('ascii')
                 print(f"   🔧 Cleaned header: {key}={headers[key][:50]}...")
 
-            response = requests.post(
+            response = _http_session().post(
                 f"{SEEDANCE_API_BASE}/generate",
                 headers=headers,
                 json=generate_payload,
@@ -851,7 +1012,7 @@ def seedance_generate_video(job_dir: Path, wf: dict, shot: dict) -> str:
             for poll in range(max_polls):
                 time.sleep(5)
 
-                status_response = requests.get(
+                status_response = _http_session().get(
                     f"{SEEDANCE_API_BASE}/status",
                     headers=headers,
                     params={"task_id": task_id},
@@ -874,15 +1035,9 @@ def seedance_generate_video(job_dir: Path, wf: dict, shot: dict) -> str:
                     print(f"✅ [Seedance] 生成成功，正在下载...")
 
                     # 下载视频
-                    video_response = requests.get(video_url, stream=True, timeout=120)
-                    if video_response.status_code == 200:
-                        with open(out_path, 'wb') as f:
-                            for chunk in video_response.iter_content(chunk_size=1024*1024):
-                                f.write(chunk)
-                        print(f"💾 [Seedance] 视频已保存: {out_path}")
-                        return f"videos/{out_path.name}"
-                    else:
-                        raise RuntimeError(f"视频下载失败: {video_response.status_code}")
+                    _download_to_file(video_url, out_path, timeout=120)
+                    print(f"💾 [Seedance] 视频已保存: {out_path}")
+                    return f"videos/{out_path.name}"
 
                 elif task_status == "FAILED":
                     error_msg = status_data["data"].get("error_message", "未知错误")
@@ -900,7 +1055,6 @@ def seedance_generate_video(job_dir: Path, wf: dict, shot: dict) -> str:
             is_rate_limit = "429" in error_str or "rate" in error_str or "too many" in error_str
 
             if is_rate_limit and attempt < max_retries - 1:
-                import random
                 jitter = random.uniform(5, 15)
                 wait_time = retry_wait * (attempt + 1) + jitter
                 print(f"⚠️ [Seedance] 触发限流，等待 {wait_time:.1f}s 后重试 ({attempt + 1}/{max_retries})...")
@@ -913,78 +1067,255 @@ def seedance_generate_video(job_dir: Path, wf: dict, shot: dict) -> str:
     raise RuntimeError(f"Seedance 生成失败：已重试 {max_retries} 次")
 
 
-def run_stylize(job_dir: Path, wf: dict, target_shot: str | None = None) -> None:
-    shots_to_process = []
-    for shot in wf.get("shots", []):
-        sid = shot.get("shot_id")
-        if target_shot and sid != target_shot: continue
-        status = shot.get("status", {}).get("stylize", "NOT_STARTED")
-        if not target_shot and status not in ("NOT_STARTED", "FAILED"): continue
-        shots_to_process.append(shot)
+# ⚙️ 分镜级并发：Gemini / Veo / Seedance 调用都是 IO 等待（生成 + 轮询），多线程即可重叠
+SHOT_WORKERS = max(1, int(os.getenv("SHOT_WORKERS", "4")))
+# 🚦 RPM 限流：批量执行时相邻两个分镜的「提交」间隔（秒），渲染本身可以重叠进行
+RPM_INTERVAL_SECONDS = 35
 
-    for idx, shot in enumerate(shots_to_process):
-        sid = shot.get("shot_id")
 
-        # 🚦 RPM 限流：批量执行时，每个分镜之间休眠 35 秒
-        if idx > 0 and target_shot is None:
-            print(f"⏳ RPM 限流：等待 35 秒后处理下一个分镜...")
-            time.sleep(35)
+def _mtime_ns(path: Path) -> int:
+    try:
+        return path.stat().st_mtime_ns
+    except OSError:
+        return 0
+
+
+def shot_input_hash(job_dir: Path, wf: dict, shot: dict, stage: str) -> str:
+    """
+    分镜输入指纹：描述 / 摄影参数 / 首帧 / 全局风格 / film_ir.json 修改时间，
+    视频阶段额外包含模型与参考帧修改时间。任何输入变化都会得到不同的哈希
+
+    成功执行后记录在 shot["cache"][f"{stage}_input_hash"]；runner 据此跳过未变化的分镜，
+    WorkflowManager 据此在级联重置时保留仍然有效的产物
+    """
+    sid = shot.get("shot_id")
+    global_cfg = wf.get("global", {})
+    payload = {
+        "stage": stage,
+        "description": shot.get("description"),
+        "cinematography": shot.get("cinematography"),
+        "first_frame": shot.get("assets", {}).get("first_frame"),
+        "style": global_cfg.get("style_prompt"),
+        "film_ir": _mtime_ns(job_dir / "film_ir.json"),
+    }
+    if stage == "video_generate":
+        payload["video_model"] = global_cfg.get("video_model", "seedance")
+        payload["frames"] = [
+            _mtime_ns(job_dir / "storyboard_frames" / f"{sid}.png"),
+            _mtime_ns(job_dir / "stylized_frames" / f"{sid}.png"),
+        ]
+    raw = json.dumps(payload, sort_keys=True, ensure_ascii=False, default=str).encode("utf-8")
+    return hashlib.blake2b(raw, digest_size=16).hexdigest()
+
+
+# 分镜上的可变子字典：选中执行时一次性补齐，之后直接下标访问，不再逐处 setdefault
+_SHOT_CONTAINERS = ("status", "assets", "errors", "cache")
 
-        shot.setdefault("status", {})["stylize"] = "RUNNING"
-        save_workflow(job_dir, wf)
-        try:
-            rel_path = ai_stylize_frame(job_dir, wf, shot)
-            shot.setdefault("assets", {})["stylized_frame"] = rel_path
-            shot["status"]["stylize"] = "SUCCESS"
-            print(f"✅ Stylize SUCCESS: {sid}")
-        except Exception as e:
-            shot["status"]["stylize"] = "FAILED"
-            shot.setdefault("errors", {})["stylize"] = str(e)
-        save_workflow(job_dir, wf)
 
+def _ensure_shot_containers(shot: dict) -> None:
+    for key in _SHOT_CONTAINERS:
+        if shot.get(key) is None:
+            shot[key] = {}
 
-def run_video_generate(job_dir: Path, wf: dict, target_shot: str | None = None) -> None:
+
+def _collect_shots(job_dir: Path, wf: dict, stage: str, asset_key: str,
+                   target_shot: str | None) -> Tuple[list, int]:
+    """
+    选出需要执行的分镜
+
+    批量执行时，若分镜输入哈希与上次成功时一致且产物文件仍在，直接标记 SUCCESS 跳过；
+    指定 target_shot 时总是重跑。
+
+    Returns:
+        (待执行分镜列表, 跳过的分镜数)
+    """
     shots_to_process = []
-    for shot in wf.get("shots", []):
+    skipped = 0
+    shots = wf.get("shots", [])
+    if target_shot:
+        # 单分镜重跑：命中即停，不再遍历其余分镜
+        shots = [next((s for s in shots if s.get("shot_id") == target_shot), None)]
+        if shots[0] is None:
+            print(f"⚠️ 未找到分镜 {target_shot}，跳过 {stage}")
+            return [], 0
+    for shot in shots:
         sid = shot.get("shot_id")
-        if target_shot and sid != target_shot: continue
-        status = shot.get("status", {}).get("video_generate", "NOT_STARTED")
+        status = shot.get("status", {}).get(stage, "NOT_STARTED")
         if not target_shot and status not in ("NOT_STARTED", "FAILED"): continue
+        _ensure_shot_containers(shot)
+        if not target_shot:
+            cached_hash = shot["cache"].get(f"{stage}_input_hash")
+            output_rel = shot["assets"].get(asset_key)
+            if (cached_hash and output_rel and (job_dir / output_rel).exists()
+                    and cached_hash == shot_input_hash(job_dir, wf, shot, stage)):
+                shot["status"][stage] = "SUCCESS"
+                skipped += 1
+                print(f"♻️ 输入未变化，跳过 {stage}: {sid}")
+                continue
         shots_to_process.append(shot)
+    return shots_to_process, skipped
 
-    for idx, shot in enumerate(shots_to_process):
-        sid = shot.get("shot_id")
 
-        # 🚦 RPM 限流：批量执行时，每个分镜之间休眠 35 秒
-        if idx > 0 and target_shot is None:
-            print(f"⏳ RPM 限流：等待 35 秒后处理下一个分镜...")
-            time.sleep(35)
+def _run_shot_stage(job_dir: Path, wf: dict, shot: dict, stage: str, asset_key: str,
+                    generate, writer: WorkflowWriter) -> bool:
+    """
+    在当前线程中执行单个分镜的某个阶段，并通过 writer 更新状态
 
-        shot.setdefault("status", {})["video_generate"] = "RUNNING"
-        save_workflow(job_dir, wf)
-        try:
-            video_model = wf.get("global", {}).get("video_model", "seedance")  # 默认使用 Seedance
-            if video_model == "veo":
-                rel_video_path = veo_generate_video(job_dir, wf, shot)
-            elif video_model == "seedance":
-                rel_video_path = seedance_generate_video(job_dir, wf, shot)
-            else:
-                rel_video_path = mock_generate_video(job_dir, shot)
-            shot.setdefault("assets", {})["video"] = rel_video_path
-            shot["status"]["video_generate"] = "SUCCESS"
-            print(f"✅ Video SUCCESS: {sid}")
-        except Exception as e:
-            shot["status"]["video_generate"] = "FAILED"
-            shot.setdefault("errors", {})["video_generate"] = str(e)
-            print(f"❌ Video FAILED: {sid} -> {e}")
-        save_workflow(job_dir, wf)
+    - 状态修改在 writer.lock 内完成；RUNNING 防抖落盘，SUCCESS / FAILED 立即落盘
+    - 成功后记录输入哈希（执行前计算），供下次 _collect_shots 判断是否可跳过
+
+    Returns:
+        是否成功
+    """
+    label = "Stylize" if stage == "stylize" else "Video"
+    sid = shot.get("shot_id")
+    with writer.lock:
+        shot["status"][stage] = "RUNNING"
+        input_hash = shot_input_hash(job_dir, wf, shot, stage)
+    writer.mark_dirty()
+    try:
+        rel_path = generate(shot)
+    except Exception as e:
+        with writer.lock:
+            shot["status"][stage] = "FAILED"
+            shot["errors"][stage] = str(e)
+        writer.flush()
+        print(f"❌ {label} FAILED: {sid} -> {e}")
+        return False
+    with writer.lock:
+        shot["assets"][asset_key] = rel_path
+        shot["status"][stage] = "SUCCESS"
+        shot["cache"][f"{stage}_input_hash"] = input_hash
+    writer.flush()
+    print(f"✅ {label} SUCCESS: {sid}")
+    return True
+
+
+def _run_shots_concurrently(job_dir: Path, wf: dict, shots: list, stage: str, asset_key: str,
+                            generate, throttle: bool, dirty: bool = False,
+                            max_concurrency: int | None = None, prepare=None) -> None:
+    """
+    并发执行某个阶段的所有分镜
+
+    - shots 需已经过 _collect_shots（status / assets / errors / cache 子字典已就位）
+    - generate(shot) -> rel_path 在线程池中执行（只读 wf / shot），状态更新见 _run_shot_stage
+    - throttle=True 时按 RPM_INTERVAL_SECONDS 错开提交，保持原有的 RPM 限流节奏
+    - dirty=True 表示调用方已修改 wf（如跳过的分镜），退出前至少落盘一次
+    - max_concurrency 为同时在途的分镜数上限，默认取 SHOT_WORKERS
+    - prepare(shot, writer) 若给出，在同一工作线程中先于本阶段执行（如补齐上游依赖），
+      各分镜的上下游阶段因此可以流水线式交错进行
+    """
+    def _process(shot: dict, writer: WorkflowWriter) -> None:
+        if prepare is not None:
+            prepare(shot, writer)
+        _run_shot_stage(job_dir, wf, shot, stage, asset_key, generate, writer)
+
+    # with 块退出时同步落盘，保证返回前 workflow.json 是最新状态
+    with WorkflowWriter(job_dir, wf) as writer:
+        if dirty:
+            writer.mark_dirty()
+        if len(shots) <= 1:
+            for shot in shots:
+                _process(shot, writer)
+            return
+
+        workers = max(1, max_concurrency or SHOT_WORKERS)
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = []
+            for idx, shot in enumerate(shots):
+                if idx > 0 and throttle:
+                    print(f"⏳ RPM 限流：等待 {RPM_INTERVAL_SECONDS} 秒后提交下一个分镜...")
+                    time.sleep(RPM_INTERVAL_SECONDS)
+                futures.append(executor.submit(_process, shot, writer))
+            # 按完成顺序收集：任一分镜出现未预期异常时立即抛出，不必等排在前面的长任务结束
+            for future in as_completed(futures):
+                future.result()
+
+
+# 🧮 G3_STYLIZE_EXECUTOR=process 时，定妆图生成（含 PIL 编码落盘）交给进程池执行，绕开 GIL；
+# 默认 thread 保持在分镜线程内直接调用（纯网络等待时进程池没有收益）
+STYLIZE_EXECUTOR = os.getenv("G3_STYLIZE_EXECUTOR", "thread").strip().lower()
+
+
+def _stylize_generator(job_dir: Path, wf: dict):
+    """返回 generate(shot) -> rel_path；状态更新仍在调用方线程中完成，子进程只负责生成文件"""
+    if STYLIZE_EXECUTOR != "process":
+        return lambda shot: ai_stylize_frame(job_dir, wf, shot)
+
+    def generate(shot: dict) -> str:
+        # ai_stylize_frame 只读取 wf["global"]：只传这一部分，避免 pickle 整个 wf
+        # （其他分镜线程正在修改各自的状态字段，整份序列化可能遇到并发修改）
+        wf_view = {"global": wf.get("global", {})}
+        return get_cpu_executor().submit(ai_stylize_frame, job_dir, wf_view, shot).result()
+
+    return generate
+
+
+def run_stylize(job_dir: Path, wf: dict, target_shot: str | None = None,
+                max_concurrency: int | None = None) -> None:
+    """原地修改 wf 并落盘；返回时 wf 与磁盘上的 workflow.json 一致，可直接交给下一阶段"""
+    shots_to_process, skipped = _collect_shots(job_dir, wf, "stylize", "stylized_frame", target_shot)
+    _run_shots_concurrently(
+        job_dir, wf, shots_to_process, "stylize", "stylized_frame",
+        _stylize_generator(job_dir, wf),
+        throttle=target_shot is None, dirty=skipped > 0, max_concurrency=max_concurrency,
+    )
 
 
-def run_pipeline(job_dir: Path, target_shot: str | None = None) -> None:
-    wf = load_workflow(job_dir)
-    run_stylize(job_dir, wf, target_shot=target_shot)
+def _mock_backend(job_dir: Path, wf: dict, shot: dict) -> str:
+    return mock_generate_video(job_dir, shot)
+
+
+# 🎞️ 视频生成后端：global.video_model -> generate(job_dir, wf, shot) -> 相对视频路径
+# 未知模型回退到 mock；新增后端只需在此注册
+VIDEO_BACKENDS = {
+    "veo": veo_generate_video,
+    "seedance": seedance_generate_video,
+    "mock": _mock_backend,
+}
+
+
+def run_video_generate(job_dir: Path, wf: dict, target_shot: str | None = None,
+                       max_concurrency: int | None = None, stylize_missing: bool = False) -> None:
+    """
+    原地修改 wf 并落盘
+
+    stylize_missing=True 时，缺少定妆图的分镜在同一个工作线程里先补做风格化再生成视频：
+    分镜 N 的视频生成与分镜 N+1 的风格化并行，不必等所有前置风格化全部结束
+    """
+    shots_to_process, skipped = _collect_shots(job_dir, wf, "video_generate", "video", target_shot)
+    video_model = wf.get("global", {}).get("video_model", "seedance")  # 默认使用 Seedance
+
+    backend = VIDEO_BACKENDS.get(video_model, _mock_backend)
+
+    prepare = None
+    if stylize_missing:
+        stylize = _stylize_generator(job_dir, wf)
+
+        def prepare(shot: dict, writer: WorkflowWriter) -> None:
+            with writer.lock:
+                has_frame = shot["status"].get("stylize") == "SUCCESS"
+            if not has_frame:
+                print(f"🔗 [Dependency] 分镜 {shot.get('shot_id')} 缺少定妆图，正在前置生成...")
+                _run_shot_stage(
+                    job_dir, wf, shot, "stylize", "stylized_frame",
+                    stylize, writer,
+                )
+
+    _run_shots_concurrently(
+        job_dir, wf, shots_to_process, "video_generate", "video",
+        lambda shot: backend(job_dir, wf, shot),
+        throttle=target_shot is None, dirty=skipped > 0, max_concurrency=max_concurrency,
+        prepare=prepare,
+    )
+
+
+def run_pipeline(job_dir: Path, target_shot: str | None = None,
+                 max_concurrency: int | None = None) -> None:
     wf = load_workflow(job_dir)
-    run_video_generate(job_dir, wf, target_shot=target_shot)
+    run_stylize(job_dir, wf, target_shot=target_shot, max_concurrency=max_concurrency)
+    # run_stylize 已把同一个 wf 落盘，无需重新读取解析
+    run_video_generate(job_dir, wf, target_shot=target_shot, max_concurrency=max_concurrency)
 
 
 
@@ -1,11 +1,18 @@
 # core/utils.py
+import os
 import shutil
+import sys
+import time
+from functools import lru_cache
+from typing import Optional, Tuple
 
+@lru_cache(maxsize=None)
 def get_ffmpeg_path() -> str:
     """
     跨平台获取 ffmpeg 路径
     - Railway/Linux: 使用 PATH 中的 ffmpeg
     - macOS 本地: 使用 Homebrew 路径
+    结果在进程内缓存（每次抽帧 / 合并不再重复扫描 PATH）；未找到时抛错且不缓存，安装后可重试
     """
     # 优先从 PATH 查找
     ffmpeg = shutil.which("ffmpeg")
@@ -14,7 +21,6 @@ def get_ffmpeg_path() -> str:
 
     # macOS Homebrew 备用路径
     macos_path = "/opt/homebrew/bin/ffmpeg"
-    import os
     if os.path.exists(macos_path):
         return macos_path
 
@@ -24,3 +30,100 @@ def get_ffmpeg_path() -> str:
         return intel_mac_path
 
     raise RuntimeError("ffmpeg not found. Please install ffmpeg.")
+
+
+@lru_cache(maxsize=None)
+def get_ffprobe_path() -> str:
+    """ffprobe 路径：优先 PATH，其次与 ffmpeg 同目录（Homebrew 等安装方式两者总在一起）"""
+    ffprobe = shutil.which("ffprobe")
+    if ffprobe:
+        return ffprobe
+    sibling = os.path.join(os.path.dirname(get_ffmpeg_path()), "ffprobe")
+    if os.path.exists(sibling):
+        return sibling
+    raise RuntimeError("ffprobe not found. Please install ffmpeg.")
+
+
+# FICLONE ioctl（linux/fs.h）：btrfs / xfs 等文件系统上的写时复制克隆
+_FICLONE = 0x40049409
+
+
+def _clone_file(src, dst) -> bool:
+    """尝试写时复制克隆（macOS APFS: clonefile；Linux btrfs/xfs: FICLONE），不支持时返回 False"""
+    if sys.platform == "darwin":
+        try:
+            import ctypes
+            libc = ctypes.CDLL("libSystem.dylib", use_errno=True)
+            return libc.clonefile(os.fsencode(src), os.fsencode(dst), 0) == 0
+        except (OSError, AttributeError):
+            return False
+
+    if sys.platform.startswith("linux"):
+        try:
+            import fcntl
+        except ImportError:
+            return False
+        try:
+            with open(src, "rb") as fsrc, open(dst, "wb") as fdst:
+                fcntl.ioctl(fdst.fileno(), _FICLONE, fsrc.fileno())
+            return True
+        except OSError:
+            try:
+                os.unlink(dst)
+            except OSError:
+                pass
+            return False
+
+    return False
+
+
+def fast_copy_file(src, dst) -> None:
+    """
+    复制文件：优先写时复制克隆（只增加元数据，不拷贝数据），不支持时退回 shutil.copyfile
+
+    不使用硬链接：目标文件之后可能被原地覆盖写入（如风格化图重新生成），硬链接会连带改掉源文件
+    """
+    if os.path.lexists(dst):
+        os.remove(dst)
+    if not _clone_file(src, dst):
+        shutil.copyfile(src, dst)
+
+
+# 📄 新建文件的常规权限（0666 去掉进程 umask，通常为 0644）
+# tempfile.mkstemp 固定以 0600 创建，os.replace 后会沿用，导致 Nginx 等其他用户无法读取
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+NEW_FILE_MODE = 0o666 & ~_UMASK
+
+
+def set_new_file_mode(fd: int) -> None:
+    """把 mkstemp 创建的临时文件改成常规权限，再 os.replace 到正式路径"""
+    if hasattr(os, "fchmod"):
+        os.fchmod(fd, NEW_FILE_MODE)
+
+
+# 🕒 ISO-8601 UTC 时间戳按秒缓存：同一秒内的连续写入复用同一字符串
+_TS_CACHE: Tuple[int, str] = (0, "")
+
+
+def utc_now_z() -> str:
+    """当前 UTC 时间，格式 2024-01-01T00:00:00Z（同一秒内不重复 strftime）"""
+    global _TS_CACHE
+    t = int(time.time())
+    if _TS_CACHE[0] == t:
+        return _TS_CACHE[1]
+    s = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(t))
+    _TS_CACHE = (t, s)
+    return s
+
+
+@lru_cache(maxsize=4)
+def get_genai_client(api_key: Optional[str], api_version: Optional[str] = None):
+    """
+    按 (api_key, api_version) 进程内复用 genai.Client：各模块 / 各次调用共享同一个 HTTP 连接池，
+    省去重复建连与 TLS 握手；GEMINI_API_KEY 变化时自然生成新的客户端
+    """
+    from google import genai
+    if api_version:
+        return genai.Client(api_key=api_key, http_options={'api_version': api_version})
+    return genai.Client(api_key=api_key)
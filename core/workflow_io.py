@@ -1,9 +1,62 @@
+import hashlib
 import json
+import os
 import time
 import tempfile
-import shutil
+import threading
+from contextlib import contextmanager
 from pathlib import Path
 
+from core.utils import set_new_file_mode, utc_now_z
+
+try:
+    import orjson
+    _json_loads = orjson.loads
+
+    def _json_dumps(wf: dict, pretty: bool = False) -> bytes:
+        option = orjson.OPT_NON_STR_KEYS | (orjson.OPT_INDENT_2 if pretty else 0)
+        return orjson.dumps(wf, option=option)
+except ImportError:
+    _json_loads = json.loads
+
+    def _json_dumps(wf: dict, pretty: bool = False) -> bytes:
+        if pretty:
+            return json.dumps(wf, ensure_ascii=False, indent=2).encode("utf-8")
+        return json.dumps(wf, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+try:
+    import fcntl
+except ImportError:
+    # Windows 无 fcntl，退化为无锁（本地开发单进程运行）
+    fcntl = None
+
+
+# 🧾 最近一次写入的内容指纹：workflow.json 路径 -> (内容 blake2b, 写入后的 mtime_ns)
+# 内容未变且文件未被其他进程改写时跳过写盘（省去 fsync）
+_LAST_WRITTEN: dict = {}
+_LAST_WRITTEN_LOCK = threading.Lock()
+
+
+@contextmanager
+def workflow_lock(job_dir: Path):
+    """
+    workflow.json 跨进程排他锁（多 worker 部署时防止读-改-写互相覆盖）
+
+    Args:
+        job_dir: job 目录
+    """
+    if fcntl is None:
+        yield
+        return
+
+    job_dir.mkdir(parents=True, exist_ok=True)
+    with open(job_dir / ".workflow.lock", "w") as lock_file:
+        fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
 
 def load_workflow(job_dir: Path, max_retries: int = 3) -> dict:
     """
@@ -20,11 +73,12 @@ def load_workflow(job_dir: Path, max_retries: int = 3) -> dict:
 
     for attempt in range(max_retries):
         try:
-            if not wf_path.exists():
+            # 一次 read_bytes 同时完成存在性检查与读取，bytes 直接交给 orjson 解析
+            try:
+                content = wf_path.read_bytes()
+            except FileNotFoundError:
                 return {}
 
-            content = wf_path.read_text(encoding="utf-8")
-
             # 检查文件是否为空（可能正在写入）
             if not content or not content.strip():
                 if attempt < max_retries - 1:
@@ -32,7 +86,7 @@ def load_workflow(job_dir: Path, max_retries: int = 3) -> dict:
                     continue
                 return {}
 
-            return json.loads(content)
+            return _json_loads(content)
 
         except json.JSONDecodeError:
             # JSON 解析失败，可能文件正在写入中
@@ -51,24 +105,133 @@ def load_workflow(job_dir: Path, max_retries: int = 3) -> dict:
     return {}
 
 
-def save_workflow(job_dir: Path, wf: dict) -> None:
+def save_workflow(job_dir: Path, wf: dict, pretty: bool = False, touch: bool = False) -> None:
     """
     原子写入 workflow.json，防止读写竞态
 
-    使用临时文件 + rename 确保写入原子性
+    使用同目录唯一临时文件 + os.replace 确保写入原子性（并发写入者互不覆盖临时文件）
+
+    Args:
+        pretty: 是否缩进输出。运行时默认紧凑格式（体积约减半、序列化更快），
+                CLI 手动编辑后的快照可传 True 便于人工查看
+        touch: 写入前刷新 meta.updated_at。除时间戳外内容与上次写入相同时，
+               时间戳保持不变并跳过写盘
     """
+    content = _json_dumps(wf, pretty)
+    if touch:
+        if _unchanged_on_disk(job_dir, content):
+            return
+        wf.setdefault("meta", {})["updated_at"] = utc_now_z()
+        content = _json_dumps(wf, pretty)
+    _write_workflow_bytes(job_dir, content)
+
+
+def _unchanged_on_disk(job_dir: Path, content: bytes, digest: bytes = None) -> bool:
+    """content 与本进程上次写入的内容相同，且文件此后未被其他进程改写"""
+    key = str(job_dir / "workflow.json")
+    if digest is None:
+        digest = hashlib.blake2b(content, digest_size=16).digest()
+    with _LAST_WRITTEN_LOCK:
+        last = _LAST_WRITTEN.get(key)
+    if last is None or last[0] != digest:
+        return False
+    try:
+        return os.stat(key).st_mtime_ns == last[1]
+    except OSError:
+        return False
+
+
+def _write_workflow_bytes(job_dir: Path, content: bytes) -> None:
+    """把已序列化的 workflow 原子写入 workflow.json；与上次写入内容相同则跳过"""
     wf_path = job_dir / "workflow.json"
-    content = json.dumps(wf, ensure_ascii=False, indent=2)
+    key = str(wf_path)
+    digest = hashlib.blake2b(content, digest_size=16).digest()
+    if _unchanged_on_disk(job_dir, content, digest):
+        return
 
     # 原子写入：先写临时文件，再 rename
-    temp_path = wf_path.with_suffix(".json.tmp")
+    fd, temp_path = tempfile.mkstemp(dir=job_dir, prefix="workflow.", suffix=".json.tmp")
     try:
-        temp_path.write_text(content, encoding="utf-8")
-        # rename 是原子操作
-        shutil.move(str(temp_path), str(wf_path))
+        set_new_file_mode(fd)
+        with os.fdopen(fd, "wb") as f:
+            f.write(content)
+            # rename 前刷到磁盘：进程 / 机器在写入与 rename 之间崩溃时，不会留下内容为空的 workflow.json
+            f.flush()
+            os.fsync(f.fileno())
+        # os.replace 是原子操作
+        os.replace(temp_path, wf_path)
+        with _LAST_WRITTEN_LOCK:
+            _LAST_WRITTEN[key] = (digest, os.stat(key).st_mtime_ns)
     except Exception:
         # 清理临时文件
-        if temp_path.exists():
-            temp_path.unlink()
+        if os.path.exists(temp_path):
+            os.unlink(temp_path)
         # fallback: 直接写入
-        wf_path.write_text(content, encoding="utf-8")
+        wf_path.write_bytes(content)
+
+
+class WorkflowWriter:
+    """
+    workflow.json 防抖写入器
+
+    中间状态（如 RUNNING）调用 mark_dirty()，最多每 interval 秒落盘一次；
+    必须持久化的状态（SUCCESS / FAILED）调用 flush() 立即写入。
+    退出 with 块时保证同步落盘一次。
+
+    修改 wf 时请持有 writer.lock，保证序列化时数据不被并发修改。
+    flush() 只在 lock 内序列化快照，磁盘写入在 lock 外进行。
+    待写快照只保留一份（深度为 1，新快照覆盖旧快照）：无论 flush 频率多高，
+    内存中最多只有一份等待写入的序列化结果，先拿到 IO 锁的线程写入最新快照，其余线程直接返回。
+    """
+
+    def __init__(self, job_dir: Path, wf: dict, interval: float = 0.5):
+        self.job_dir = job_dir
+        self.wf = wf
+        self.interval = interval
+        self.lock = threading.RLock()
+        self._dirty = False
+        self._timer = None
+        self._io_lock = threading.Lock()
+        self._pending_lock = threading.Lock()
+        self._pending = None
+
+    def mark_dirty(self) -> None:
+        with self.lock:
+            self._dirty = True
+            if self._timer is None:
+                self._timer = threading.Timer(self.interval, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+
+    def flush(self) -> None:
+        with self.lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            self._dirty = False
+            content = _json_dumps(self.wf)
+            with self._pending_lock:
+                self._pending = content
+        del content
+        with self._io_lock:
+            with self._pending_lock:
+                content, self._pending = self._pending, None
+            if content is None:
+                # 其他线程已写入包含本次修改的更新快照
+                return
+            _write_workflow_bytes(self.job_dir, content)
+
+    def close(self) -> None:
+        with self.lock:
+            dirty = self._dirty
+            if not dirty and self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+        if dirty:
+            self.flush()
+
+    def __enter__(self) -> "WorkflowWriter":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
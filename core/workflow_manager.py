@@ -1,40 +1,386 @@
 # core/workflow_manager.py
+import bisect
 import json
-import time
 import os
+import pickle
 import re
 import uuid
 import subprocess
 import shutil
+import sys
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from functools import lru_cache
 from pathlib import Path
-from typing import Dict, List, Any, Optional, Union
+from typing import Dict, List, Any, Optional, Set, Tuple, Union
 
-from core.workflow_io import load_workflow, save_workflow
+from core.workflow_io import load_workflow, save_workflow, workflow_lock
 from core.changes import apply_global_style, replace_entity_reference
-from core.runner import run_pipeline, run_stylize, run_video_generate
-from core.utils import get_ffmpeg_path
+from core.runner import run_pipeline, run_stylize, run_video_generate, shot_input_hash
+from core.utils import get_ffmpeg_path, get_ffprobe_path, get_genai_client, utc_now_z
 
 # Film IR 集成
 from core.film_ir_schema import create_empty_film_ir
 from core.film_ir_io import save_film_ir, load_film_ir, film_ir_exists
 from core.film_ir_manager import FilmIRManager
 
-# 引入拆解所需的库和逻辑
-from google import genai
-from analyze_video import DIRECTOR_METAPROMPT, wait_until_file_active, extract_json_array
+# 引入拆解所需的库和逻辑（Gemini 拆解相关的导入推迟到 _run_gemini_analysis 中）
 from extract_frames import to_seconds
 
+# ⚙️ 素材提取时同时运行的 ffmpeg 进程数（libx264 本身多线程，默认不超过 4 个）
+FFMPEG_WORKERS = max(1, int(os.getenv("FFMPEG_WORKERS", str(min(4, os.cpu_count() or 1)))))
+
+# ⏱️ 单个 ffmpeg 子进程的最长运行时间（秒），超时即终止，避免坏文件让线程永久挂起
+FFMPEG_TIMEOUT = float(os.getenv("FFMPEG_TIMEOUT", "600"))
+
+# 🎞️ 分镜起点与最近的源视频关键帧相差不超过该值（秒）时，片段直接流复制，不再重新编码
+SEGMENT_COPY_TOLERANCE = float(os.getenv("SEGMENT_COPY_TOLERANCE", "0.05"))
+
+# 📦 workflow.json 解析结果缓存：key = (路径, mtime_ns, size)，文件一旦被写入 key 自动失效
+# 缓存的是 pickle 快照（与 film_ir_io._IR_CACHE 相同）：每次 load() 拿到独立副本，
+# 不同 WorkflowManager / 线程之间不会共享同一个可变 dict
+_WF_CACHE: "OrderedDict[Tuple[str, int, int], bytes]" = OrderedDict()
+_WF_CACHE_MAX = 32
+# 🔒 _WF_CACHE / _WF_RECONCILED 会被线程池中的多个请求同时访问
+_WF_CACHE_LOCK = threading.Lock()
+
+
+def _workflow_cache_key(wf_path: Path) -> Optional[Tuple[str, int, int]]:
+    try:
+        st = os.stat(wf_path)
+    except OSError:
+        return None
+    return (str(wf_path), st.st_mtime_ns, st.st_size)
+
+
+def _workflow_cache_get(key: Optional[Tuple[str, int, int]]) -> Optional[Dict[str, Any]]:
+    """命中时返回缓存快照的新副本"""
+    if not key:
+        return None
+    with _WF_CACHE_LOCK:
+        blob = _WF_CACHE.get(key)
+        if blob is None:
+            return None
+        _WF_CACHE.move_to_end(key)
+    return pickle.loads(blob)
+
+
+def _workflow_cache_put(key: Optional[Tuple[str, int, int]], wf: Dict[str, Any]) -> None:
+    if not key or not wf:
+        return
+    blob = pickle.dumps(wf, pickle.HIGHEST_PROTOCOL)
+    with _WF_CACHE_LOCK:
+        _WF_CACHE[key] = blob
+        _WF_CACHE.move_to_end(key)
+        while len(_WF_CACHE) > _WF_CACHE_MAX:
+            _WF_CACHE.popitem(last=False)
+
+
+# 🧭 已完成物理对齐的 workflow 版本：缓存 key -> (stylized_frames 目录 mtime_ns, videos 目录 mtime_ns)
+# workflow.json 与两个产物目录都未变化时，load() 直接返回缓存结果，跳过逐分镜对齐
+_WF_RECONCILED: "OrderedDict[Tuple[str, int, int], Tuple[int, int]]" = OrderedDict()
+
+
+def _workflow_reconciled(key: Optional[Tuple[str, int, int]], dirs_sig: Tuple[int, int]) -> bool:
+    if not key:
+        return False
+    with _WF_CACHE_LOCK:
+        return _WF_RECONCILED.get(key) == dirs_sig
+
+
+def _mark_workflow_reconciled(key: Optional[Tuple[str, int, int]], dirs_sig: Tuple[int, int]) -> None:
+    if not key:
+        return
+    with _WF_CACHE_LOCK:
+        _WF_RECONCILED[key] = dirs_sig
+        _WF_RECONCILED.move_to_end(key)
+        while len(_WF_RECONCILED) > _WF_CACHE_MAX:
+            _WF_RECONCILED.popitem(last=False)
+
+
+def _dir_mtime_ns(dir_path: Path) -> int:
+    """目录 mtime 在其中文件新增 / 删除 / 改名时更新；目录不存在时返回 0"""
+    try:
+        return os.stat(dir_path).st_mtime_ns
+    except OSError:
+        return 0
+
+
+def _dir_entry_names(dir_path: Path) -> Set[str]:
+    """一次 scandir 取出目录下全部文件名；目录不存在时返回空集合"""
+    try:
+        with os.scandir(dir_path) as it:
+            return {entry.name for entry in it}
+    except (FileNotFoundError, NotADirectoryError):
+        return set()
+
+
+def _run_ffmpeg(cmd: List[str], timeout: float = FFMPEG_TIMEOUT) -> Tuple[int, str]:
+    """
+    运行 ffmpeg 并等待结束：stdout 丢弃，stderr 收集供失败时排查
+    超时则终止子进程并返回 -1；返回 (returncode, stderr 末尾 300 字符)
+    """
+    proc = subprocess.Popen(cmd, stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    try:
+        _, err = proc.communicate(timeout=timeout)
+    except subprocess.TimeoutExpired:
+        proc.kill()
+        _, err = proc.communicate()
+        return -1, f"超时 ({timeout:.0f}s) 已终止"
+    return proc.returncode, err.decode("utf-8", errors="replace").strip()[-300:]
+
+
+def _probe_keyframe_times(video_path: Path) -> List[float]:
+    """
+    读取视频流全部关键帧的时间（秒，相对文件起点，与 ffmpeg -ss 同一时间轴）
+    只扫描包头不解码；ffprobe 不可用或失败时返回空列表（调用方全部回退到重新编码）
+    """
+    try:
+        result = subprocess.run([
+            get_ffprobe_path(), "-v", "error",
+            "-select_streams", "v:0",
+            "-show_entries", "packet=pts_time,flags:format=start_time",
+            "-of", "json",
+            str(video_path)
+        ], capture_output=True, timeout=FFMPEG_TIMEOUT)
+    except (OSError, RuntimeError, subprocess.TimeoutExpired):
+        return []
+    if result.returncode != 0:
+        return []
+    try:
+        info = json.loads(result.stdout)
+        start_time = float(info.get("format", {}).get("start_time") or 0)
+    except ValueError:
+        return []
+    times = []
+    for pkt in info.get("packets", []):
+        if "K" not in pkt.get("flags", ""):
+            continue
+        try:
+            times.append(float(pkt["pts_time"]) - start_time)
+        except (KeyError, ValueError):
+            continue
+    times.sort()
+    return times
+
+
+def _keyframe_near(keyframes: List[float], ts: float, tolerance: float) -> Optional[float]:
+    """返回与 ts 相差不超过 tolerance 的最近关键帧时间，没有则返回 None"""
+    i = bisect.bisect_left(keyframes, ts)
+    candidates = keyframes[max(0, i - 1):i + 1]
+    if not candidates:
+        return None
+    nearest = min(candidates, key=lambda k: abs(k - ts))
+    return nearest if abs(nearest - ts) <= tolerance else None
+
+
+def _shot_sort_key(shot_id: str) -> Tuple[int, str]:
+    """shot_XX 按末尾编号排序；不含编号的 id 排在最后并按字符串排序"""
+    digits = re.search(r'(\d+)$', shot_id or "")
+    return (int(digits.group(1)), shot_id) if digits else (sys.maxsize, shot_id or "")
+
+
+def _index_shots(shots: List[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    """shot_id -> shot；id 重复时保留第一个，与原先线性查找命中第一个的行为一致"""
+    index: Dict[str, Dict[str, Any]] = {}
+    for s in shots:
+        index.setdefault(s.get("shot_id"), s)
+    return index
+
+
+def _remove_if_exists(path: Union[str, Path]) -> None:
+    """直接 unlink，文件不存在时静默跳过（省去 exists() 的一次 stat）"""
+    try:
+        os.unlink(path)
+    except FileNotFoundError:
+        pass
+    except OSError as e:
+        print(f"⚠️ 删除旧产物失败 {path}: {e}")
+
+
+# 🔤 主体替换时逐分镜复用的正则（模块加载时编译一次）
+_DESC_TAG_RE = re.compile(r'\[([A-Z]+): ([^\]]+)\]')
+_DOUBLE_COMMA_RE = re.compile(r',\s*,')
+_MULTI_SPACE_RE = re.compile(r'\s{2,}')
+_REPEATED_WORD_RE = re.compile(r'\b(\w+)\s+\1\b', re.IGNORECASE)
+
+
+@lru_cache(maxsize=1)
+def _attribute_purge_patterns() -> Tuple["re.Pattern[str]", ...]:
+    """
+    _purge_conflicting_attributes 第 2~7 步使用的静态清除规则（发型 / 服装 / 面部 / 配饰 / 年龄 / 体型 / 肤色）
+    首次调用时按原顺序编译一次，之后每个分镜直接复用编译结果
+    """
+    patterns: List[str] = []
+
+    # ============================================
+    # 2️⃣ PURGE ALL HAIR DESCRIPTIONS
+    # ============================================
+    hair_colors = [
+        'black', 'brown', 'blonde', 'blond', 'golden', 'silver', 'gray', 'grey',
+        'white', 'red', 'auburn', 'ginger', 'brunette', 'chestnut', 'platinum',
+        'dark', 'light', 'dirty blonde', 'strawberry blonde', 'jet black',
+        'salt and pepper', 'highlighted', 'dyed', 'colored'
+    ]
+    hair_styles = [
+        'short', 'long', 'medium', 'curly', 'straight', 'wavy', 'frizzy',
+        'bald', 'balding', 'shaved', 'buzz cut', 'crew cut', 'mohawk',
+        'ponytail', 'bun', 'braided', 'braids', 'dreadlocks', 'dreads',
+        'afro', 'pixie', 'bob', 'shoulder-length', 'flowing', 'slicked back',
+        'messy', 'neat', 'tousled', 'spiky', 'receding', 'thinning',
+        'thick', 'fine', 'wispy', 'layered'
+    ]
+
+    # Remove hair color + "hair" combinations
+    for color in hair_colors:
+        patterns.append(rf'\b{color}\s+hair(ed)?\b')
+        patterns.append(rf'\b{color}-hair(ed)?\b')
+
+    # Remove hair style + "hair" combinations
+    for style in hair_styles:
+        patterns.append(rf'\b{style}\s+hair(ed)?\b')
+        patterns.append(rf'\b{style}-hair(ed)?\b')
+
+    # Remove complex hair descriptions
+    patterns.append(r'\bwith\s+[\w\s]+\s+hair\b')
+    patterns.append(r'\b[\w\s]+\s+haired\b')
+
+    # ============================================
+    # 3️⃣ PURGE ALL CLOTHING DESCRIPTIONS
+    # ============================================
+    clothing_patterns = [
+        r'\bwearing\s+[\w\s,]+(?:shirt|dress|suit|jacket|coat|pants|jeans|skirt|blouse|sweater|hoodie|t-shirt|tee|top|shorts|trousers|uniform|outfit|attire|clothes|clothing|garment)\b',
+        r'\bin\s+(?:a\s+)?[\w\s]+(?:shirt|dress|suit|jacket|coat|pants|jeans|skirt|blouse|sweater|hoodie|t-shirt|tee|top|shorts|trousers|uniform|outfit|attire)\b',
+        r'\bdressed\s+in\s+[\w\s,]+\b',
+        r'\bclad\s+in\s+[\w\s,]+\b',
+        # Specific clothing items with colors
+        r'\b(?:red|blue|black|white|green|yellow|pink|purple|orange|brown|gray|grey)\s+(?:shirt|dress|suit|jacket|coat|pants|jeans|skirt|blouse|sweater|hoodie|t-shirt|top)\b',
+    ]
+    patterns.extend(clothing_patterns)
+
+    # ============================================
+    # 4️⃣ PURGE PHYSICAL FEATURES & ACCESSORIES
+    # ============================================
+    # Facial features - comprehensive patterns for mustache/beard/goatee
+    facial_features = [
+        # Mustache - ALL variations
+        r'\bwith\s+(?:a\s+)?(?:\w+\s+)*mustache\b',
+        r'\bwith\s+(?:a\s+)?(?:\w+\s+)*moustache\b',
+        r'\bhas\s+(?:a\s+)?(?:\w+\s+)*mustache\b',
+        r'\bhas\s+(?:a\s+)?(?:\w+\s+)*moustache\b',
+        r'\bhaving\s+(?:a\s+)?(?:\w+\s+)*mustache\b',
+        r'\bsporting\s+(?:a\s+)?(?:\w+\s+)*mustache\b',
+        r'\b(?:his|the|a)\s+(?:\w+\s+)*mustache\b',
+        r'\b(?:his|the|a)\s+(?:\w+\s+)*moustache\b',
+        r'\b\w+\s+mustache\b',
+        r'\b\w+\s+moustache\b',
+        r'\bmustached\b', r'\bmoustached\b',
+        r'\bmustache\b', r'\bmoustache\b',
+        # Beard - ALL variations
+        r'\bwith\s+(?:a\s+)?(?:\w+\s+)*beard\b',
+        r'\bhas\s+(?:a\s+)?(?:\w+\s+)*beard\b',
+        r'\b(?:his|the|a)\s+(?:\w+\s+)*beard\b',
+        r'\b\w+\s+beard\b',
+        r'\bbearded\b', r'\bbeard\b',
+        # Goatee
+        r'\bwith\s+(?:a\s+)?(?:\w+\s+)*goatee\b',
+        r'\b(?:his|the|a)\s+(?:\w+\s+)*goatee\b',
+        r'\bgoatee\b',
+        r'\bwith\s+stubble\b', r'\bstubbled\b',
+        r'\bwith\s+freckles\b', r'\bfreckled\b',
+        r'\bwith\s+(?:a\s+)?scar\b', r'\bscarred\b',
+        r'\bwith\s+dimples\b',
+        r'\bwith\s+wrinkles\b', r'\bwrinkled\b',
+        r'\bwith\s+(?:a\s+)?tattoo\b', r'\btattooed\b',
+    ]
+    patterns.extend(facial_features)
+
+    # Eye descriptions
+    eye_colors = ['blue', 'green', 'brown', 'hazel', 'gray', 'grey', 'black', 'amber', 'violet']
+    for color in eye_colors:
+        patterns.append(rf'\b{color}\s+eyes?\b')
+        patterns.append(rf'\b{color}-eyed\b')
+    patterns.append(r'\bwith\s+[\w\s]+\s+eyes\b')
+
+    # Accessories
+    accessories = [
+        r'\bwearing\s+(?:a\s+)?(?:glasses|sunglasses|spectacles)\b',
+        r'\bwith\s+(?:a\s+)?(?:glasses|sunglasses|spectacles)\b',
+        r'\bwearing\s+(?:a\s+)?(?:hat|cap|beanie|helmet)\b',
+        r'\bwith\s+(?:a\s+)?(?:hat|cap|beanie|helmet)\b',
+        r'\bwearing\s+(?:a\s+)?(?:necklace|earrings|bracelet|watch|ring)\b',
+        r'\bwith\s+(?:a\s+)?(?:necklace|earrings|bracelet|watch|ring)\b',
+        r'\bwearing\s+(?:a\s+)?(?:scarf|tie|bowtie|bow tie)\b',
+        r'\bwith\s+(?:a\s+)?(?:scarf|tie|bowtie|bow tie)\b',
+    ]
+    patterns.extend(accessories)
+
+    # ============================================
+    # 5️⃣ PURGE AGE DESCRIPTORS
+    # ============================================
+    age_patterns = [
+        r'\byoung\b', r'\bold\b', r'\belderly\b', r'\bmiddle-aged\b', r'\bmiddle aged\b',
+        r'\bteenage\b', r'\bteen\b', r'\badult\b', r'\bsenior\b', r'\bjuvenile\b',
+        r'\bin (?:his|her|their) (?:20s|30s|40s|50s|60s|70s|80s|90s|twenties|thirties|forties|fifties|sixties|seventies|eighties|nineties)\b',
+    ]
+    patterns.extend(age_patterns)
+
+    # ============================================
+    # 6️⃣ PURGE BODY TYPE DESCRIPTORS
+    # ============================================
+    body_patterns = [
+        r'\b(?:tall|short|slim|slender|thin|skinny|fat|heavy|overweight|muscular|athletic|petite|stocky|lanky|burly|chubby|plump)\b',
+        r'\bwell-built\b', r'\bwell built\b',
+        r'\bbroad[- ]shouldered\b',
+    ]
+    patterns.extend(body_patterns)
+
+    # ============================================
+    # 7️⃣ PURGE SKIN TONE DESCRIPTORS
+    # ============================================
+    skin_patterns = [
+        r'\bfair[- ]skinned\b', r'\bfair skin\b',
+        r'\bdark[- ]skinned\b', r'\bdark skin\b',
+        r'\bpale[- ]skinned\b', r'\bpale skin\b',
+        r'\btan[- ]skinned\b', r'\btanned skin\b', r'\btanned\b',
+        r'\bolive[- ]skinned\b', r'\bolive skin\b',
+    ]
+    patterns.extend(skin_patterns)
+
+    return tuple(re.compile(p, re.IGNORECASE) for p in patterns)
+
+
 class WorkflowManager:
     def __init__(self, job_id: Optional[str] = None, project_root: Optional[Path] = None):
         self.project_dir = project_root or Path(__file__).parent.parent
         self.job_id = job_id
         self.workflow: Dict[str, Any] = {}
+        # (shots 列表, 长度, shot_id -> shot)：见 _shots_index
+        self._shot_index_cache: Optional[Tuple[List[Dict[str, Any]], int, Dict[str, Dict[str, Any]]]] = None
         
         if job_id:
             self.job_dir = self.project_dir / "jobs" / job_id
             if (self.job_dir / "workflow.json").exists():
                 self.load()
 
+    @classmethod
+    def for_job(cls, job_id: str, job_dir: Path) -> "WorkflowManager":
+        """
+        构造指向指定 job 的轻量实例（不立即加载，由调用方按需 load）
+
+        Args:
+            job_id: 作业 ID
+            job_dir: 作业目录
+
+        Returns:
+            WorkflowManager 实例
+        """
+        mgr = cls()
+        mgr.job_id = job_id
+        mgr.job_dir = job_dir
+        return mgr
+
     def initialize_from_file(self, temp_video_path: Path) -> str:
         """全自动初始化管线：完成拆解与原始素材提取"""
         new_id = f"job_{uuid.uuid4().hex[:8]}"
@@ -50,12 +396,20 @@ class WorkflowManager:
         final_video_path = self.job_dir / "input.mp4"
         shutil.move(str(temp_video_path), str(final_video_path))
         
-        print(f"🚀 [Phase 1] 正在通过 Gemini 拆解视频: {new_id}...")
-        storyboard = self._run_gemini_analysis(final_video_path)
+        self._complete_initialization(final_video_path)
+        return new_id
+
+    def _complete_initialization(self, video_path: Path) -> None:
+        """
+        完成初始化的后半部分（用于异步模式）
+        假设 job_id 和 job_dir 已经设置好，视频已经在 job_dir/input.mp4
+        """
+        print(f"🚀 [Phase 1] 正在通过 Gemini 拆解视频: {self.job_id}...")
+        storyboard = self._run_gemini_analysis(video_path)
         
         print(f"🚀 [Phase 2] 正在提取关键帧与原始分镜短片...")
-        self._run_ffmpeg_extraction(final_video_path, storyboard)
-        
+        failed_extract = self._run_ffmpeg_extraction(video_path, storyboard)
+
         shots = []
         for s in storyboard:
             shot_num = int(s.get("shot_number", 1))
@@ -133,120 +487,23 @@ class WorkflowManager:
             })
             
         self.workflow = {
-            "job_id": new_id,
+            "job_id": self.job_id,
             "source_video": "input.mp4",
             "film_ir_path": "film_ir.json",  # 🎬 Film IR 关联
             "global": {"style_prompt": "Cinematic Realistic", "video_model": "seedance"},
             "global_stages": {
-                "analyze": "SUCCESS", "extract": "SUCCESS",
+                "analyze": "SUCCESS", "extract": "FAILED" if failed_extract else "SUCCESS",
                 "stylize": "NOT_STARTED", "video_gen": "NOT_STARTED", "merge": "NOT_STARTED"
             },
             "shots": shots,
-            "meta": {"attempts": 0, "updated_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())}
+            "meta": {"attempts": 0, "updated_at": utc_now_z()}
         }
 
+        if failed_extract:
+            print(f"⚠️ [Phase 2] {len(failed_extract)} 个分镜素材提取失败: {', '.join(failed_extract)}")
         self.save()
 
         # 🎬 初始化 Film IR (电影逻辑中间层)
-        self._initialize_film_ir(new_id, storyboard)
-
-        print(f"✅ [Done] 视频拆解与切片完成，Job ID: {new_id}")
-        return new_id
-
-    def _complete_initialization(self, video_path: Path) -> None:
-        """
-        完成初始化的后半部分（用于异步模式）
-        假设 job_id 和 job_dir 已经设置好，视频已经在 job_dir/input.mp4
-        """
-        print(f"🚀 [Phase 1] 正在通过 Gemini 拆解视频: {self.job_id}...")
-        storyboard = self._run_gemini_analysis(video_path)
-
-        print(f"🚀 [Phase 2] 正在提取关键帧与原始分镜短片...")
-        self._run_ffmpeg_extraction(video_path, storyboard)
-
-        shots = []
-        for s in storyboard:
-            shot_num = int(s.get("shot_number", 1))
-            sid = f"shot_{shot_num:02d}"
-
-            narrative_desc = s.get("frame_description") or s.get("content_analysis") or ""
-
-            shot_scale = s.get("shot_scale", "")
-            subject_frame_position = s.get("subject_frame_position", "")
-            subject_orientation = s.get("subject_orientation", "")
-            gaze_direction = s.get("gaze_direction", "")
-            motion_vector = s.get("motion_vector", "")
-            camera_type = s.get("camera_type") or s.get("camera_movement", "")
-
-            desc_lines = [narrative_desc]
-            if shot_scale:
-                desc_lines.append(f"[SCALE: {shot_scale}]")
-            if subject_frame_position:
-                desc_lines.append(f"[POSITION: {subject_frame_position}]")
-            if subject_orientation:
-                desc_lines.append(f"[ORIENTATION: {subject_orientation}]")
-            if gaze_direction:
-                desc_lines.append(f"[GAZE: {gaze_direction}]")
-            if motion_vector:
-                desc_lines.append(f"[MOTION: {motion_vector}]")
-            if camera_type:
-                desc_lines.append(f"[CAMERA: {camera_type}]")
-
-            full_description = "\n".join(desc_lines)
-
-            cinematography_data = {
-                "shot_scale": shot_scale,
-                "subject_frame_position": subject_frame_position,
-                "subject_orientation": subject_orientation,
-                "gaze_direction": gaze_direction,
-                "motion_vector": motion_vector,
-                "camera_type": camera_type
-            }
-
-            lighting = s.get("lighting", "")
-            music_mood = s.get("music_mood", "")
-            dialogue_voiceover = s.get("dialogue_voiceover", "")
-            content_analysis = s.get("content_analysis", narrative_desc)
-
-            shots.append({
-                "shot_id": sid,
-                "start_time": s.get("start_time"),
-                "end_time": s.get("end_time"),
-                "description": full_description,
-                "content_analysis": content_analysis,
-                "lighting": lighting,
-                "music_mood": music_mood,
-                "dialogue_voiceover": dialogue_voiceover,
-                "cinematography": cinematography_data,
-                "entities": [],
-                "assets": {
-                    "first_frame": f"frames/{sid}.png",
-                    "source_video_segment": f"source_segments/{sid}.mp4",
-                    "stylized_frame": None,
-                    "video": None
-                },
-                "status": {
-                    "stylize": "NOT_STARTED",
-                    "video_generate": "NOT_STARTED"
-                }
-            })
-
-        self.workflow = {
-            "job_id": self.job_id,
-            "source_video": "input.mp4",
-            "film_ir_path": "film_ir.json",
-            "global": {"style_prompt": "Cinematic Realistic", "video_model": "seedance"},
-            "global_stages": {
-                "analyze": "SUCCESS", "extract": "SUCCESS",
-                "stylize": "NOT_STARTED", "video_gen": "NOT_STARTED", "merge": "NOT_STARTED"
-            },
-            "shots": shots,
-            "meta": {"attempts": 0, "updated_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())}
-        }
-
-        self.save()
-
-        # 初始化 Film IR
         self._initialize_film_ir(self.job_id, storyboard)
 
         print(f"✅ [Done] 视频拆解与切片完成，Job ID: {self.job_id}")
@@ -405,14 +662,17 @@ class WorkflowManager:
 
                 # 重新提取帧
                 frame_path = frames_dir / f"{shot_id}.png"
-                subprocess.run([
+                returncode, err_tail = _run_ffmpeg([
                     ffmpeg_path, "-y",
                     "-i", str(video_path),
                     "-ss", str(extract_ts),
                     "-frames:v", "1",
                     "-q:v", "2",
                     str(frame_path)
-                ], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+                ])
+                if returncode != 0:
+                    print(f"❌ [Re-extract] {shot_id}: 抽帧失败 (exit {returncode}): {err_tail}")
+                    continue
                 reextracted_count += 1
 
             print(f"✅ [Frame Re-extract] 已根据物理对位法重新提取 {reextracted_count} 帧")
@@ -433,13 +693,15 @@ class WorkflowManager:
             return "CTA"
 
     def _run_gemini_analysis(self, video_path: Path):
+        # 只有新建 job 才需要拆解：仅做 load / 修改的进程不再为导入付出代价
         from google.genai import types
+        from analyze_video import DIRECTOR_METAPROMPT, wait_until_file_active, extract_json_array
         api_key = os.getenv("GEMINI_API_KEY")
         # Sanitize API key to remove non-ASCII characters (fixes encoding errors in HTTP headers)
         if api_key:
             api_key = api_key.strip()
             api_key = ''.join(c for c in api_key if c.isascii() and c.isprintable())
-        client = genai.Client(api_key=api_key)
+        client = get_genai_client(api_key)
         uploaded = client.files.upload(file=str(video_path))
         video_file = wait_until_file_active(client, uploaded)
         response = client.models.generate_content(
@@ -460,7 +722,9 @@ class WorkflowManager:
         语义化合并：将连续的、背景/角度/主体相似的分镜合并为一个完整分镜。
         使用 AI 判断哪些连续分镜应该合并。
         """
-        if len(shots) <= 1:
+        # 合并后至少保留 2 个分镜（见下方防过度合并检查），≤2 个分镜时任何合并都会被取消，
+        # 直接返回，省去一次 Gemini 往返
+        if len(shots) <= 2:
             return shots
 
         # 构建合并判断提示
@@ -590,13 +854,19 @@ class WorkflowManager:
             print(f"⚠️ 语义合并分析失败 ({e})，保留原始分镜")
             return shots
 
-    def _run_ffmpeg_extraction(self, video_path: Path, storyboard: List):
+    def _run_ffmpeg_extraction(self, video_path: Path, storyboard: List) -> List[str]:
         """
         毫秒级精准提取：
         - 关键帧提取：优先使用 AI 语义锚点 (representativeTimestamp)，保底使用数学逻辑
-        - 视频片段：使用精准切割模式
+        - 视频片段：起点恰好落在源视频关键帧上时直接流复制，否则重新编码精准切割
+
+        Returns:
+            提取失败的 shot_id 列表（全部成功时为空）
         """
         ffmpeg_path = get_ffmpeg_path()
+        # 🔑 关键帧位置只探测一次（不解码），供各分镜判断能否免编码切割
+        keyframes = _probe_keyframe_times(video_path) if SEGMENT_COPY_TOLERANCE > 0 else []
+        commands = []
         for s in storyboard:
             ts = to_seconds(s.get("start_time")) or 0
             end_ts = to_seconds(s.get("end_time")) or (ts + 3)  # 默认 3 秒
@@ -626,65 +896,124 @@ class WorkflowManager:
                 print(f"📐 {sid}: 使用数学保底 {extract_ts:.2f}s (80% 位置)")
 
             img_out = self.job_dir / "frames" / f"{sid}.png"
-            subprocess.run([
+            video_segment_out = self.job_dir / "source_segments" / f"{sid}.mp4"
+
+            # 🎯 起点紧贴源关键帧：流复制（不重新编码），输入端 seek 到该关键帧（+1ms 防止浮点误差落到前一个 GOP）
+            seek_ts = ts
+            segment_codec = [
+                "-c:v", "libx264",        # 重新编码以确保精准切割
+                "-c:a", "aac",
+            ]
+            keyframe_ts = _keyframe_near(keyframes, ts, SEGMENT_COPY_TOLERANCE)
+            if keyframe_ts is not None:
+                seek_ts = keyframe_ts + 0.001
+                segment_codec = ["-c", "copy"]
+                print(f"⚡ {sid}: 起点对齐关键帧 {keyframe_ts:.3f}s，片段流复制")
+
+            # ⏩ 每个分镜只启动一次 ffmpeg：-ss 放在 -i 之前，直接 seek 到分镜起点（转码模式下仍精确到帧），
+            # 同一次解码同时产出视频片段和关键帧（关键帧用相对 seek 点的输出端 -ss 定位）
+            commands.append((sid, [
                 ffmpeg_path, "-y",
+                "-ss", str(seek_ts),      # 视频片段从起始点开始（输入端 seek）
                 "-i", str(video_path),
-                "-ss", str(extract_ts),
+                "-t", str(max(0.1, duration - (seek_ts - ts))),
+                *segment_codec,
+                "-avoid_negative_ts", "make_zero",
+                str(video_segment_out),
+                # 🖼️ 关键帧
+                "-ss", str(max(0.0, extract_ts - seek_ts)),
                 "-frames:v", "1",
                 "-q:v", "2",
                 str(img_out)
-            ], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
-
-            # 🎯 精准视频片段切割
-            video_segment_out = self.job_dir / "source_segments" / f"{sid}.mp4"
-            subprocess.run([
-                ffmpeg_path, "-y",
-                "-i", str(video_path),
-                "-ss", str(ts),           # 视频片段从起始点开始
-                "-t", str(duration),
-                "-c:v", "libx264",        # 重新编码以确保精准切割
-                "-c:a", "aac",
-                "-avoid_negative_ts", "make_zero",
-                str(video_segment_out)
-            ], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            ]))
+
+        # ⚡ 各分镜互不依赖，并发启动 ffmpeg 子进程（数量受 FFMPEG_WORKERS 限制）
+        failed = []
+        if not commands:
+            return failed
+        with ThreadPoolExecutor(max_workers=min(FFMPEG_WORKERS, len(commands))) as pool:
+            futures = {pool.submit(_run_ffmpeg, cmd): sid for sid, cmd in commands}
+            for future in as_completed(futures):
+                sid = futures[future]
+                try:
+                    returncode, err_tail = future.result()
+                except OSError as e:
+                    print(f"❌ {sid}: ffmpeg 启动失败: {e}")
+                    failed.append(sid)
+                    continue
+                if returncode != 0:
+                    print(f"❌ {sid}: 素材提取失败 (exit {returncode}): {err_tail}")
+                    failed.append(sid)
+        return sorted(failed, key=_shot_sort_key)
 
     def load(self):
         """加载状态并对齐物理文件状态"""
-        self.workflow = load_workflow(self.job_dir)
+        # 💡 文件未变化（mtime/size 相同）时从缓存快照复制一份，避免重复读盘 + 解析
+        key = _workflow_cache_key(self.job_dir / "workflow.json")
+        cached = _workflow_cache_get(key)
+        dirs_sig = (_dir_mtime_ns(self.job_dir / "stylized_frames"), _dir_mtime_ns(self.job_dir / "videos"))
+        if cached is not None:
+            self.workflow = cached
+            if _workflow_reconciled(key, dirs_sig):
+                # workflow.json 与产物目录均未变化：上次的对齐结果（含 merge_info）仍然有效
+                return self.workflow
+        else:
+            self.workflow = load_workflow(self.job_dir)
+            _workflow_cache_put(key, self.workflow)
         if "global_stages" not in self.workflow:
             self.workflow["global_stages"] = {"analyze": "SUCCESS", "extract": "SUCCESS", "stylize": "NOT_STARTED", "video_gen": "NOT_STARTED", "merge": "NOT_STARTED"}
 
         updated = False
         shots = self.workflow.get("shots", [])
+        # 📂 两个产物目录各 scandir 一次，逐分镜按文件名查集合，不再逐个 stat
+        stylized_names = _dir_entry_names(self.job_dir / "stylized_frames")
+        video_names = _dir_entry_names(self.job_dir / "videos")
+        # 合并就绪统计与物理对齐在同一次遍历中完成
+        failed_count = 0
+        pending_count = 0
         for shot in shots:
             sid = shot.get("shot_id")
             status_node = shot.get("status", {})
             
             # 1. 风格化参考图物理对齐
-            stylized_path = self.job_dir / "stylized_frames" / f"{sid}.png"
-            if stylized_path.exists() and status_node.get("stylize") != "SUCCESS":
+            if f"{sid}.png" in stylized_names and status_node.get("stylize") != "SUCCESS":
                 status_node["stylize"] = "SUCCESS"
                 shot["assets"]["stylized_frame"] = f"stylized_frames/{sid}.png"
                 updated = True
 
             # 2. 视频产物物理对齐
-            video_output_path = self.job_dir / "videos" / f"{sid}.mp4"
+            video_exists = f"{sid}.mp4" in video_names
             current_video_status = status_node.get("video_generate")
-            if video_output_path.exists() and current_video_status != "SUCCESS":
+            if video_exists and current_video_status != "SUCCESS":
                 status_node["video_generate"] = "SUCCESS"
                 shot.setdefault("assets", {})["video"] = f"videos/{sid}.mp4"
                 updated = True
-            elif not video_output_path.exists() and current_video_status == "SUCCESS":
+            elif not video_exists and current_video_status == "SUCCESS":
                 status_node["video_generate"] = "NOT_STARTED"
                 shot.setdefault("assets", {})["video"] = None
                 updated = True
-        
-        # 💡 核心新增：计算合并就绪状态统计
-        failed_count = sum(1 for s in shots if s["status"].get("video_generate") == "FAILED")
-        pending_count = sum(1 for s in shots if s["status"].get("video_generate") in ["NOT_STARTED", "RUNNING"])
-        
+
+            # 💡 核心新增：计算合并就绪状态统计（取对齐之后的状态）
+            video_status = status_node.get("video_generate")
+            if video_status == "FAILED":
+                failed_count += 1
+            elif video_status == "NOT_STARTED" or video_status == "RUNNING":
+                pending_count += 1
+
+        self._set_merge_info(failed_count, pending_count, len(shots))
+
+        if updated:
+            self.save()
+        elif key:
+            # 快照需包含本次算出的 merge_info，后续命中时才能直接返回
+            _workflow_cache_put(key, self.workflow)
+            _mark_workflow_reconciled(key, dirs_sig)
+        return self.workflow
+
+    def _set_merge_info(self, failed_count: int, pending_count: int, total: int) -> None:
+        """根据统计结果写入 merge_info"""
         self.workflow["merge_info"] = {
-            "can_merge": failed_count == 0 and pending_count == 0 and len(shots) > 0,
+            "can_merge": failed_count == 0 and pending_count == 0 and total > 0,
             "failed_count": failed_count,
             "pending_count": pending_count,
             "message": ""
@@ -694,20 +1023,45 @@ class WorkflowManager:
             self.workflow["merge_info"]["message"] = f"⚠️ {failed_count} shots failed and cannot be assembled."
         elif pending_count > 0:
             self.workflow["merge_info"]["message"] = "⏳ Waiting for the shot list to be generated..."
-        elif len(shots) > 0:
+        elif total > 0:
             self.workflow["merge_info"]["message"] = "✅ All shots are ready and can be assembled into the final film."
-        
-        if updated: self.save()
-        return self.workflow
+
+    def _recompute_merge_info(self) -> None:
+        """仅根据内存中的 shots 状态重算 merge_info（不读盘、不扫描产物目录）"""
+        shots = self.workflow.get("shots", [])
+        failed_count = 0
+        pending_count = 0
+        for s in shots:
+            video_status = s.get("status", {}).get("video_generate")
+            if video_status == "FAILED":
+                failed_count += 1
+            elif video_status == "NOT_STARTED" or video_status == "RUNNING":
+                pending_count += 1
+        self._set_merge_info(failed_count, pending_count, len(shots))
 
     def save(self):
-        self.workflow.setdefault("meta", {})["updated_at"] = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
-        save_workflow(self.job_dir, self.workflow)
+        # 只有内容真的变化时才刷新 updated_at 并写盘（无变化的 save 不再 fsync）
+        save_workflow(self.job_dir, self.workflow, touch=True)
+        _workflow_cache_put(_workflow_cache_key(self.job_dir / "workflow.json"), self.workflow)
 
     def apply_agent_action(self, action: Union[Dict, List]) -> Dict[str, Any]:
         """处理修改意图：强制重置后续所有依赖节点"""
+        # 🔒 多 worker 下对 workflow.json 的读-改-写加文件锁，并以磁盘最新版本为准
+        with workflow_lock(self.job_dir):
+            latest = load_workflow(self.job_dir)
+            if latest:
+                self.workflow = latest
+            return self._apply_agent_action_locked(action)
+
+    def _apply_agent_action_locked(self, action: Union[Dict, List]) -> Dict[str, Any]:
+        """apply_agent_action 的实际实现（调用方需已持有 workflow_lock）"""
         actions = action if isinstance(action, list) else [action]
         total_affected = 0
+        # 🗂️ shot_id -> shot 索引：批量的单分镜修改按 id 直接定位，不再逐条线性扫描
+        shot_index = self._shots_index()
+        # 📁 产物目录转成 str 只做一次，逐分镜失效旧产物时直接拼字符串路径
+        videos_dir = str(self.job_dir / "videos")
+        stylized_dir = str(self.job_dir / "stylized_frames")
         for act in actions:
             op = act.get("op")
             
@@ -715,27 +1069,23 @@ class WorkflowManager:
                 affected = apply_global_style(self.workflow, act.get("value"), cascade=True)
                 if affected > 0:
                     for s in self.workflow.get("shots", []):
-                        v_path = self.job_dir / "videos" / f"{s['shot_id']}.mp4"
-                        if v_path.exists(): os.remove(v_path)
-                        i_path = self.job_dir / "stylized_frames" / f"{s['shot_id']}.png"
-                        if i_path.exists(): os.remove(i_path)
-                        s["status"]["stylize"] = "NOT_STARTED"
-                        s["status"]["video_generate"] = "NOT_STARTED"
-                        s["assets"]["video"] = None
-                        s["assets"]["stylized_frame"] = None
+                        self._reset_shot_outputs(s, videos_dir, stylized_dir)
                 total_affected += affected
                 
             elif op == "global_subject_swap":
                 old_subject = act.get("old_subject", "").lower()
                 new_subject = act.get("new_subject", "").lower()
                 if old_subject and new_subject:
+                    # 每个动作只编译一次：包含判断不再对每条描述做 .lower() 拷贝
+                    old_subject_re = re.compile(re.escape(old_subject), re.IGNORECASE)
+                    old_word_re = re.compile(rf'\b{re.escape(old_subject)}\b', re.IGNORECASE)
                     for s in self.workflow.get("shots", []):
                         # 🏞️ Intelligent Scene Detection: Skip scenery/landscape shots
                         if self._is_scenery_shot(s["description"]):
                             print(f"🏞️ Scenery shot skipped (no character injection): {s['shot_id']}")
                             continue
 
-                        if old_subject in s["description"].lower():
+                        if old_subject_re.search(s["description"]):
                             desc = s["description"]
 
                             # 🧹 STEP 1: STRICT ATTRIBUTE PURGING for gender conflicts
@@ -744,9 +1094,8 @@ class WorkflowManager:
                             print(f"🧹 Purged conflicting attributes from {s['shot_id']}")
 
                             # 🔍 STEP 2: Separate narrative layer from technical tags
-                            tag_pattern = r'\[([A-Z]+): ([^\]]+)\]'
-                            tags = re.findall(tag_pattern, purged_desc)
-                            narrative_part = re.sub(tag_pattern, '', purged_desc).strip()
+                            tags = _DESC_TAG_RE.findall(purged_desc)
+                            narrative_part = _DESC_TAG_RE.sub('', purged_desc).strip()
 
                             # 🔄 STEP 3: Replace SUBJECT_PLACEHOLDER with new subject
                             if 'SUBJECT_PLACEHOLDER' in narrative_part:
@@ -756,19 +1105,14 @@ class WorkflowManager:
                                 new_narrative = new_narrative.replace('SUBJECT_PLACEHOLDER', f'the {new_subject}')
                             else:
                                 # Fallback: direct replacement
-                                new_narrative = re.sub(
-                                    rf'\b{re.escape(old_subject)}\b',
-                                    new_subject,
-                                    narrative_part,
-                                    flags=re.IGNORECASE
-                                )
+                                new_narrative = old_word_re.sub(new_subject, narrative_part)
 
                             # 🧹 STEP 4: Semantic Sanitization for pronouns
                             new_narrative = self._semantic_sanitize_gender(new_narrative, old_subject, new_subject)
 
                             # 🧹 STEP 5: Clean up duplicates and grammar
-                            new_narrative = re.sub(r',\s*,', ',', new_narrative)
-                            new_narrative = re.sub(r'\s{2,}', ' ', new_narrative)
+                            new_narrative = _DOUBLE_COMMA_RE.sub(',', new_narrative)
+                            new_narrative = _MULTI_SPACE_RE.sub(' ', new_narrative)
                             new_narrative = new_narrative.strip()
                             if new_narrative:
                                 new_narrative = new_narrative[0].upper() + new_narrative[1:]
@@ -777,14 +1121,7 @@ class WorkflowManager:
                             tag_lines = [f"[{tag}: {value}]" for tag, value in tags]
                             s["description"] = new_narrative + ("\n" + "\n".join(tag_lines) if tag_lines else "")
 
-                            s["status"]["stylize"] = "NOT_STARTED"
-                            s["status"]["video_generate"] = "NOT_STARTED"
-                            v_path = self.job_dir / "videos" / f"{s['shot_id']}.mp4"
-                            if v_path.exists(): os.remove(v_path)
-                            i_path = self.job_dir / "stylized_frames" / f"{s['shot_id']}.png"
-                            if i_path.exists(): os.remove(i_path)
-                            s["assets"]["video"] = None
-                            s["assets"]["stylized_frame"] = None
+                            self._reset_shot_outputs(s, videos_dir, stylized_dir)
                             total_affected += 1
                             print(f"🧹 Clean swap applied: {s['shot_id']}")
 
@@ -845,6 +1182,10 @@ class WorkflowManager:
 
                     shots_modified = 0
                     shots_skipped = 0
+                    old_subject_re = re.compile(re.escape(old_subject), re.IGNORECASE)
+                    dup_identity_re = re.compile(
+                        rf'\b(a\s+{re.escape(new_subject)})\s*,\s*a\s+{re.escape(new_subject)}\b', re.IGNORECASE
+                    )
 
                     for s in self.workflow.get("shots", []):
                         # 🏞️ Intelligent Scene Detection: Skip scenery/landscape shots
@@ -853,7 +1194,7 @@ class WorkflowManager:
                             shots_skipped += 1
                             continue
 
-                        if old_subject in s["description"].lower():
+                        if old_subject_re.search(s["description"]):
                             desc = s["description"]
 
                             # 🧹 STEP 1: STRICT ATTRIBUTE PURGING
@@ -862,9 +1203,8 @@ class WorkflowManager:
                             print(f"🧹 Purged conflicting attributes from {s['shot_id']}")
 
                             # 🔍 STEP 2: Separate narrative layer from technical tags (tags preserved by purge)
-                            tag_pattern = r'\[([A-Z]+): ([^\]]+)\]'
-                            tags = re.findall(tag_pattern, purged_desc)
-                            narrative_part = re.sub(tag_pattern, '', purged_desc).strip()
+                            tags = _DESC_TAG_RE.findall(purged_desc)
+                            narrative_part = _DESC_TAG_RE.sub('', purged_desc).strip()
 
                             # 🆔 STEP 3: Replace SUBJECT_PLACEHOLDER with new identity
                             # The purge method leaves SUBJECT_PLACEHOLDER where the old subject was
@@ -882,12 +1222,12 @@ class WorkflowManager:
 
                             # 🧹 STEP 5: Clean up duplicates and grammar
                             # Remove duplicate "a [subject]" patterns that may have been created
-                            new_narrative = re.sub(rf'\b(a\s+{re.escape(new_subject)})\s*,\s*a\s+{re.escape(new_subject)}\b', r'\1', new_narrative, flags=re.IGNORECASE)
+                            new_narrative = dup_identity_re.sub(r'\1', new_narrative)
                             # Remove duplicate consecutive words
-                            new_narrative = re.sub(r'\b(\w+)\s+\1\b', r'\1', new_narrative, flags=re.IGNORECASE)
+                            new_narrative = _REPEATED_WORD_RE.sub(r'\1', new_narrative)
                             # Clean up multiple commas/spaces
-                            new_narrative = re.sub(r',\s*,', ',', new_narrative)
-                            new_narrative = re.sub(r'\s{2,}', ' ', new_narrative)
+                            new_narrative = _DOUBLE_COMMA_RE.sub(',', new_narrative)
+                            new_narrative = _MULTI_SPACE_RE.sub(' ', new_narrative)
                             # Capitalize first letter of sentence
                             new_narrative = new_narrative.strip()
                             if new_narrative:
@@ -898,14 +1238,7 @@ class WorkflowManager:
                             s["description"] = new_narrative + ("\n" + "\n".join(tag_lines) if tag_lines else "")
 
                             # Reset generation status
-                            s["status"]["stylize"] = "NOT_STARTED"
-                            s["status"]["video_generate"] = "NOT_STARTED"
-                            v_path = self.job_dir / "videos" / f"{s['shot_id']}.mp4"
-                            if v_path.exists(): os.remove(v_path)
-                            i_path = self.job_dir / "stylized_frames" / f"{s['shot_id']}.png"
-                            if i_path.exists(): os.remove(i_path)
-                            s["assets"]["video"] = None
-                            s["assets"]["stylized_frame"] = None
+                            self._reset_shot_outputs(s, videos_dir, stylized_dir)
                             shots_modified += 1
                             print(f"🆔 Clean identity applied: {s['shot_id']}")
 
@@ -914,45 +1247,29 @@ class WorkflowManager:
                             
             elif op == "update_shot_params":
                 sid = act.get("shot_id")
-                for s in self.workflow.get("shots", []):
-                    if s["shot_id"] == sid:
-                        if "description" in act: s["description"] = act["description"]
-                        s["status"]["stylize"] = "NOT_STARTED"
-                        s["status"]["video_generate"] = "NOT_STARTED"
-                        v_path = self.job_dir / "videos" / f"{sid}.mp4"
-                        if v_path.exists(): os.remove(v_path)
-                        i_path = self.job_dir / "stylized_frames" / f"{sid}.png"
-                        if i_path.exists(): os.remove(i_path)
-                        s["assets"]["video"] = None
-                        s["assets"]["stylized_frame"] = None
-                        total_affected += 1
-                        break
+                s = shot_index.get(sid)
+                if s is not None:
+                    if "description" in act: s["description"] = act["description"]
+                    self._reset_shot_outputs(s, videos_dir, stylized_dir)
+                    total_affected += 1
 
             elif op == "enhance_shot_description":
                 # 📐 空间感知 + 🎬 风格强化：增强分镜描述
                 sid = act.get("shot_id")
                 spatial_info = act.get("spatial_info", "")
                 style_boost = act.get("style_boost", "")
-                for s in self.workflow.get("shots", []):
-                    if s["shot_id"] == sid:
-                        original_desc = s.get("description", "")
-                        enhanced_parts = [original_desc]
-                        if spatial_info:
-                            enhanced_parts.append(f"[Spatial: {spatial_info}]")
-                        if style_boost:
-                            enhanced_parts.append(f"[Style: {style_boost}]")
-                        s["description"] = " ".join(enhanced_parts)
-                        s["status"]["stylize"] = "NOT_STARTED"
-                        s["status"]["video_generate"] = "NOT_STARTED"
-                        v_path = self.job_dir / "videos" / f"{sid}.mp4"
-                        if v_path.exists(): os.remove(v_path)
-                        i_path = self.job_dir / "stylized_frames" / f"{sid}.png"
-                        if i_path.exists(): os.remove(i_path)
-                        s["assets"]["video"] = None
-                        s["assets"]["stylized_frame"] = None
-                        total_affected += 1
-                        print(f"📐 增强分镜描述: {sid} -> {s['description'][:80]}...")
-                        break
+                s = shot_index.get(sid)
+                if s is not None:
+                    original_desc = s.get("description", "")
+                    enhanced_parts = [original_desc]
+                    if spatial_info:
+                        enhanced_parts.append(f"[Spatial: {spatial_info}]")
+                    if style_boost:
+                        enhanced_parts.append(f"[Style: {style_boost}]")
+                    s["description"] = " ".join(enhanced_parts)
+                    self._reset_shot_outputs(s, videos_dir, stylized_dir)
+                    total_affected += 1
+                    print(f"📐 增强分镜描述: {sid} -> {s['description'][:80]}...")
 
             elif op == "update_cinematography":
                 # 🎬 摄影参数修改（仅当用户明确要求时）
@@ -961,66 +1278,58 @@ class WorkflowManager:
                 new_value = act.get("value", "")
                 valid_params = ["shot_scale", "subject_frame_position", "subject_orientation", "gaze_direction", "motion_vector"]
                 if param in valid_params and new_value:
-                    for s in self.workflow.get("shots", []):
-                        if s["shot_id"] == sid:
-                            # Update the cinematography dict
-                            s.setdefault("cinematography", {})[param] = new_value
-
-                            # Update the description tags to match
-                            tag_map = {
-                                "shot_scale": "SCALE",
-                                "subject_frame_position": "POSITION",
-                                "subject_orientation": "ORIENTATION",
-                                "gaze_direction": "GAZE",
-                                "motion_vector": "MOTION"
-                            }
-                            tag_name = tag_map.get(param, param.upper())
-                            desc = s.get("description", "")
-
-                            # Replace existing tag or append new one
-                            tag_pattern = rf'\[{tag_name}: [^\]]+\]'
-                            new_tag = f"[{tag_name}: {new_value}]"
-                            if re.search(tag_pattern, desc):
-                                desc = re.sub(tag_pattern, new_tag, desc)
-                            else:
-                                desc = desc + f"\n{new_tag}"
-                            s["description"] = desc
-
-                            # Reset generation status
-                            s["status"]["stylize"] = "NOT_STARTED"
-                            s["status"]["video_generate"] = "NOT_STARTED"
-                            v_path = self.job_dir / "videos" / f"{sid}.mp4"
-                            if v_path.exists(): os.remove(v_path)
-                            i_path = self.job_dir / "stylized_frames" / f"{sid}.png"
-                            if i_path.exists(): os.remove(i_path)
-                            s["assets"]["video"] = None
-                            s["assets"]["stylized_frame"] = None
-                            total_affected += 1
-                            print(f"🎬 摄影参数更新: {sid} [{param}] -> {new_value}")
-                            break
+                    s = shot_index.get(sid)
+                    if s is not None:
+                        # Update the cinematography dict
+                        s.setdefault("cinematography", {})[param] = new_value
+
+                        # Update the description tags to match
+                        tag_map = {
+                            "shot_scale": "SCALE",
+                            "subject_frame_position": "POSITION",
+                            "subject_orientation": "ORIENTATION",
+                            "gaze_direction": "GAZE",
+                            "motion_vector": "MOTION"
+                        }
+                        tag_name = tag_map.get(param, param.upper())
+                        desc = s.get("description", "")
+
+                        # Replace existing tag or append new one
+                        tag_pattern = rf'\[{tag_name}: [^\]]+\]'
+                        new_tag = f"[{tag_name}: {new_value}]"
+                        if re.search(tag_pattern, desc):
+                            desc = re.sub(tag_pattern, new_tag, desc)
+                        else:
+                            desc = desc + f"\n{new_tag}"
+                        s["description"] = desc
+
+                        # Reset generation status
+                        self._reset_shot_outputs(s, videos_dir, stylized_dir)
+                        total_affected += 1
+                        print(f"🎬 摄影参数更新: {sid} [{param}] -> {new_value}")
 
         if total_affected > 0: self.save()
         return {"status": "success", "affected_shots": total_affected}
 
     def run_node(self, node_type: str, shot_id: Optional[str] = None):
         """逻辑编排引擎。确保‘先有图，后有视频’且无死锁"""
+        # 🛡️ 未加载的实例（如 for_job 构造）先从磁盘读入，避免后面的 save() 用空 workflow 覆盖分镜
+        if not self.workflow:
+            self.load()
         self.workflow.setdefault("meta", {}).setdefault("attempts", 0)
         self.workflow["meta"]["attempts"] += 1
         
-        target_shots = [s for s in self.workflow.get("shots", []) if not shot_id or s["shot_id"] == shot_id]
+        if shot_id:
+            target = self._shots_index().get(shot_id)
+            target_shots = [target] if target is not None else []
+        else:
+            target_shots = list(self.workflow.get("shots", []))
 
         if node_type == "video_generate":
             for s in target_shots:
                 # 确保 status 字段存在
                 if "status" not in s:
                     s["status"] = {"stylize": "NOT_STARTED", "video_generate": "NOT_STARTED"}
-                if s["status"].get("stylize") != "SUCCESS":
-                    print(f"🔗 [Dependency] 分镜 {s['shot_id']} 缺少定妆图，正在前置生成...")
-                    run_stylize(self.job_dir, self.workflow, target_shot=s["shot_id"])
-                    i_file = self.job_dir / "stylized_frames" / f"{s['shot_id']}.png"
-                    if i_file.exists(): 
-                        s["status"]["stylize"] = "SUCCESS"
-                        s["assets"]["stylized_frame"] = f"stylized_frames/{s['shot_id']}.png"
 
         stage_key = "video_gen" if node_type == "video_generate" else "stylize"
         # 确保 global_stages 存在
@@ -1034,15 +1343,26 @@ class WorkflowManager:
             }
         self.workflow["global_stages"][stage_key] = "RUNNING"
 
+        # 📂 产物目录只 scandir 一次，仅对真实存在的旧文件发起 unlink
+        videos_dir = self.job_dir / "videos"
+        stylized_dir = self.job_dir / "stylized_frames"
+        if node_type == "video_generate":
+            existing = _dir_entry_names(videos_dir)
+        elif node_type == "stylize":
+            existing = _dir_entry_names(stylized_dir)
+        else:
+            existing = set()
         for s in target_shots:
             if node_type == "video_generate":
-                v_file = self.job_dir / "videos" / f"{s['shot_id']}.mp4"
-                if v_file.exists(): os.remove(v_file)
+                v_name = f"{s['shot_id']}.mp4"
+                if v_name in existing:
+                    _remove_if_exists(videos_dir / v_name)
                 s["status"]["video_generate"] = "NOT_STARTED" 
                 s["assets"]["video"] = None
             elif node_type == "stylize":
-                i_file = self.job_dir / "stylized_frames" / f"{s['shot_id']}.png"
-                if i_file.exists(): os.remove(i_file)
+                i_name = f"{s['shot_id']}.png"
+                if i_name in existing:
+                    _remove_if_exists(stylized_dir / i_name)
                 s["status"]["stylize"] = "NOT_STARTED" 
                 s["assets"]["stylized_frame"] = None
 
@@ -1051,9 +1371,14 @@ class WorkflowManager:
         if node_type == "stylize": 
             run_stylize(self.job_dir, self.workflow, target_shot=shot_id)
         elif node_type == "video_generate": 
-            run_video_generate(self.job_dir, self.workflow, target_shot=shot_id)
-        
-        self.load() 
+            # 🔗 缺少定妆图的分镜由 runner 在同一工作线程中先补做风格化（先有图，后有视频），
+            # 各分镜的风格化与视频生成流水线式交错执行
+            run_video_generate(self.job_dir, self.workflow, target_shot=shot_id, stylize_missing=True)
+
+        # runner 已原地修改 self.workflow（状态 / 产物路径）并落盘：登记到解析缓存，
+        # 只在内存中重算 merge_info，不再走 load() 的读盘 + 目录扫描
+        _workflow_cache_put(_workflow_cache_key(self.job_dir / "workflow.json"), self.workflow)
+        self._recompute_merge_info()
 
     def _is_scenery_shot(self, description: str) -> bool:
         """
@@ -1257,145 +1582,9 @@ class WorkflowManager:
             narrative = re.sub(rf'\bthe\s+{re.escape(variant)}\b', 'SUBJECT_PLACEHOLDER', narrative, flags=re.IGNORECASE)
             narrative = re.sub(rf'\b{re.escape(variant)}\b', 'SUBJECT_PLACEHOLDER', narrative, flags=re.IGNORECASE)
 
-        # ============================================
-        # 2️⃣ PURGE ALL HAIR DESCRIPTIONS
-        # ============================================
-        hair_colors = [
-            'black', 'brown', 'blonde', 'blond', 'golden', 'silver', 'gray', 'grey',
-            'white', 'red', 'auburn', 'ginger', 'brunette', 'chestnut', 'platinum',
-            'dark', 'light', 'dirty blonde', 'strawberry blonde', 'jet black',
-            'salt and pepper', 'highlighted', 'dyed', 'colored'
-        ]
-        hair_styles = [
-            'short', 'long', 'medium', 'curly', 'straight', 'wavy', 'frizzy',
-            'bald', 'balding', 'shaved', 'buzz cut', 'crew cut', 'mohawk',
-            'ponytail', 'bun', 'braided', 'braids', 'dreadlocks', 'dreads',
-            'afro', 'pixie', 'bob', 'shoulder-length', 'flowing', 'slicked back',
-            'messy', 'neat', 'tousled', 'spiky', 'receding', 'thinning',
-            'thick', 'fine', 'wispy', 'layered'
-        ]
-
-        # Remove hair color + "hair" combinations
-        for color in hair_colors:
-            narrative = re.sub(rf'\b{color}\s+hair(ed)?\b', '', narrative, flags=re.IGNORECASE)
-            narrative = re.sub(rf'\b{color}-hair(ed)?\b', '', narrative, flags=re.IGNORECASE)
-
-        # Remove hair style + "hair" combinations
-        for style in hair_styles:
-            narrative = re.sub(rf'\b{style}\s+hair(ed)?\b', '', narrative, flags=re.IGNORECASE)
-            narrative = re.sub(rf'\b{style}-hair(ed)?\b', '', narrative, flags=re.IGNORECASE)
-
-        # Remove complex hair descriptions
-        narrative = re.sub(r'\bwith\s+[\w\s]+\s+hair\b', '', narrative, flags=re.IGNORECASE)
-        narrative = re.sub(r'\b[\w\s]+\s+haired\b', '', narrative, flags=re.IGNORECASE)
-
-        # ============================================
-        # 3️⃣ PURGE ALL CLOTHING DESCRIPTIONS
-        # ============================================
-        clothing_patterns = [
-            r'\bwearing\s+[\w\s,]+(?:shirt|dress|suit|jacket|coat|pants|jeans|skirt|blouse|sweater|hoodie|t-shirt|tee|top|shorts|trousers|uniform|outfit|attire|clothes|clothing|garment)\b',
-            r'\bin\s+(?:a\s+)?[\w\s]+(?:shirt|dress|suit|jacket|coat|pants|jeans|skirt|blouse|sweater|hoodie|t-shirt|tee|top|shorts|trousers|uniform|outfit|attire)\b',
-            r'\bdressed\s+in\s+[\w\s,]+\b',
-            r'\bclad\s+in\s+[\w\s,]+\b',
-            # Specific clothing items with colors
-            r'\b(?:red|blue|black|white|green|yellow|pink|purple|orange|brown|gray|grey)\s+(?:shirt|dress|suit|jacket|coat|pants|jeans|skirt|blouse|sweater|hoodie|t-shirt|top)\b',
-        ]
-        for pattern in clothing_patterns:
-            narrative = re.sub(pattern, '', narrative, flags=re.IGNORECASE)
-
-        # ============================================
-        # 4️⃣ PURGE PHYSICAL FEATURES & ACCESSORIES
-        # ============================================
-        # Facial features - comprehensive patterns for mustache/beard/goatee
-        facial_features = [
-            # Mustache - ALL variations
-            r'\bwith\s+(?:a\s+)?(?:\w+\s+)*mustache\b',
-            r'\bwith\s+(?:a\s+)?(?:\w+\s+)*moustache\b',
-            r'\bhas\s+(?:a\s+)?(?:\w+\s+)*mustache\b',
-            r'\bhas\s+(?:a\s+)?(?:\w+\s+)*moustache\b',
-            r'\bhaving\s+(?:a\s+)?(?:\w+\s+)*mustache\b',
-            r'\bsporting\s+(?:a\s+)?(?:\w+\s+)*mustache\b',
-            r'\b(?:his|the|a)\s+(?:\w+\s+)*mustache\b',
-            r'\b(?:his|the|a)\s+(?:\w+\s+)*moustache\b',
-            r'\b\w+\s+mustache\b',
-            r'\b\w+\s+moustache\b',
-            r'\bmustached\b', r'\bmoustached\b',
-            r'\bmustache\b', r'\bmoustache\b',
-            # Beard - ALL variations
-            r'\bwith\s+(?:a\s+)?(?:\w+\s+)*beard\b',
-            r'\bhas\s+(?:a\s+)?(?:\w+\s+)*beard\b',
-            r'\b(?:his|the|a)\s+(?:\w+\s+)*beard\b',
-            r'\b\w+\s+beard\b',
-            r'\bbearded\b', r'\bbeard\b',
-            # Goatee
-            r'\bwith\s+(?:a\s+)?(?:\w+\s+)*goatee\b',
-            r'\b(?:his|the|a)\s+(?:\w+\s+)*goatee\b',
-            r'\bgoatee\b',
-            r'\bwith\s+stubble\b', r'\bstubbled\b',
-            r'\bwith\s+freckles\b', r'\bfreckled\b',
-            r'\bwith\s+(?:a\s+)?scar\b', r'\bscarred\b',
-            r'\bwith\s+dimples\b',
-            r'\bwith\s+wrinkles\b', r'\bwrinkled\b',
-            r'\bwith\s+(?:a\s+)?tattoo\b', r'\btattooed\b',
-        ]
-        for pattern in facial_features:
-            narrative = re.sub(pattern, '', narrative, flags=re.IGNORECASE)
-
-        # Eye descriptions
-        eye_colors = ['blue', 'green', 'brown', 'hazel', 'gray', 'grey', 'black', 'amber', 'violet']
-        for color in eye_colors:
-            narrative = re.sub(rf'\b{color}\s+eyes?\b', '', narrative, flags=re.IGNORECASE)
-            narrative = re.sub(rf'\b{color}-eyed\b', '', narrative, flags=re.IGNORECASE)
-        narrative = re.sub(r'\bwith\s+[\w\s]+\s+eyes\b', '', narrative, flags=re.IGNORECASE)
-
-        # Accessories
-        accessories = [
-            r'\bwearing\s+(?:a\s+)?(?:glasses|sunglasses|spectacles)\b',
-            r'\bwith\s+(?:a\s+)?(?:glasses|sunglasses|spectacles)\b',
-            r'\bwearing\s+(?:a\s+)?(?:hat|cap|beanie|helmet)\b',
-            r'\bwith\s+(?:a\s+)?(?:hat|cap|beanie|helmet)\b',
-            r'\bwearing\s+(?:a\s+)?(?:necklace|earrings|bracelet|watch|ring)\b',
-            r'\bwith\s+(?:a\s+)?(?:necklace|earrings|bracelet|watch|ring)\b',
-            r'\bwearing\s+(?:a\s+)?(?:scarf|tie|bowtie|bow tie)\b',
-            r'\bwith\s+(?:a\s+)?(?:scarf|tie|bowtie|bow tie)\b',
-        ]
-        for pattern in accessories:
-            narrative = re.sub(pattern, '', narrative, flags=re.IGNORECASE)
-
-        # ============================================
-        # 5️⃣ PURGE AGE DESCRIPTORS
-        # ============================================
-        age_patterns = [
-            r'\byoung\b', r'\bold\b', r'\belderly\b', r'\bmiddle-aged\b', r'\bmiddle aged\b',
-            r'\bteenage\b', r'\bteen\b', r'\badult\b', r'\bsenior\b', r'\bjuvenile\b',
-            r'\bin (?:his|her|their) (?:20s|30s|40s|50s|60s|70s|80s|90s|twenties|thirties|forties|fifties|sixties|seventies|eighties|nineties)\b',
-        ]
-        for pattern in age_patterns:
-            narrative = re.sub(pattern, '', narrative, flags=re.IGNORECASE)
-
-        # ============================================
-        # 6️⃣ PURGE BODY TYPE DESCRIPTORS
-        # ============================================
-        body_patterns = [
-            r'\b(?:tall|short|slim|slender|thin|skinny|fat|heavy|overweight|muscular|athletic|petite|stocky|lanky|burly|chubby|plump)\b',
-            r'\bwell-built\b', r'\bwell built\b',
-            r'\bbroad[- ]shouldered\b',
-        ]
-        for pattern in body_patterns:
-            narrative = re.sub(pattern, '', narrative, flags=re.IGNORECASE)
-
-        # ============================================
-        # 7️⃣ PURGE SKIN TONE DESCRIPTORS
-        # ============================================
-        skin_patterns = [
-            r'\bfair[- ]skinned\b', r'\bfair skin\b',
-            r'\bdark[- ]skinned\b', r'\bdark skin\b',
-            r'\bpale[- ]skinned\b', r'\bpale skin\b',
-            r'\btan[- ]skinned\b', r'\btanned skin\b', r'\btanned\b',
-            r'\bolive[- ]skinned\b', r'\bolive skin\b',
-        ]
-        for pattern in skin_patterns:
-            narrative = re.sub(pattern, '', narrative, flags=re.IGNORECASE)
+        # 2️⃣ ~ 7️⃣ PURGE HAIR / CLOTHING / FEATURES / AGE / BODY / SKIN（规则见 _attribute_purge_patterns）
+        for pattern in _attribute_purge_patterns():
+            narrative = pattern.sub('', narrative)
 
         # ============================================
         # CLEANUP
@@ -1421,28 +1610,68 @@ class WorkflowManager:
             return narrative + "\n" + "\n".join(tag_lines)
         return narrative
 
-    def _get_shot_by_id(self, shot_id: str) -> Optional[Dict]:
-        for s in self.workflow.get("shots", []):
-            if s.get("shot_id") == shot_id: return s
-        return None
+    def _reset_shot_outputs(self, s: Dict[str, Any], videos_dir: str, stylized_dir: str) -> None:
+        """
+        描述变化后失效该分镜的定妆图与视频：删除旧产物并把两个阶段重置为 NOT_STARTED
+
+        runner 成功执行后会在 cache 中记录输入哈希；修改后输入哈希仍一致（改动对该分镜实际无效）
+        且产物仍在时保留产物与 SUCCESS 状态，不必重跑生成。视频依赖定妆图，定妆图失效时视频一并失效
+        """
+        if self._shot_output_current(s, "stylize", "stylized_frame"):
+            if self._shot_output_current(s, "video_generate", "video"):
+                return
+        else:
+            _remove_if_exists(f"{stylized_dir}/{s['shot_id']}.png")
+            s["status"]["stylize"] = "NOT_STARTED"
+            s["assets"]["stylized_frame"] = None
+        _remove_if_exists(f"{videos_dir}/{s['shot_id']}.mp4")
+        s["status"]["video_generate"] = "NOT_STARTED"
+        s["assets"]["video"] = None
+
+    def _shot_output_current(self, s: Dict[str, Any], stage: str, asset_key: str) -> bool:
+        """该阶段已成功、产物文件仍在，且当前输入哈希与生成时记录的一致"""
+        cached_hash = (s.get("cache") or {}).get(f"{stage}_input_hash")
+        output_rel = s["assets"].get(asset_key)
+        return bool(
+            cached_hash and output_rel
+            and s["status"].get(stage) == "SUCCESS"
+            and (self.job_dir / output_rel).exists()
+            and cached_hash == shot_input_hash(self.job_dir, self.workflow, s, stage)
+        )
+
+    def _shots_index(self) -> Dict[str, Dict[str, Any]]:
+        """shot_id -> shot 索引；self.workflow 被替换（load 等）或分镜增删后自动重建"""
+        shots = self.workflow.get("shots", [])
+        cached = self._shot_index_cache
+        if cached is None or cached[0] is not shots or cached[1] != len(shots):
+            cached = (shots, len(shots), _index_shots(shots))
+            self._shot_index_cache = cached
+        return cached[2]
+
+    def get_shot(self, shot_id: str) -> Optional[Dict]:
+        """按 shot_id 取分镜（需先 load），不存在时返回 None"""
+        return self._shots_index().get(shot_id)
 
     def merge_videos(self) -> str:
         """执行无损合并"""
         ffmpeg_path = get_ffmpeg_path()
         success_shots = [s for s in self.workflow.get("shots", []) if s["status"].get("video_generate") == "SUCCESS"]
         if not success_shots: raise RuntimeError("没有可合并的分镜视频。")
-        success_shots.sort(key=lambda x: x["shot_id"])
+        # 按分镜编号自然排序（shot_2 < shot_10），不依赖两位补零
+        success_shots.sort(key=lambda x: _shot_sort_key(x["shot_id"]))
         concat_list_path = self.job_dir / "concat_list.txt"
         output_video_path = self.job_dir / "final_output.mp4"
-        with open(concat_list_path, "w", encoding="utf-8") as f:
-            for s in success_shots:
-                v_rel_path = s["assets"].get("video")
-                if v_rel_path:
-                    abs_v_path = (self.job_dir / v_rel_path).absolute()
-                    f.write(f"file '{abs_v_path}'\n")
+
+        # 🔍 启动 ffmpeg 前先在内存中校验所有片段都存在，缺失时给出明确错误
+        job_dir_abs = self.job_dir.absolute()
+        video_paths = [job_dir_abs / s["assets"]["video"] for s in success_shots if s["assets"].get("video")]
+        missing = [p.name for p in video_paths if not p.exists()]
+        if missing:
+            raise RuntimeError(f"合并失败: 以下分镜视频文件不存在: {', '.join(missing)}")
+        concat_list_path.write_text("".join(f"file '{p}'\n" for p in video_paths), encoding="utf-8")
         cmd = [ffmpeg_path, "-y", "-f", "concat", "-safe", "0", "-i", str(concat_list_path), "-c", "copy", str(output_video_path)]
-        result = subprocess.run(cmd, capture_output=True, text=True)
-        if result.returncode != 0: raise RuntimeError(f"合并失败: {result.stderr}")
+        returncode, err_tail = _run_ffmpeg(cmd)
+        if returncode != 0: raise RuntimeError(f"合并失败: {err_tail}")
         if "global_stages" in self.workflow:
             self.workflow["global_stages"]["merge"] = "SUCCESS"
         self.save()
@@ -0,0 +1,33 @@
+# gunicorn.conf.py
+"""
+Gunicorn 部署配置：多个 UvicornWorker 进程分摊请求
+
+启动: gunicorn app:app -c gunicorn.conf.py
+"""
+
+import multiprocessing
+import os
+
+# 🌐 监听地址（Railway 通过 $PORT 注入端口）
+# 与 Nginx 同机部署时设置 UVICORN_UDS=/tmp/uvicorn.sock，改走 Unix domain socket
+_uds = os.getenv("UVICORN_UDS")
+bind = f"unix:{_uds}" if _uds else f"0.0.0.0:{os.getenv('PORT', '8000')}"
+
+# ⚙️ worker 数量：默认 1 个。上传分析 / 资产生成等任务状态保存在进程内字典中，
+# 多 worker 时轮询可能落到另一个进程而得到错误状态，因此多进程需显式设置 WEB_CONCURRENCY 开启。
+# 容器内 cpu_count() 报告的是宿主机核数，显式设置的值也不超过 2 * CPU + 1 且最多 8 个
+_max_workers = min(8, multiprocessing.cpu_count() * 2 + 1)
+workers = max(1, min(int(os.getenv("WEB_CONCURRENCY", "1")), _max_workers))
+worker_class = "uvicorn.workers.UvicornWorker"
+
+# 心跳文件放在内存盘，避免磁盘 IO 抖动导致 worker 被误杀
+worker_tmp_dir = "/dev/shm" if os.path.isdir("/dev/shm") else None
+keepalive = 5
+
+# 视频分析 / 合并等同步路由耗时较长，放宽超时
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "300"))
+
+# ⚠️ 注意：app.py 中的 upload_analysis_tasks / asset_generation_tasks / entity_generation_tasks
+# 是进程内状态，不同 worker 之间不共享，也没有可靠的磁盘回退；开启多 worker 前需先把任务状态移到共享存储。
+accesslog = None
+loglevel = "warning"
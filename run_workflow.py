@@ -1,21 +1,12 @@
-import json
 import argparse
 from pathlib import Path
-import shutil
 
-from core.utils import get_ffmpeg_path
+from core.utils import get_ffmpeg_path, fast_copy_file
+from core.workflow_io import load_workflow, save_workflow
 
 PROJECT_DIR = Path(__file__).parent
 DEFAULT_JOB_ID = "demo_job_001"
 
-def load_workflow(job_dir: Path) -> dict:
-    wf_path = job_dir / "workflow.json"
-    return json.loads(wf_path.read_text(encoding="utf-8"))
-
-def save_workflow(job_dir: Path, wf: dict) -> None:
-    wf_path = job_dir / "workflow.json"
-    wf_path.write_text(json.dumps(wf, ensure_ascii=False, indent=2), encoding="utf-8")
-
 def find_shot(wf: dict, shot_id: str) -> dict | None:
     for s in wf.get("shots", []):
         if s.get("shot_id") == shot_id:
@@ -27,13 +18,20 @@ def ensure_videos_dir(job_dir: Path) -> Path:
     videos_dir.mkdir(parents=True, exist_ok=True)
     return videos_dir
 
-def mock_generate_video(job_dir: Path, shot: dict) -> str:
+def mock_generate_videos(job_dir: Path, shots: list[dict]) -> dict[str, str]:
     """
-    Demo 版本：生成一个“占位视频文件”，用来验证 runner 的工作方式。
+    Demo 版本：生成“占位视频文件”，用来验证 runner 的工作方式。
     后续接 Seedance/Veo 时，只需替换这个函数。
+
+    所有 shot 共用一次 ffmpeg 调用：一个输入、多个输出（每个输出都是 input.mp4 的前 1 秒），
+    只解复用一次输入，也只 fork 一个进程。
+
+    Returns:
+        {shot_id: 相对视频路径}
     """
+    if not shots:
+        return {}
     videos_dir = ensure_videos_dir(job_dir)
-    out_path = videos_dir / f"{shot['shot_id']}.mp4"
 
     # 用 input.mp4 的前 1 秒复制成一个小文件（确保是可播放 mp4）
     src_video = job_dir / "input.mp4"
@@ -45,16 +43,16 @@ def mock_generate_video(job_dir: Path, shot: dict) -> str:
     ffmpeg = get_ffmpeg_path()
 
     import subprocess
-    cmd = [
-        ffmpeg, "-y",
-        "-i", str(src_video),
-        "-t", "1.0",
-        "-c", "copy",
-        str(out_path)
-    ]
+    cmd = [ffmpeg, "-y", "-i", str(src_video)]
+    results = {}
+    for shot in shots:
+        out_path = videos_dir / f"{shot['shot_id']}.mp4"
+        # 不加 -map 0：每个输出自动选取最佳的一路视频 / 音频，避免把 timecode 等数据轨复制进 mp4 导致封装失败
+        cmd += ["-t", "1.0", "-c", "copy", str(out_path)]
+        results[shot["shot_id"]] = f"videos/{out_path.name}"
     subprocess.run(cmd, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
 
-    return f"videos/{out_path.name}"
+    return results
 
 def run_video_generate(job_dir: Path, wf: dict, target_shot: str | None = None) -> None:
     """
@@ -62,8 +60,8 @@ def run_video_generate(job_dir: Path, wf: dict, target_shot: str | None = None)
     - target_shot=None：跑所有 NOT_STARTED 或 FAILED 的 shot
     - target_shot=shot_03：只跑指定 shot（单节点重跑）
     """
-    shots = wf.get("shots", [])
-    for shot in shots:
+    pending = []
+    for shot in wf.get("shots", []):
         sid = shot.get("shot_id")
 
         if target_shot and sid != target_shot:
@@ -76,19 +74,27 @@ def run_video_generate(job_dir: Path, wf: dict, target_shot: str | None = None)
         # 标记运行中
         shot.setdefault("status", {})["video_generate"] = "RUNNING"
         shot.setdefault("errors", {})["video_generate"] = None
-        save_workflow(job_dir, wf)
+        pending.append(shot)
 
-        try:
-            rel_video_path = mock_generate_video(job_dir, shot)
-            shot.setdefault("assets", {})["video"] = rel_video_path
-            shot["status"]["video_generate"] = "SUCCESS"
-            print(f"✅ video_generate SUCCESS: {sid} -> {rel_video_path}")
-        except Exception as e:
+    if not pending:
+        return
+    save_workflow(job_dir, wf)
+
+    try:
+        rel_paths = mock_generate_videos(job_dir, pending)
+    except Exception as e:
+        for shot in pending:
             shot["status"]["video_generate"] = "FAILED"
-            shot.setdefault("errors", {})["video_generate"] = str(e)
-            print(f"❌ video_generate FAILED: {sid} -> {e}")
+            shot["errors"]["video_generate"] = str(e)
+            print(f"❌ video_generate FAILED: {shot.get('shot_id')} -> {e}")
+    else:
+        for shot in pending:
+            sid = shot.get("shot_id")
+            shot.setdefault("assets", {})["video"] = rel_paths[sid]
+            shot["status"]["video_generate"] = "SUCCESS"
+            print(f"✅ video_generate SUCCESS: {sid} -> {rel_paths[sid]}")
 
-        save_workflow(job_dir, wf)
+    save_workflow(job_dir, wf)
 
 def mock_stylize_frame(job_dir: Path, shot: dict) -> str:
     """
@@ -101,7 +107,7 @@ def mock_stylize_frame(job_dir: Path, shot: dict) -> str:
 
     dst = job_dir / "stylized_frames" / f"{shot['shot_id']}.png"
     dst.parent.mkdir(parents=True, exist_ok=True)
-    shutil.copyfile(src, dst)
+    fast_copy_file(src, dst)
     return f"stylized_frames/{dst.name}"
 
 def run_stylize(job_dir: Path, wf: dict, target_shot: str | None = None) -> None:
@@ -0,0 +1,49 @@
+# tests/conftest.py
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from core.workflow_io import save_workflow  # noqa: E402
+
+
+def make_shot(sid: str, description: str = "A man walks down the street") -> dict:
+    return {
+        "shot_id": sid,
+        "description": description,
+        "cinematography": {},
+        "entities": [],
+        "assets": {
+            "first_frame": f"frames/{sid}.png",
+            "stylized_frame": None,
+            "video": None,
+        },
+        "status": {"stylize": "NOT_STARTED", "video_generate": "NOT_STARTED"},
+    }
+
+
+@pytest.fixture
+def make_job(tmp_path):
+    """在临时 jobs 目录下创建一个 job，返回 job_dir"""
+    def _make(job_id: str = "job_test", shots=None, video_model: str = "mock") -> Path:
+        job_dir = tmp_path / "jobs" / job_id
+        (job_dir / "frames").mkdir(parents=True)
+        shots = shots if shots is not None else [make_shot("shot_01"), make_shot("shot_02")]
+        for s in shots:
+            (job_dir / s["assets"]["first_frame"]).write_bytes(b"frame")
+        save_workflow(job_dir, {
+            "job_id": job_id,
+            "global": {"style_prompt": "Cinematic", "video_model": video_model},
+            "global_stages": {
+                "analyze": "SUCCESS", "extract": "SUCCESS",
+                "stylize": "NOT_STARTED", "video_gen": "NOT_STARTED", "merge": "NOT_STARTED",
+            },
+            "shots": shots,
+            "meta": {"attempts": 0},
+        })
+        return job_dir
+    return _make
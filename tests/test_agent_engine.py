@@ -0,0 +1,66 @@
+# tests/test_agent_engine.py
+import threading
+
+import pytest
+
+pytest.importorskip("google.genai")
+
+import core.agent_engine as agent_engine  # noqa: E402
+from core.agent_engine import _agent_cache_get, _agent_cache_put, _parse_agent_json  # noqa: E402
+
+
+@pytest.mark.parametrize("text, expected", [
+    ('[{"op": "set_global_style", "value": "Noir"}]', [{"op": "set_global_style", "value": "Noir"}]),
+    ('{"op": "noop"}', {"op": "noop"}),
+    ('```json\n[{"op": "noop"}]\n```', [{"op": "noop"}]),
+    ('[{"op": "noop"}] trailing words', [{"op": "noop"}]),
+])
+def test_parse_agent_json_recovers(text, expected):
+    assert _parse_agent_json(text) == expected
+
+
+@pytest.mark.parametrize("text", ["", "   ", "sorry, I cannot help", "[not json]"])
+def test_parse_agent_json_rejects(text):
+    with pytest.raises(ValueError):
+        _parse_agent_json(text)
+
+
+@pytest.fixture
+def small_cache(monkeypatch):
+    monkeypatch.setattr(agent_engine, "_AGENT_CACHE", agent_engine.OrderedDict())
+    monkeypatch.setattr(agent_engine, "_AGENT_CACHE_MAX", 4)
+
+
+def test_agent_cache_returns_copies(small_cache):
+    _agent_cache_put(b"k", [{"op": "noop"}])
+    first = _agent_cache_get(b"k")
+    first[0]["op"] = "changed"
+    assert _agent_cache_get(b"k") == [{"op": "noop"}]
+
+
+def test_agent_cache_expires(small_cache, monkeypatch):
+    _agent_cache_put(b"k", {"op": "noop"})
+    monkeypatch.setattr(agent_engine, "_AGENT_CACHE_TTL", -1)
+    assert _agent_cache_get(b"k") is None
+    assert b"k" not in agent_engine._AGENT_CACHE
+
+
+def test_agent_cache_concurrent_eviction(small_cache):
+    errors = []
+
+    def worker(n: int) -> None:
+        try:
+            for i in range(2000):
+                key = f"{n}-{i % 8}".encode()
+                _agent_cache_put(key, {"i": i})
+                _agent_cache_get(key)
+        except Exception as e:  # noqa: BLE001
+            errors.append(e)
+
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert errors == []
+    assert len(agent_engine._AGENT_CACHE) <= 4
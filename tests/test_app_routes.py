@@ -0,0 +1,82 @@
+# tests/test_app_routes.py
+"""路由级测试：每个请求按 job_id 构建独立的 WorkflowManager（不依赖 ffmpeg / Gemini）"""
+import pytest
+
+fastapi = pytest.importorskip("fastapi")
+from fastapi.testclient import TestClient  # noqa: E402
+
+import app as app_module  # noqa: E402
+import core.runner as runner  # noqa: E402
+from core.workflow_io import load_workflow  # noqa: E402
+
+
+@pytest.fixture
+def client(make_job, monkeypatch):
+    job_dir = make_job()
+    monkeypatch.setattr(app_module, "JOBS_ROOT", job_dir.parent)
+    monkeypatch.setattr(app_module, "_LATEST_JOB", (0.0, None))
+    app_module._job_dir.cache_clear()
+    monkeypatch.setattr(runner, "RPM_INTERVAL_SECONDS", 0)
+    # mock 后端复用 videos/_mock_1s.mp4：预先放好即可跳过 ffmpeg 截取
+    (job_dir / "videos").mkdir()
+    (job_dir / "videos" / "_mock_1s.mp4").write_bytes(b"clip")
+    # 不调用 Gemini：风格化直接复制首帧
+    def fake_stylize(job_dir, wf, shot):
+        dst = job_dir / "stylized_frames" / f"{shot['shot_id']}.png"
+        dst.parent.mkdir(parents=True, exist_ok=True)
+        dst.write_bytes(b"stylized")
+        return f"stylized_frames/{dst.name}"
+    monkeypatch.setattr(runner, "ai_stylize_frame", fake_stylize)
+    # 不进入 lifespan（不构建 AgentEngine）
+    return TestClient(app_module.app), job_dir
+
+
+@pytest.mark.parametrize("node_type", ["stylize", "video_generate"])
+def test_run_node_keeps_shots(client, node_type):
+    test_client, job_dir = client
+    resp = test_client.post(f"/api/run/{node_type}", params={"job_id": job_dir.name})
+    assert resp.status_code == 200
+    assert resp.json()["status"] == "started"
+
+    # TestClient 在返回前已执行完后台任务
+    wf = load_workflow(job_dir)
+    assert [s["shot_id"] for s in wf["shots"]] == ["shot_01", "shot_02"]
+    assert wf["job_id"] == job_dir.name
+    for s in wf["shots"]:
+        assert s["status"]["stylize"] == "SUCCESS"
+        if node_type == "video_generate":
+            assert s["status"]["video_generate"] == "SUCCESS"
+            assert (job_dir / "videos" / f"{s['shot_id']}.mp4").exists()
+
+
+def test_run_without_job_id_uses_latest_job(client):
+    test_client, job_dir = client
+    resp = test_client.post("/api/run/stylize")
+    assert resp.status_code == 200
+    assert resp.json()["job_id"] == job_dir.name
+    assert len(load_workflow(job_dir)["shots"]) == 2
+
+
+def test_workflow_etag_304(client):
+    test_client, job_dir = client
+    first = test_client.get("/api/workflow", params={"job_id": job_dir.name})
+    assert first.status_code == 200
+    assert [s["shot_id"] for s in first.json()["shots"]] == ["shot_01", "shot_02"]
+    etag = first.headers.get("etag")
+    assert etag
+    second = test_client.get(
+        "/api/workflow", params={"job_id": job_dir.name}, headers={"If-None-Match": etag},
+    )
+    assert second.status_code == 304
+
+
+def test_single_shot_and_status(client):
+    test_client, job_dir = client
+    shot = test_client.get(f"/api/job/{job_dir.name}/shots/shot_02")
+    assert shot.status_code == 200
+    missing = test_client.get(f"/api/job/{job_dir.name}/shots/shot_99")
+    assert missing.status_code == 404
+
+    status = test_client.get(f"/api/job/{job_dir.name}/status")
+    assert status.status_code == 200
+    assert status.json()["totalShots"] == 2
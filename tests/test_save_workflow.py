@@ -0,0 +1,54 @@
+# tests/test_save_workflow.py
+"""save_workflow(touch=True)：内容未变时跳过写盘并保留 updated_at"""
+import os
+
+import core.workflow_io as workflow_io
+from core.workflow_io import load_workflow, save_workflow
+
+
+def _stamp(monkeypatch, value: str) -> None:
+    monkeypatch.setattr(workflow_io, "utc_now_z", lambda: value)
+
+
+def test_touch_skips_unchanged_content(tmp_path, monkeypatch):
+    wf = {"shots": [], "meta": {}}
+    _stamp(monkeypatch, "2026-01-01T00:00:00Z")
+    save_workflow(tmp_path, wf, touch=True)
+    mtime = os.stat(tmp_path / "workflow.json").st_mtime_ns
+
+    _stamp(monkeypatch, "2026-01-02T00:00:00Z")
+    save_workflow(tmp_path, wf, touch=True)
+    assert wf["meta"]["updated_at"] == "2026-01-01T00:00:00Z"
+    assert load_workflow(tmp_path)["meta"]["updated_at"] == "2026-01-01T00:00:00Z"
+    assert os.stat(tmp_path / "workflow.json").st_mtime_ns == mtime
+
+
+def test_touch_refreshes_timestamp_on_change(tmp_path, monkeypatch):
+    wf = {"shots": [], "meta": {}}
+    _stamp(monkeypatch, "2026-01-01T00:00:00Z")
+    save_workflow(tmp_path, wf, touch=True)
+
+    wf["shots"].append({"shot_id": "shot_01"})
+    _stamp(monkeypatch, "2026-01-02T00:00:00Z")
+    save_workflow(tmp_path, wf, touch=True)
+    on_disk = load_workflow(tmp_path)
+    assert on_disk["meta"]["updated_at"] == "2026-01-02T00:00:00Z"
+    assert on_disk["shots"] == [{"shot_id": "shot_01"}]
+
+
+def test_external_rewrite_forces_write(tmp_path, monkeypatch):
+    wf = {"shots": [], "meta": {}}
+    _stamp(monkeypatch, "2026-01-01T00:00:00Z")
+    save_workflow(tmp_path, wf, touch=True)
+
+    # 其他进程改写了文件：即使本进程的内容未变，也要重新写回
+    wf_path = tmp_path / "workflow.json"
+    wf_path.write_text('{"shots": [{"shot_id": "other"}]}')
+    st = os.stat(wf_path)
+    os.utime(wf_path, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000))
+
+    _stamp(monkeypatch, "2026-01-02T00:00:00Z")
+    save_workflow(tmp_path, wf, touch=True)
+    on_disk = load_workflow(tmp_path)
+    assert on_disk["shots"] == []
+    assert on_disk["meta"]["updated_at"] == "2026-01-02T00:00:00Z"
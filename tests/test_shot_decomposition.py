@@ -0,0 +1,26 @@
+# tests/test_shot_decomposition.py
+from core.meta_prompts.shot_decomposition import _normalize_recipe, extract_all
+
+
+def test_normalize_fills_defaults_in_place():
+    recipe = {"shots": [{"shotId": "shot_01", "concrete": {"subject": "a cat"}}]}
+    out = _normalize_recipe({"shotRecipe": recipe})
+    assert out is recipe
+    shot = out["shots"][0]
+    assert shot["concrete"]["subject"] == "a cat"
+    assert shot["concrete"]["scene"] == ""
+    assert shot["concrete"]["audio"]["dialogue"] == ""
+    assert shot["longTake"] is False
+    assert out["globalSettings"] == {"concrete": {}, "abstract": {}}
+
+
+def test_normalize_defaults_are_not_shared():
+    a = _normalize_recipe({"shots": [{}]})
+    b = _normalize_recipe({"shots": [{}]})
+    a["shots"][0]["concrete"]["camera"]["shotSize"] = "WIDE"
+    assert b["shots"][0]["concrete"]["camera"] == {}
+
+
+def test_extract_all_on_empty_output():
+    views = extract_all({})
+    assert set(views) >= {"concrete", "abstract", "firstFrames", "dialogueTimeline"}
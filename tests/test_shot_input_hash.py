@@ -0,0 +1,103 @@
+# tests/test_shot_input_hash.py
+"""输入指纹：runner 跳过未变化的分镜；级联重置时保留仍然有效的产物"""
+import pytest
+
+import core.runner as runner
+from core.runner import run_stylize, run_video_generate, shot_input_hash
+from core.workflow_io import load_workflow
+from core.workflow_manager import WorkflowManager
+
+
+@pytest.fixture
+def stylize_calls(monkeypatch):
+    calls = []
+
+    def fake_stylize(job_dir, wf, shot):
+        calls.append(shot["shot_id"])
+        dst = job_dir / "stylized_frames" / f"{shot['shot_id']}.png"
+        dst.parent.mkdir(parents=True, exist_ok=True)
+        dst.write_bytes(b"stylized")
+        return f"stylized_frames/{dst.name}"
+
+    monkeypatch.setattr(runner, "ai_stylize_frame", fake_stylize)
+    monkeypatch.setattr(runner, "RPM_INTERVAL_SECONDS", 0)
+    return calls
+
+
+@pytest.fixture
+def generated_job(make_job, stylize_calls):
+    """两个分镜都已完成风格化 + mock 视频生成的 job"""
+    job_dir = make_job()
+    (job_dir / "videos").mkdir()
+    (job_dir / "videos" / "_mock_1s.mp4").write_bytes(b"clip")
+    wf = load_workflow(job_dir)
+    run_stylize(job_dir, wf)
+    run_video_generate(job_dir, wf)
+    stylize_calls.clear()
+    return job_dir
+
+
+def test_hash_changes_with_inputs(make_job):
+    job_dir = make_job()
+    wf = load_workflow(job_dir)
+    shot = wf["shots"][0]
+    before = shot_input_hash(job_dir, wf, shot, "stylize")
+    assert shot_input_hash(job_dir, wf, shot, "stylize") == before
+    shot["description"] = "A woman walks down the street"
+    assert shot_input_hash(job_dir, wf, shot, "stylize") != before
+    shot["description"] = "A man walks down the street"
+    wf["global"]["style_prompt"] = "Anime"
+    assert shot_input_hash(job_dir, wf, shot, "stylize") != before
+
+
+def test_success_records_hash(generated_job):
+    wf = load_workflow(generated_job)
+    for s in wf["shots"]:
+        assert s["cache"]["stylize_input_hash"] == shot_input_hash(generated_job, wf, s, "stylize")
+        assert s["cache"]["video_generate_input_hash"] == shot_input_hash(generated_job, wf, s, "video_generate")
+
+
+def test_batch_run_skips_unchanged_shots(generated_job, stylize_calls):
+    wf = load_workflow(generated_job)
+    for s in wf["shots"]:
+        s["status"]["stylize"] = "NOT_STARTED"
+    wf["shots"][1]["description"] = "A different subject"
+
+    run_stylize(generated_job, wf)
+
+    assert stylize_calls == ["shot_02"]
+    assert all(s["status"]["stylize"] == "SUCCESS" for s in load_workflow(generated_job)["shots"])
+
+
+def test_single_shot_run_always_reruns(generated_job, stylize_calls):
+    wf = load_workflow(generated_job)
+    run_stylize(generated_job, wf, target_shot="shot_01")
+    assert stylize_calls == ["shot_01"]
+
+
+def test_reset_keeps_outputs_when_inputs_unchanged(generated_job):
+    mgr = WorkflowManager.for_job(generated_job.name, generated_job)
+    mgr.load()
+    same = mgr.get_shot("shot_01")["description"]
+
+    mgr.apply_agent_action({"op": "update_shot_params", "shot_id": "shot_01", "description": same})
+
+    shot = WorkflowManager.for_job(generated_job.name, generated_job).load()["shots"][0]
+    assert shot["status"] == {"stylize": "SUCCESS", "video_generate": "SUCCESS"}
+    assert (generated_job / "stylized_frames" / "shot_01.png").exists()
+    assert (generated_job / "videos" / "shot_01.mp4").exists()
+
+
+def test_reset_invalidates_outputs_when_inputs_change(generated_job):
+    mgr = WorkflowManager.for_job(generated_job.name, generated_job)
+    mgr.load()
+
+    mgr.apply_agent_action({"op": "update_shot_params", "shot_id": "shot_01", "description": "A red car"})
+
+    shots = WorkflowManager.for_job(generated_job.name, generated_job).load()["shots"]
+    assert shots[0]["status"] == {"stylize": "NOT_STARTED", "video_generate": "NOT_STARTED"}
+    assert shots[0]["assets"]["stylized_frame"] is None and shots[0]["assets"]["video"] is None
+    assert not (generated_job / "stylized_frames" / "shot_01.png").exists()
+    assert not (generated_job / "videos" / "shot_01.mp4").exists()
+    # 未修改的分镜不受影响
+    assert shots[1]["status"] == {"stylize": "SUCCESS", "video_generate": "SUCCESS"}
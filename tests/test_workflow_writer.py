@@ -0,0 +1,116 @@
+# tests/test_workflow_writer.py
+"""WorkflowWriter：防抖合并、立即落盘，以及待写快照只保留一份"""
+import threading
+import time
+
+import pytest
+
+import core.workflow_io as workflow_io
+from core.workflow_io import WorkflowWriter, load_workflow
+
+
+@pytest.fixture
+def writes(monkeypatch):
+    """记录每次实际写盘的内容"""
+    written = []
+    real_write = workflow_io._write_workflow_bytes
+
+    def counting_write(job_dir, content):
+        written.append(content)
+        real_write(job_dir, content)
+
+    monkeypatch.setattr(workflow_io, "_write_workflow_bytes", counting_write)
+    return written
+
+
+def test_mark_dirty_is_debounced(tmp_path, writes):
+    wf = {"shots": [], "n": 0}
+    writer = WorkflowWriter(tmp_path, wf, interval=0.05)
+    for i in range(20):
+        with writer.lock:
+            wf["n"] = i
+        writer.mark_dirty()
+    assert writes == []
+
+    deadline = time.monotonic() + 2
+    while not writes and time.monotonic() < deadline:
+        time.sleep(0.01)
+    time.sleep(0.1)
+    assert len(writes) == 1
+    assert load_workflow(tmp_path)["n"] == 19
+
+
+def test_flush_writes_immediately_and_cancels_timer(tmp_path, writes):
+    wf = {"n": 1}
+    writer = WorkflowWriter(tmp_path, wf, interval=10)
+    writer.mark_dirty()
+    writer.flush()
+    assert len(writes) == 1
+    assert writer._timer is None
+    assert load_workflow(tmp_path)["n"] == 1
+
+
+def test_close_writes_only_when_dirty(tmp_path, writes):
+    wf = {"n": 1}
+    with WorkflowWriter(tmp_path, wf, interval=10):
+        pass
+    assert writes == []
+
+    with WorkflowWriter(tmp_path, wf, interval=10) as writer:
+        wf["n"] = 2
+        writer.mark_dirty()
+    assert len(writes) == 1
+    assert load_workflow(tmp_path)["n"] == 2
+
+
+class _CountingLock:
+    """记录有多少线程已到达 IO 锁（此时它们的快照都已放进待写槽）"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._count_lock = threading.Lock()
+        self.arrived = 0
+
+    def acquire(self):
+        self._lock.acquire()
+
+    def release(self):
+        self._lock.release()
+
+    def __enter__(self):
+        with self._count_lock:
+            self.arrived += 1
+        self._lock.acquire()
+        return self
+
+    def __exit__(self, *exc):
+        self._lock.release()
+
+
+def test_concurrent_flushes_coalesce_to_latest_snapshot(tmp_path, writes):
+    wf = {"n": 0}
+    writer = WorkflowWriter(tmp_path, wf)
+    writer._io_lock = io_lock = _CountingLock()
+
+    def flush_with(value: int) -> None:
+        with writer.lock:
+            wf["n"] = value
+        writer.flush()
+
+    # 占住 IO 锁：所有 flush 都只能把快照放进待写槽，槽里始终只有最新的一份
+    io_lock.acquire()
+    threads = [threading.Thread(target=flush_with, args=(i,)) for i in range(1, 6)]
+    for t in threads:
+        t.start()
+    deadline = time.monotonic() + 5
+    while io_lock.arrived < len(threads) and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert io_lock.arrived == len(threads)
+    assert workflow_io._json_loads(writer._pending)["n"] == wf["n"]
+    io_lock.release()
+    for t in threads:
+        t.join()
+
+    assert len(writes) == 1
+    assert load_workflow(tmp_path)["n"] == wf["n"]
+    assert writer._pending is None
@@ -18,10 +18,11 @@ def run_veo_generation(shot_id, prompt, image_path, output_dir="output_videos"):
     if not os.path.exists(output_dir):
         os.makedirs(output_dir)
 
-    # 1. 以二进制读取风格化后的参考图
+    # 1. 以二进制读取风格化后的参考图，直接封装为请求 Part（不再单独保留一份 bytes）
+    # SDK 只支持内联字节或已上传文件的 URI，无法流式读取本地文件
     try:
         with open(image_path, 'rb') as f:
-            image_bytes = f.read()
+            image_part = types.Part.from_bytes(data=f.read(), mime_type="image/png")
     except FileNotFoundError:
         print(f"❌ 找不到图片文件: {image_path}")
         return None
@@ -36,19 +37,21 @@ def run_veo_generation(shot_id, prompt, image_path, output_dir="output_videos"):
             prompt=prompt,
             config=types.GenerateVideosConfig(
                 # 修复点：参考图必须放在这个 image 字段里
-                image=types.Part.from_bytes(
-                    data=image_bytes,
-                    mime_type="image/png"
-                ),
+                image=image_part,
                 aspect_ratio="16:9"
             )
         )
+        # 请求已提交：释放参考图，避免在数分钟的轮询期间一直占用内存
+        del image_part
 
         # 3. 异步轮询 (Veo 视频生成不是即时的)
+        # 指数退避：1s 起步、每次 x1.5、上限 30s，短任务完成后能更快被发现
         print(f"⏳ 视频正在云端渲染 (Operation ID: {operation.name})")
+        poll_delay = 1.0
         while not operation.done:
             print(".", end="", flush=True)
-            time.sleep(10)  # 每 10 秒查询一次进度
+            time.sleep(poll_delay)
+            poll_delay = min(30.0, poll_delay * 1.5)
             operation = client.operations.get(operation.name)
 
         # 4. 检查结果并保存
@@ -24,14 +24,14 @@ def cmd_list(job_dir: Path) -> None:
 def cmd_set_style(job_dir: Path, style: str, cascade: bool) -> None:
     wf = load_workflow(job_dir)
     affected = apply_global_style(wf, style, cascade=cascade)
-    save_workflow(job_dir, wf)
+    save_workflow(job_dir, wf, pretty=True)
     print(f"✅ style 已更新：{style}")
     print(f"✅ 受影响 shots：{affected}（cascade={cascade}）")
 
 def cmd_replace_entity(job_dir: Path, entity_id: str, new_ref: str) -> None:
     wf = load_workflow(job_dir)
     affected = replace_entity_reference(wf, entity_id, new_ref)
-    save_workflow(job_dir, wf)
+    save_workflow(job_dir, wf, pretty=True)
     print(f"✅ 已替换 {entity_id}.reference_image -> {new_ref}")
     print(f"✅ 受影响 shots：{affected}")
 